@@ -0,0 +1,123 @@
+"""
+Benchmark of the HTML processing of the blog posts. Generates long posts
+with many images and measures the time of the operations run while a post
+is being edited, in two variants:
+
+* soup - separate BeautifulSoup parse for every operation, as done originally;
+* single-pass - `html_parsers.parse`, shared by the operations.
+
+Usage::
+
+    python3 -m pisak.blog.benchmark [PARAGRAPHS [IMAGES]]
+"""
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from pisak.blog import html_parsers
+
+
+#: Number of times every operation is repeated
+REPEAT = 20
+
+
+def generate_post(paragraphs, images):
+    """
+    Generate HTML content of a post.
+
+    :param paragraphs: number of paragraphs.
+    :param images: number of images, spread between the paragraphs.
+
+    :return: html text.
+    """
+    rand = random.Random(paragraphs * 1000 + images)
+    words = ["zażółć", "gęślą", "jaźń", "blog", "post", "&amp;", "tekst",
+             "<b>pogrubiony</b>", "<a href='http://example.com'>link</a>"]
+    step = max(1, paragraphs // images) if images else 0
+    parts = []
+    for idx in range(paragraphs):
+        parts.append("<p>" + " ".join(
+            rand.choice(words) for _ in range(60)) + "<br/>koniec</p>")
+        if step and idx % step == 0 and idx // step < images:
+            parts.append(
+                '<img class="size-large" src="https://example.files.'
+                'wordpress.com/2016/05/photo{}.jpg?w=800&amp;h=600" '
+                'alt="" width="800" height="600" />'.format(idx))
+    return "\n".join(parts)
+
+
+def _soup_list_images(content):
+    return [img.get("src") for img in
+            BeautifulSoup(content, "html.parser").find_all("img")]
+
+
+def _soup_extract_text(content):
+    parser = BeautifulSoup(content, "html.parser")
+    html_parsers.convert_linebreaks(parser)
+    return parser.get_text().strip()
+
+
+def _soup_delete_images(content):
+    parser = BeautifulSoup(content, "html.parser")
+    for img in parser.find_all("img"):
+        img.replace_with("")
+    return parser.prettify()
+
+
+def _soup_edit(content):
+    # what editing the post text and replacing the photo run in a row
+    _soup_extract_text(content)
+    html_parsers.embed_images("tekst", _soup_list_images(content))
+    html_parsers.embed_images(_soup_delete_images(content), "photo.jpg")
+
+
+def _single_pass_edit(content):
+    html_parsers.extract_text(content)
+    html_parsers.embed_images("tekst", html_parsers.list_images(content))
+    html_parsers.embed_images(html_parsers.delete_images(content),
+                              "photo.jpg")
+
+
+def _single_pass_cold_edit(content):
+    html_parsers.parse.cache_clear()
+    _single_pass_edit(content)
+
+
+VARIANTS = (("soup", _soup_edit), ("single-pass", _single_pass_cold_edit),
+            ("single-pass, parsed before", _single_pass_edit))
+
+
+def run(paragraphs, images):
+    """
+    Run the benchmark.
+
+    :param paragraphs: number of paragraphs of the post.
+    :param images: number of images in the post.
+
+    :return: dictionary with variant names as keys and mean times
+    of editing the post, in seconds, as values.
+    """
+    content = generate_post(paragraphs, images)
+    assert _soup_list_images(content) == html_parsers.list_images(content)
+    assert _soup_extract_text(content) == html_parsers.extract_text(content)
+    results = {}
+    for name, edit in VARIANTS:
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            edit(content)
+        results[name] = (time.perf_counter() - start) / REPEAT
+    return results
+
+
+def main(args):
+    paragraphs = int(args[0]) if args else 200
+    images = int(args[1]) if len(args) > 1 else 50
+    print("post: {} paragraphs, {} images".format(paragraphs, images))
+    for name, mean in sorted(run(paragraphs, images).items()):
+        print("{}: {:.2f} ms".format(name, mean * 1000))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
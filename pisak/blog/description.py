@@ -31,6 +31,22 @@ MESSAGES = {
 }
 
 
+def _prerender_neighbours(blog, posts_data):
+    """
+    Render the posts next to the current one in the background,
+    so that they are displayed at once when the user pages to them.
+
+    :param blog: blog the posts come from.
+    :param posts_data: data source with the posts.
+    """
+    posts = posts_data.data
+    for direction in (1, -1):
+        neighbour = posts[
+            (posts_data.current_post_idx + direction) % len(posts)].content
+        if neighbour:
+            blog.prerender_post_view(neighbour)
+
+
 def on_init(window):
     try:
         wordpress.initialize_session()
@@ -163,6 +179,8 @@ def prepare_single_post_view(app, window, script, data):
             content_box.load_html(wordpress.blog.compose_post_view(content))
         except socket.timeout:
             window.load_popup(MESSAGES['too-slow-connection'], 'main_panel/main')
+        else:
+            _prerender_neighbours(wordpress.blog, posts_data)
 
     load_new_post(0, post_item)
 
@@ -213,6 +231,8 @@ def prepare_followed_blog_single_post_view(app, window, script, data):
             content.load_html(data["blog"].compose_post_view(post_to_load.content))
         except socket.timeout:
             window.load_popup(MESSAGES['too-slow-connection'], 'main_panel/main')
+        else:
+            _prerender_neighbours(data["blog"], posts_data)
 
     load_new_post(0, post_item)
 
@@ -34,3 +34,10 @@ class BlogMethodError(exceptions.PisakException):
     Error raised when any unexpected blog-related condition occurs.
     """
     pass
+
+
+class BlogMediaError(exceptions.PisakException):
+    """
+    Error raised when a media file can not be prepared for the upload.
+    """
+    pass
@@ -2,13 +2,23 @@
 Library of blog application specific signal handlers.
 """
 import socket
+import threading
+
+from gi.repository import Clutter
 
 import pisak
-from pisak import signals, exceptions
+from pisak import signals, exceptions, logger
 from pisak.blog import wordpress
 
 
+_LOG = logger.get_logger(__name__)
+
+
 MESSAGES = {
+    "publishing": "Trwa publikowanie postu...",
+    "uploading-images": "Trwa publikowanie postu...\n"
+                        "Wysłano zdjęć: {} z {}.",
+    "published": "Post został opublikowany.",
     "publish-failed": "Nie udało się opublikować postu.\n"
                       "Sprawdź swoje łącze internetowe\n"
                       "i spróbuj jeszcze raz.",
@@ -23,6 +33,10 @@ MESSAGES = {
 }
 
 
+# whether a post is being published in the background
+_publishing = False
+
+
 @signals.registered_handler("blog/attach_post_content")
 def attach_post_content(text_field):
     """
@@ -52,16 +66,51 @@ def attach_post_title(text_field):
 @signals.registered_handler("blog/publish_pending_post")
 def publish_pending_post(source):
     """
-    Publish the currently edited post.
+    Publish the currently edited post. Images are uploaded and the post
+    is published in the background, while the progress is displayed.
+    """
+    global _publishing
+    post = wordpress.blog.pending_post
+    if post is None or _publishing:
+        return
+    _publishing = True
+    pisak.app.window.load_popup(MESSAGES['publishing'])
+    threading.Thread(target=_publish, args=(post,), daemon=True).start()
+
+
+def _publish(post):
+    """
+    Upload images of the post and publish it, reporting the progress
+    and the result in the main thread.
+
+    :param post: instance of the post.
     """
+    def in_main_thread(func, *args):
+        Clutter.threads_add_idle(0, lambda *_: func(*args))
+
+    def progress(done, total):
+        in_main_thread(pisak.app.window.load_popup,
+                       MESSAGES['uploading-images'].format(done, total))
+
+    def finish(message, unwind):
+        global _publishing
+        _publishing = False
+        pisak.app.window.load_popup(message, unwind)
+
     try:
-        wordpress.blog.attach_images(wordpress.blog.pending_post)
-        wordpress.blog.publish_post(wordpress.blog.pending_post)
+        wordpress.blog.attach_images(post, progress)
+        wordpress.blog.publish_post(post)
         wordpress.blog.pending_post = None
-    except exceptions.PisakException:
-        pisak.app.window.load_popup(MESSAGES['publish-failed'], 'blog/main')
     except socket.timeout:
-        pisak.app.window.load_popup(MESSAGES['timeout-expired-publish'], 'main_panel/main')
+        in_main_thread(finish, MESSAGES['timeout-expired-publish'],
+                       'main_panel/main')
+    except (exceptions.PisakException, socket.error):
+        in_main_thread(finish, MESSAGES['publish-failed'], 'blog/main')
+    except Exception:
+        _LOG.exception("Unexpected error while publishing the post.")
+        in_main_thread(finish, MESSAGES['publish-failed'], 'blog/main')
+    else:
+        in_main_thread(finish, MESSAGES['published'], 'blog/main')
 
 
 @signals.registered_handler("blog/delete_pending_post")
@@ -1,13 +1,74 @@
 """
 Set of various HTML parsers.
+
+Post content is processed in a single pass over its markup, with the
+precompiled patterns below, and the result of the pass is shared by all
+the operations on the same content, see `parse`.
 """
-from bs4 import BeautifulSoup
+import html
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+#: Number of the most recently parsed documents whose results are kept
+PARSE_CACHE_SIZE = 16
+
+# attributes of a tag, quoted values may contain '>'
+_ATTRIBUTES = r"""(?:"[^"]*"|'[^']*'|[^'">])*"""
+
+# comment, line break, image or any other tag
+_MARKUP = re.compile(
+    r"<!--.*?-->|<(br|img)\b(" + _ATTRIBUTES + r")>|<[/!?a-zA-Z]" +
+    _ATTRIBUTES + r">", re.IGNORECASE | re.DOTALL)
+
+_SRC = re.compile(r"""\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""",
+                  re.IGNORECASE)
+
+
+Parsed = namedtuple("Parsed", "text images without_images")
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse(content):
+    """
+    Process the html text in a single pass. Results for the same text
+    are reused, so the subsequent operations do not parse it again.
+
+    :param content: html text.
+
+    :return: `Parsed` tuple with the plain text, tuple of the image urls
+    and the html text with all the img tags removed.
+    """
+    text = []
+    images = []
+    without_images = []
+    position = 0
+    for match in _MARKUP.finditer(content):
+        chunk = content[position:match.start()]
+        text.append(chunk)
+        without_images.append(chunk)
+        position = match.end()
+        tag = (match.group(1) or "").lower()
+        if tag == "img":
+            src = _SRC.search(match.group(2))
+            if src is not None:
+                images.append(html.unescape(
+                    next(value for value in src.groups() if value is not None)))
+            continue
+        without_images.append(match.group(0))
+        if tag == "br":
+            text.append("\n")
+    text.append(content[position:])
+    without_images.append(content[position:])
+    return Parsed(html.unescape("".join(text)).strip(), tuple(images),
+                  "".join(without_images))
 
 
 def apply_linebreaks(text):
     """
     Convert python-style linebreaks to a html-style ones.
-    
+
     :param text: text with python-style linebreaks.
 
     :return: text with html-style linebreaks.
@@ -19,16 +80,15 @@ def apply_linebreaks(text):
 def apply_paragraphs(text):
     """
     Apply html-style paragraphs to the text.
-    
+
     :param text: text with python-style or no paragraphs.
 
     :return: text with html-style paragraphs.
     """
     paragraph_start = "<p>"
     paragraph_end = "</p>"
-    text = paragraph_start + text + paragraph_end
-    text.replace("\n\n", paragraph_end + paragraph_start)
-    return text
+    return paragraph_start + \
+        text.replace("\n\n", paragraph_end + paragraph_start) + paragraph_end
 
 
 def embed_images(content, image_urls):
@@ -56,10 +116,7 @@ def delete_images(content):
 
     :return: content with img tags removed.
     """
-    parser = BeautifulSoup(content)
-    for img in parser.find_all("img"):
-        img.replace_with("")
-    return parser.prettify()
+    return parse(content).without_images
 
 
 def list_images(content):
@@ -70,8 +127,7 @@ def list_images(content):
 
     :return: list of image urls.
     """
-    return [img.get("src") for img in
-            BeautifulSoup(content).find_all("img")]
+    return list(parse(content).images)
 
 
 def extract_text(content):
@@ -82,9 +138,7 @@ def extract_text(content):
 
     :return: plain text.
     """
-    parser = BeautifulSoup(content)
-    convert_linebreaks(parser)
-    return parser.get_text().strip()
+    return parse(content).text
 
 
 def convert_linebreaks(parser):
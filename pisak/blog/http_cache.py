@@ -0,0 +1,126 @@
+"""
+On-disk cache of the HTTP responses fetched by the blog clients.
+
+Responses are kept together with their validators, ETag and Last-Modified,
+so that a stale response can be revalidated with a conditional request
+and the server only answers '304 Not Modified' if nothing has changed.
+Responses are considered fresh for as long as the server allows with
+the 'Cache-Control: max-age' header, or for `DEFAULT_MAX_AGE` seconds,
+and are served then without any request at all.
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from pisak import logger, dirs
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Seconds a response without any explicit freshness is considered fresh
+DEFAULT_MAX_AGE = 60
+
+#: Seconds after which an unused response is removed from the cache
+EXPIRE_AFTER = 30 * 24 * 60 * 60
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)")
+
+_NO_STORE = re.compile(r"no-store|no-cache|private")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS responses ("
+    "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+    "body BLOB NOT NULL, fresh_until REAL NOT NULL, used REAL NOT NULL)"
+)
+
+
+Entry = namedtuple("Entry", "etag last_modified body fresh_until")
+
+
+def get_max_age(headers):
+    """
+    Get freshness lifetime of the response.
+
+    :param headers: response headers.
+
+    :return: number of seconds, 0 if the response should always
+    be revalidated.
+    """
+    cache_control = headers.get("Cache-Control", "")
+    if _NO_STORE.search(cache_control):
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+
+class HTTPCache:
+    """
+    Cache of the responses, stored in a sqlite database.
+    Can be used from many threads.
+
+    :param path: path to the database file.
+    """
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or dirs.HOME_BLOG_HTTP_CACHE_DB,
+                                     check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_SCHEMA)
+            self._conn.execute("DELETE FROM responses WHERE used < ?",
+                               (time.time() - EXPIRE_AFTER,))
+
+    def get(self, url):
+        """
+        Get the cached response.
+
+        :param url: URL address of the resource.
+
+        :return: `Entry` or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body, fresh_until FROM "
+                "responses WHERE url = ?", (url,)).fetchone()
+        return Entry(*row) if row else None
+
+    def put(self, url, headers, body):
+        """
+        Save the response.
+
+        :param url: URL address of the resource.
+        :param headers: response headers.
+        :param body: response body, bytes.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (url, headers.get("ETag"), headers.get("Last-Modified"),
+                 body, now + get_max_age(headers), now))
+
+    def refresh(self, url, headers):
+        """
+        Mark the response as fresh again, after the server has confirmed
+        that it has not been modified.
+
+        :param url: URL address of the resource.
+        :param headers: headers of the '304 Not Modified' response.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET fresh_until = ?, used = ? WHERE url = ?",
+                (now + get_max_age(headers), now, url))
+
+    def touch(self, url):
+        """
+        Mark the response as used.
+
+        :param url: URL address of the resource.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET used = ? WHERE url = ?",
+                               (time.time(), url))
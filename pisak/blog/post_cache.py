@@ -0,0 +1,212 @@
+"""
+Cache of the rendered blog posts.
+
+Composing a post view means fetching its comments and arranging everything
+into a single HTML document, whose images then have to be downloaded. Here
+the composed documents are kept in memory, keyed by the post id and its
+modification time, and the images are downloaded once and kept on the disk,
+so opening a post for the second time needs neither. Images are never
+waited for: a post is rendered at once with the local copies of the images
+that are already there and the remote addresses of the others, which are
+then downloaded in the background and put into the cached document.
+The neighbouring posts can be rendered in the background, in advance,
+so that paging between posts is instant.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent import futures
+from urllib.parse import urlparse
+
+import requests
+
+from pisak import logger, dirs, exceptions
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Number of rendered posts kept in memory
+CACHE_SIZE = 50
+
+#: Number of posts rendered in the background at the same time
+PRERENDER_WORKERS = 2
+
+#: Seconds after which an unused image is removed from the disk
+EXPIRE_AFTER = 30 * 24 * 60 * 60
+
+#: Seconds to wait for an image to be downloaded
+DOWNLOAD_TIMEOUT = 10
+
+_IMG_SRC = re.compile(
+    r"""(<img\b[^>]*?\bsrc\s*=\s*)(["'])(https?://.*?)\2""", re.IGNORECASE)
+
+
+class RenderedPostCache:
+    """
+    Cache of the rendered posts. Can be used from many threads.
+
+    :param directory: directory for the downloaded images.
+    :param size: number of the rendered posts kept in memory.
+    """
+
+    def __init__(self, directory=None, size=CACHE_SIZE):
+        self.directory = directory or dirs.HOME_BLOG_IMAGES_DIR
+        self.size = size
+        self._rendered = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=PRERENDER_WORKERS)
+        self._session = requests.Session()
+        self._cleaned = False
+
+    @property
+    def base_uri(self):
+        """
+        URI the rendered posts should be loaded with, so that they are
+        allowed to display the downloaded images.
+        """
+        return "file://" + self.directory + "/"
+
+    def get(self, key, render):
+        """
+        Get the rendered post, render it if it is not in the cache
+        or wait for it if it is being rendered in the background.
+
+        :param key: tuple identifying the version of the post,
+        e.g. the blog address, the post id and its modification time.
+        :param render: function composing the post, returns HTML.
+
+        :return: HTML with the images replaced by their local copies,
+        if there are any.
+        """
+        with self._lock:
+            if key in self._rendered:
+                self._rendered.move_to_end(key)
+                return self._rendered[key]
+            pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return pending.result()
+            except (exceptions.PisakException, OSError):
+                pass  # rendered again, the error is reported to the caller
+        return self._render(key, render)
+
+    def prerender(self, key, render):
+        """
+        Render the post in the background, unless it is already cached.
+
+        :param key: tuple identifying the version of the post.
+        :param render: function composing the post, returns HTML.
+        """
+        with self._lock:
+            if key in self._rendered or key in self._pending:
+                return
+            self._pending[key] = self._executor.submit(
+                self._prerender, key, render)
+
+    def _prerender(self, key, render):
+        try:
+            return self._render(key, render)
+        except (exceptions.PisakException, OSError) as exc:
+            _LOG.warning("Failed to prerender the post: {}".format(exc))
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _render(self, key, render):
+        missing = []
+        html = _IMG_SRC.sub(
+            lambda match: self._localize_image(match, missing), render())
+        with self._lock:
+            if not self._cleaned:
+                self._cleaned = True
+                self._executor.submit(self._remove_expired_images)
+            self._rendered[key] = html
+            self._rendered.move_to_end(key)
+            while len(self._rendered) > self.size:
+                self._rendered.popitem(last=False)
+            if missing:
+                self._executor.submit(self._download_images, key, missing)
+        return html
+
+    def _localize_image(self, match, missing=None):
+        """
+        Replace the image address with its local copy, if there is one.
+
+        :param missing: list the addresses of the images with no local
+        copy are appended to.
+        """
+        prefix, quote, url = match.groups()
+        url = url.replace("&amp;", "&")
+        path = self._get_image_path(url)
+        if not os.path.isfile(path):
+            if missing is not None:
+                missing.append(url)
+            return match.group(0)
+        os.utime(path)
+        return prefix + quote + "file://" + path + quote
+
+    def _download_images(self, key, urls):
+        """
+        Download the images and put their local copies into the cached
+        post, if it is still there.
+        """
+        if not any([self._download_image(url) for url in urls]):
+            return
+        with self._lock:
+            html = self._rendered.get(key)
+        if html is None:
+            return
+        html = _IMG_SRC.sub(self._localize_image, html)
+        with self._lock:
+            if key in self._rendered:
+                self._rendered[key] = html
+
+    def _get_image_path(self, url):
+        extension = os.path.splitext(urlparse(url).path)[1][:5]
+        return os.path.join(
+            self.directory,
+            hashlib.sha1(url.encode("utf-8")).hexdigest() + extension)
+
+    def _download_image(self, url):
+        """
+        Download the image, unless there is a local copy already.
+
+        :return: True if the image has been downloaded.
+        """
+        path = self._get_image_path(url)
+        if os.path.isfile(path):
+            return False
+        try:
+            response = self._session.get(url, timeout=DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as exc:
+            _LOG.warning("Failed to download {}: {}".format(url, exc))
+            return False
+        partial = "{}.{}.part".format(path, threading.get_ident())
+        try:
+            with open(partial, "wb") as file:
+                file.write(response.content)
+            os.replace(partial, path)
+        except OSError as exc:
+            _LOG.warning("Failed to save {}: {}".format(url, exc))
+            return False
+        return True
+
+    def _remove_expired_images(self):
+        expired = time.time() - EXPIRE_AFTER
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < expired:
+                    os.remove(entry.path)
+            except OSError as exc:
+                _LOG.warning(exc)
+
+
+#: Cache of all the posts rendered by the blog application
+renderer = RenderedPostCache()
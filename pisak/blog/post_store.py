@@ -0,0 +1,255 @@
+"""
+Local mirror of the posts, pages and comments of the user's own blog.
+
+Everything displayed by the blog views is read from a local database, which
+is brought up to date with the blog in the background, so the views open
+at once, regardless of the size of the blog, and the blog can be browsed
+even without the Internet connection.
+
+Posts and comments are stored as the `wordpress_xmlrpc` objects they
+have been received as.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from pisak import logger, dirs
+
+
+_LOG = logger.get_logger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS posts ("
+    "id TEXT PRIMARY KEY, post_type TEXT NOT NULL, title TEXT, "
+    "date TEXT, modified TEXT, stored REAL NOT NULL, post BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS posts_by_date ON posts (post_type, date)",
+    "CREATE TABLE IF NOT EXISTS comments ("
+    "id TEXT PRIMARY KEY, post_id TEXT NOT NULL, date TEXT, "
+    "comment BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS comments_by_post ON comments (post_id, date)",
+    "CREATE TABLE IF NOT EXISTS state ("
+    "key TEXT PRIMARY KEY, value BLOB)"
+)
+
+
+def _isoformat(date):
+    return date.isoformat() if date is not None else None
+
+
+class PostStore:
+    """
+    Mirror of a single blog, stored in a sqlite database.
+    Can be used from many threads.
+
+    :param blog: address of the blog, whatever has been mirrored from
+    any other blog is dropped.
+    :param path: path to the database file.
+    """
+
+    def __init__(self, blog, path=None):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or dirs.HOME_BLOG_MIRROR_DB,
+                                     check_same_thread=False)
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        if self.get_state("blog") != blog:
+            with self._lock, self._conn:
+                for table in ("posts", "comments", "state"):
+                    self._conn.execute("DELETE FROM {}".format(table))
+            self.set_state("blog", blog)
+
+    def _query(self, sql, *params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get_state(self, key):
+        """
+        Get a value describing the state of the synchronization.
+
+        :param key: name of the value.
+
+        :return: the value or None if it has not been set.
+        """
+        rows = self._query("SELECT value FROM state WHERE key = ?", key)
+        return pickle.loads(rows[0][0]) if rows else None
+
+    def set_state(self, key, value):
+        """
+        Save a value describing the state of the synchronization.
+
+        :param key: name of the value.
+        :param value: any picklable value.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO state VALUES (?, ?)",
+                               (key, pickle.dumps(value)))
+
+    def get_post_ids(self, post_type="post"):
+        """
+        Get ids of all the mirrored posts.
+
+        :param post_type: type of the posts, 'post' or 'page'.
+
+        :return: list of ids, the most recent posts first.
+        """
+        return [ide for (ide,) in self._query(
+            "SELECT id FROM posts WHERE post_type = ? ORDER BY date DESC",
+            post_type)]
+
+    def get_post_versions(self, post_type="post"):
+        """
+        Get dates of the last modifications of all the mirrored posts.
+
+        :param post_type: type of the posts, 'post' or 'page'.
+
+        :return: dictionary with ids of the posts as keys and the dates
+        as values.
+        """
+        return {ide: modified and datetime.fromisoformat(modified)
+                for ide, modified in self._query(
+                    "SELECT id, modified FROM posts WHERE post_type = ?",
+                    post_type)}
+
+    def get_posts(self, ids):
+        """
+        Get the mirrored posts.
+
+        :param ids: list of ids of the posts.
+
+        :return: list of posts, None in place of any unknown post.
+        """
+        posts = {}
+        for ide, post in self._query(
+                "SELECT id, post FROM posts WHERE id IN ({})".format(
+                    ", ".join("?" * len(ids))), *ids):
+            posts[ide] = pickle.loads(post)
+        return [posts.get(ide) for ide in ids]
+
+    def get_many_posts(self, offset, number, post_type="post"):
+        """
+        Get the mirrored posts, the most recent first.
+
+        :param offset: number of posts to skip.
+        :param number: maximum number of posts to get.
+        :param post_type: type of the posts, 'post' or 'page'.
+
+        :return: list of posts.
+        """
+        return [pickle.loads(post) for (post,) in self._query(
+            "SELECT post FROM posts WHERE post_type = ? ORDER BY date DESC "
+            "LIMIT ? OFFSET ?", post_type, number, offset)]
+
+    def get_page(self, title):
+        """
+        Get page with the given title.
+
+        :param title: title of the page.
+
+        :return: the page or None.
+        """
+        rows = self._query(
+            "SELECT post FROM posts WHERE post_type = 'page' AND title = ? "
+            "ORDER BY date LIMIT 1", title)
+        return pickle.loads(rows[0][0]) if rows else None
+
+    def put_posts(self, posts):
+        """
+        Save the posts, replace their previous versions.
+
+        :param posts: list of posts or pages.
+
+        :return: number of the posts that are new or have been modified.
+        """
+        now = time.time()
+        changed = 0
+        with self._lock, self._conn:
+            for post in posts:
+                modified = _isoformat(post.date_modified)
+                row = self._conn.execute(
+                    "SELECT modified FROM posts WHERE id = ?",
+                    (post.id,)).fetchone()
+                if row is None or row[0] != modified:
+                    changed += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (post.id, getattr(post, "post_type", None) or "post",
+                     post.title, _isoformat(post.date), modified, now,
+                     pickle.dumps(post)))
+        return changed
+
+    def remove_posts(self, ids):
+        """
+        Remove the posts and their comments.
+
+        :param ids: list of ids of the posts.
+        """
+        with self._lock, self._conn:
+            for table, column in (("posts", "id"), ("comments", "post_id")):
+                self._conn.executemany(
+                    "DELETE FROM {} WHERE {} = ?".format(table, column),
+                    [(ide,) for ide in ids])
+
+    def remove_missing_posts(self, post_type, ids, before):
+        """
+        Remove the posts that no longer exist on the blog.
+
+        :param post_type: type of the posts, 'post' or 'page'.
+        :param ids: ids of all the posts of the type that exist on the blog.
+        :param before: time when the list of the existing posts has been
+        taken, posts saved later on are kept.
+
+        :return: number of the removed posts.
+        """
+        existing = set(ids)
+        missing = [ide for (ide,) in self._query(
+            "SELECT id FROM posts WHERE post_type = ? AND stored < ?",
+            post_type, before) if ide not in existing]
+        self.remove_posts(missing)
+        return len(missing)
+
+    def get_comments(self, post_id, number):
+        """
+        Get the mirrored comments for the post.
+
+        :param post_id: id of the post.
+        :param number: maximum number of the comments.
+
+        :return: list of comments, the most recent first.
+        """
+        return [pickle.loads(comment) for (comment,) in self._query(
+            "SELECT comment FROM comments WHERE post_id = ? "
+            "ORDER BY date DESC LIMIT ?", post_id, number)]
+
+    def put_comments(self, comments):
+        """
+        Save the comments, replace their previous versions.
+
+        :param comments: list of comments.
+
+        :return: number of the comments that have not been known before.
+        """
+        new = 0
+        with self._lock, self._conn:
+            for comment in comments:
+                if self._conn.execute(
+                        "SELECT 1 FROM comments WHERE id = ?",
+                        (comment.id,)).fetchone() is None:
+                    new += 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?)",
+                    (comment.id, comment.post, _isoformat(comment.date_created),
+                     pickle.dumps(comment)))
+        return new
+
+    def remove_comments(self, ids):
+        """
+        Remove the comments.
+
+        :param ids: list of ids of the comments.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM comments WHERE id = ?",
+                                   [(ide,) for ide in ids])
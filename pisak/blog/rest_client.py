@@ -1,49 +1,94 @@
 """
 Wordpress JSON REST API client implementation.
 """
+import json
 import socket
+import threading
 import time
+from urllib.parse import urlparse
+
 import requests
 
 from pisak import logger, blog
-from pisak.blog import exceptions, config
+from pisak.blog import exceptions, config, scheduler, http_cache, post_cache
 
 
 _LOG = logger.get_logger(__name__)
 
 
+_SESSIONS = {}
+
+_SESSIONS_LOCK = threading.Lock()
+
+_CACHE = None
+
+
+def _get_session(address):
+    """
+    Get session shared by all the clients of the blogs on the same host,
+    so that its connections are reused by the subsequent requests.
+    """
+    host = urlparse(address).netloc
+    with _SESSIONS_LOCK:
+        if host not in _SESSIONS:
+            session = requests.Session()
+            session.mount("https://", requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=scheduler.MAX_CONCURRENT))
+            _SESSIONS[host] = session
+        return _SESSIONS[host]
+
+
+def _get_cache():
+    global _CACHE
+    with _SESSIONS_LOCK:
+        if _CACHE is None:
+            _CACHE = http_cache.HTTPCache()
+        return _CACHE
+
+
 class Blog:
     """
     Client of a blog that makes a JSON API avalaible.
+    Responses are cached on the disk and revalidated with
+    conditional requests.
 
     :param address: blog's site domain (string) or ID (integer).
     """
     def __init__(self, address):
-        self._reqs_interval = 2.5  # minimal interval between subsequent reqests, in seconds
-        self._last_req_ts = 0  # timestamp of the last request
-
-        self._lock = RLock()
-
         self.max_posts = 100  # api's max
         self.max_comments = 100  # api's max
         self.address_base = "https://public-api.wordpress.com/rest/v1.1/sites/"
         self.address = self.address_base + str(address).replace("/", "%2F")
-
-    def _get(self, resource):
+        self._session = _get_session(self.address)
+
+    def _get(self, resource, priority=scheduler.INTERACTIVE):
+        url = self.address + resource
+        cache = _get_cache()
+        cached = cache.get(url)
+        if cached is not None and cached.fresh_until > time.time():
+            cache.touch(url)
+            return json.loads(cached.body.decode("utf-8"))
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
         try:
-            with self._lock:
-                if (time.time() - self._last_req_ts) < self._reqs_interval:
-                    # we should go to sleep for not too long because new
-                    # reqest can arrive at any time so maybe it can happen
-                    # that the timeout is just about to expire
-                    left_to_wait = self._reqs_interval - (time.time() - self._last_req_ts)
-                    time.sleep(left_to_wait)
-
-                self._last_req_ts = time.time()
-                ret = requests.get(self.address + resource).json()
-                self._last_req_ts = time.time()
-                return ret
+            response = scheduler.scheduler.run(
+                url, lambda: self._session.get(url, headers=headers),
+                priority)
+            if response.status_code == 304 and cached is not None:
+                cache.refresh(url, response.headers)
+                return json.loads(cached.body.decode("utf-8"))
+            ret = response.json()
+            if response.status_code == 200:
+                cache.put(url, response.headers, response.content)
+            return ret
         except requests.exceptions.ConnectionError as exc:
+            if cached is not None:
+                _LOG.warning("Serving stale {}: {}".format(url, exc))
+                return json.loads(cached.body.decode("utf-8"))
             raise exceptions.BlogInternetError(exc) from exc
         except socket.timeout:
             raise
@@ -70,7 +115,8 @@ class Blog:
         :return: list of posts.
         """
         res = self._get(
-            "/posts/?offset={}?number={}".format(str(offset), str(number)))
+            "/posts/?offset={}&number={}".format(str(offset), str(number)),
+            scheduler.PREFETCH)
         return res['posts'] if 'posts' in res else []
 
     def get_post(self, ide):
@@ -93,35 +139,57 @@ class Blog:
         """
         return self._get("/comments/{}".format(str(ide)))
         
-    def get_comments_for_post(self, post_ide):
+    def get_comments_for_post(self, post_ide, priority=scheduler.INTERACTIVE):
         """
         Get all comments for the given post.
 
         :param post_ide: id of the post.
+        :param priority: priority of the request, see `scheduler`.
 
         :return: list of all comments for the given post.
         Each comment is a dictionary
         """
         res = self._get(
             "/posts/{}/replies/?number={}".format(
-                str(post_ide), str(self.max_comments)))
+                str(post_ide), str(self.max_comments)), priority)
         return res['comments'] if 'comments' in res else []
 
     def compose_post_view(self, post):
         """
         Compose and arrange all the post elements into a single html document.
+        Composed documents are cached, see `post_cache`.
 
         :param post: post instance
 
         :return: properly constructed post view
         """
+        return post_cache.renderer.get(
+            self._get_view_key(post), lambda: self._compose_post_view(post))
+
+    def prerender_post_view(self, post):
+        """
+        Compose the post view in the background, so that it
+        can be displayed at once later on.
+
+        :param post: post instance
+        """
+        post_cache.renderer.prerender(
+            self._get_view_key(post),
+            lambda: self._compose_post_view(post, scheduler.PREFETCH))
+
+    def _get_view_key(self, post):
+        discussion = post.get("discussion") or {}
+        return (self.address, post["ID"], post.get("modified"),
+                discussion.get("comment_count"))
+
+    def _compose_post_view(self, post, priority=scheduler.INTERACTIVE):
         line_break = "<br>"
         space = 2 * line_break
         mark = '<div class="published">' + 'Post opublikowany  ' + \
                post["date"] + '</div>' + '<div class="author">' + \
                "Autor: " + post["author"]["name"] + '</div>'
         doc = [post["title"], post["content"], mark]
-        all_comments = self.get_comments_for_post(post["ID"])
+        all_comments = self.get_comments_for_post(post["ID"], priority)
         if all_comments:
             wrote = "  napisał/a  "
             comments_header = "KOMENTARZE({}):".format(len(all_comments))
@@ -0,0 +1,133 @@
+"""
+Scheduler of the requests sent by the blog clients.
+
+Requests to a single host are paced with a token bucket: short bursts are
+sent at once and only the longer series are slowed down to the sustained
+rate. Several requests to a host can be in progress at the same time and
+the ones the user is waiting for are always served first, without waiting
+for the requests loading data in the background.
+"""
+import heapq
+import itertools
+import threading
+import time
+from urllib.parse import urlparse
+
+
+#: Priority of the requests the user is waiting for
+INTERACTIVE = 0
+
+#: Priority of the requests loading data in the background
+PREFETCH = 1
+
+#: Sustained number of requests per second sent to a single host
+RATE = 2.0
+
+#: Number of requests that can be sent to a single host at once,
+#: after some time without any requests
+BURST = 6
+
+#: Maximum number of requests to a single host in progress at the same time
+MAX_CONCURRENT = 4
+
+
+class _Host:
+    """
+    Request budget of a single host.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.active = 0
+        self.waiting = []
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_to_token(self, reserve=0):
+        """
+        :param reserve: number of tokens that have to be left in the bucket,
+        never more than the bucket can hold besides the token taken.
+
+        :return: time in seconds until a token is available, 0 if it is
+        available right now.
+        """
+        reserve = min(reserve, self.burst - 1)
+        self.refill()
+        return max(0, (1 + reserve - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    """
+    Scheduler shared by all the blog clients. Can be used from many threads.
+
+    :param rate: sustained number of requests per second sent to a host.
+    :param burst: maximum number of requests sent to a host at once.
+    :param max_concurrent: maximum number of requests to a host
+    in progress at the same time.
+    """
+
+    def __init__(self, rate=RATE, burst=BURST, max_concurrent=MAX_CONCURRENT):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self._hosts = {}
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _get_host(self, address):
+        host = urlparse(address).netloc or address
+        if host not in self._hosts:
+            self._hosts[host] = _Host(self.rate, self.burst)
+        return self._hosts[host]
+
+    def run(self, address, request, priority=INTERACTIVE):
+        """
+        Run the request as soon as the budget of the host allows.
+
+        :param address: URL address the request is sent to.
+        :param request: function sending the request.
+        :param priority: priority of the request.
+
+        :return: whatever the request returns.
+        """
+        with self._cond:
+            host = self._get_host(address)
+            entry = (priority, next(self._sequence))
+            heapq.heappush(host.waiting, entry)
+            try:
+                while True:
+                    if host.waiting[0] != entry or \
+                            host.active >= self.max_concurrent:
+                        self._cond.wait()
+                        continue
+                    # background requests always leave one token
+                    # for the user, who then never waits for the pacing
+                    delay = host.time_to_token(
+                        0 if priority == INTERACTIVE else 1)
+                    if delay <= 0:
+                        break
+                    # woken up earlier if a more urgent request arrives
+                    self._cond.wait(delay)
+            finally:
+                host.waiting.remove(entry)
+                heapq.heapify(host.waiting)
+                self._cond.notify_all()
+            host.tokens -= 1
+            host.active += 1
+        try:
+            return request()
+        finally:
+            with self._cond:
+                host.active -= 1
+                self._cond.notify_all()
+
+
+#: Scheduler of all the requests of the blog application
+scheduler = RequestScheduler()
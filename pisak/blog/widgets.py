@@ -1,7 +1,8 @@
 """
 Module with widgets specific to the blog.
 """
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
 
 from gi.repository import Mx, GObject, Pango, Clutter, GtkClutter, WebKit, Gtk
@@ -9,7 +10,7 @@ from gi.repository import Mx, GObject, Pango, Clutter, GtkClutter, WebKit, Gtk
 import pisak
 from pisak import logger, pager, widgets, utils, layout, unit, properties, \
     dirs
-from pisak.blog import wordpress, config, html_parsers
+from pisak.blog import wordpress, config, html_parsers, post_cache
 
 
 _LOG = logger.get_logger(__name__)
@@ -22,10 +23,27 @@ post title defined.
 _NO_POST_TITLE = "BEZ TYTUŁU"
 
 
+_CSS = None
+
+
+def _get_css():
+    """
+    Get the blog stylesheet, read from the file only once.
+    """
+    global _CSS
+    if _CSS is None:
+        with open(dirs.get_blog_css_path()) as f:
+            _CSS = f.read()
+    return _CSS
+
+
 class PostTileSource(pager.DataSource):
     """
     Query the appropriate module for all posts that have been published on
     the blog. Produce a tile widget for each of them.
+
+    Posts of the own blog are read from its local mirror, by their ids,
+    and the data is updated when the mirror has been synchronized.
     """
     __gtype_name__ = "PisakBlogPostTileSource"
 
@@ -52,7 +70,10 @@ class PostTileSource(pager.DataSource):
         self._blog_type = value
         if value == 'own':
             now = datetime.now()
-            self._data_sorting_key = lambda post: now - post.date
+            maxdelta = timedelta(10**4)
+            self._data_sorting_key = lambda post: \
+                (now - post.date) if post else maxdelta
+            self.lazy_offset = None
         elif value == 'followed':
             self._data_sorting_key = lambda post: post['date']
 
@@ -93,7 +114,45 @@ class PostTileSource(pager.DataSource):
             return pisak.app.box['followed_blog'].get_many_posts(
                 offset, number)
 
+    def _query_portion_of_data(self, ids):
+        return wordpress.blog.get_posts(ids)
+
+    def _query_ids(self):
+        """
+        Serve ids of the posts from the local mirror of the blog
+        and synchronize it in the background.
+        """
+        wordpress.blog.sync_in_background(self._reconcile)
+        return wordpress.blog.get_post_ids()
+
+    def _reconcile(self):
+        """
+        Update the data with the current state of the mirror. Posts removed
+        from the mirror are dropped, only the new and the modified ones
+        are loaded, the rest is left to the lazy loader.
+        """
+        ids = wordpress.blog.get_post_ids()
+        versions = wordpress.blog.get_post_versions()
+        with self._lock:
+            loaded = dict(self._lazy_data)
+        stale = [ide for ide in ids if ide not in loaded or (
+            loaded[ide] is not None and
+            loaded[ide].date_modified != versions.get(ide))]
+        fresh = dict(zip(stale, wordpress.blog.get_posts(stale)))
+        with self._lock:
+            # posts loaded by the lazy loader in the meantime are kept
+            current = self._lazy_data
+            self._ids = ids
+            self._lazy_data = OrderedDict(
+                (ide, fresh[ide] if ide in fresh else current.get(ide))
+                for ide in ids)
+            values = list(self._lazy_data.values())
+        self.data = self.produce_data([(val, None) for val in values],
+                                      self._data_sorting_key)
+
     def _check_ids_range(self):
+        if self._blog_type == 'own':
+            return super()._check_ids_range()
         self._length = 100
         return list(map(str, range(0, 100)))
 
@@ -189,8 +248,7 @@ class BlogPost(Clutter.ScrollActor, properties.PropertyAdapter):
         self.settings.set_property('default-font-size', 30)
         self.view = WebKit.WebView()
         self.view.set_settings(self.settings)
-        with open(dirs.get_blog_css_path()) as f:
-            self.css = f.read()
+        self.css = _get_css()
         self.container = Gtk.ScrolledWindow()
         self.v_adj = self.container.get_vadjustment()
         self.container.add(self.view)
@@ -198,6 +256,9 @@ class BlogPost(Clutter.ScrollActor, properties.PropertyAdapter):
         self.add_child(self.view_actor)
         self.view.connect("document-load-finished", self._reload)
         self._upper_case = pisak.config.as_bool('upper_case')
+        if self._upper_case:
+            self.css += self.BODY_UPPERCASE
+        self._head = '<head><style>' + self.css + '</style></head>'
 
     @property
     def ratio_width(self):
@@ -227,17 +288,17 @@ class BlogPost(Clutter.ScrollActor, properties.PropertyAdapter):
         self.set_height(converted_value)
         self.view_actor.set_height(converted_value)
 
-    def load_html(self, html, ref_url="about::blank"):
+    def load_html(self, html, ref_url=None):
         """
         Load page directly from a HTML document.
 
         :param html: HTML document, string.
-        :param ref_url: reference URL address.
+        :param ref_url: reference URL address, by default the one
+        that allows displaying images cached by `post_cache`.
         """
-        if self._upper_case:
-            self.css += self.BODY_UPPERCASE
-        html = '<head><style>' + self.css + '</style></head><body>' + html + '</body>'
-        self.view.load_string(html, "text/html", "utf-8", ref_url)
+        html = self._head + '<body>' + html + '</body>'
+        self.view.load_string(html, "text/html", "utf-8",
+                              ref_url or post_cache.renderer.base_uri)
 
     def load_url(self, url):
         """
@@ -1,10 +1,13 @@
 """
 Module with tools to interface a WordPress based blog.
 """
-import time
+import copy
 import socket
 import threading
+import time
 import os.path
+from concurrent import futures
+from datetime import datetime
 from io import BytesIO
 
 import magic
@@ -12,26 +15,97 @@ import wordpress_xmlrpc
 import requests
 from PIL import Image
 
-from pisak import logger, dirs
-from pisak.blog import config, exceptions, html_parsers
+from pisak import logger, dirs, exceptions as pisak_exceptions
+from pisak.blog import config, exceptions, html_parsers, scheduler, \
+    post_store, post_cache
 from pisak.blog.connection import internet_on
 
 _LOG = logger.get_logger(__name__)
 
 
+#: Number of posts or comments fetched with a single request
+#: while synchronizing the local mirror of the blog
+SYNC_PAGE = 100
+
+#: Number of post ids fetched with a single request while looking
+#: for the posts deleted from the blog
+ID_PAGE = 1000
+
+#: Width in pixels the wider images are downsized to before the upload
+IMAGE_WIDTH = 1200
+
+#: Number of images prepared and uploaded at the same time
+UPLOAD_WORKERS = scheduler.MAX_CONCURRENT
+
+
 blog = None
 
+_MAGIC = None
+
+_MAGIC_LOCK = threading.Lock()
+
+
+def _get_mime_type(path):
+    """
+    Detect MIME type of the file, with a single detector shared
+    by all the uploads.
+    """
+    global _MAGIC
+    with _MAGIC_LOCK:
+        if _MAGIC is None:
+            _MAGIC = magic.open(magic.MIME_TYPE | magic.SYMLINK)
+            _MAGIC.load()
+        return _MAGIC.file(path)
+
+
+def _read_media(path):
+    """
+    Read content of the media file, JPEG and PNG images wider
+    than `IMAGE_WIDTH` are downsized.
+
+    :param path: path to the file.
+
+    :return: bytes.
+
+    :raise: `exceptions.BlogMediaError` if the image can not be read.
+    """
+    try:
+        with Image.open(path) as image:
+            if image.format in ("JPEG", "PNG") and image.width > IMAGE_WIDTH:
+                resized = image.resize(
+                    (IMAGE_WIDTH,
+                     round(image.height * IMAGE_WIDTH / image.width)),
+                    Image.LANCZOS)
+                buffer = BytesIO()
+                if image.format == "JPEG":
+                    # orientation of the photo is kept in its EXIF data
+                    resized.save(buffer, "JPEG", quality=90,
+                                 exif=image.info.get("exif", b""))
+                else:
+                    resized.save(buffer, "PNG")
+                return buffer.getvalue()
+    except Image.UnidentifiedImageError:
+        pass  # not an image, uploaded as it is
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) \
+            as exc:
+        raise exceptions.BlogMediaError(
+            "Image {} can not be read: {}".format(path, exc)) from exc
+    with open(path, "rb") as file:
+        return file.read()
+
 
 def initialize_session():
     """
     Initialize the blog instance and establish the connection for the
-    on-going use by the application.
+    on-going use by the application. Without the Internet connection
+    the blog is served from its local mirror, if there is any.
     This function must be executed before performing any operation on a
     wordpress blog.
     """
     global blog
     if blog is None:
-        blog = _OwnBlog()
+        blog = _OwnBlog(offline=True)
+        blog.sync_in_background()
     else:
         _LOG.warning(
             "Attempt to initialize already initialized blog connection.")
@@ -47,30 +121,31 @@ class Blog:
 
     def __init__(self, blog_address=None, custom_config=None):
         super().__init__()
-        self._reqs_interval = 2.5  # minimal interval between subsequent reqests, in seconds
-        self._last_req_ts = 0  # timestamp of the last request
-
-        self._lock = threading.RLock()
-
         self.address = blog_address
         self.config_dict = custom_config or config.get_blog_config()
         self._iface = None
+        # copies of the interface, one per thread, so that concurrent
+        # requests never share an HTTP connection
+        self._local = threading.local()
         self._login()
 
-    def _call(self, method):
+    def _get_iface(self):
+        iface = getattr(self._local, "iface", None)
+        if iface is None:
+            iface = copy.copy(self._iface)
+            iface.server = wordpress_xmlrpc.compat.xmlrpc_client.ServerProxy(
+                self._iface.url, allow_none=True)
+            self._local.iface = iface
+        return iface
+
+    def _call(self, method, priority=scheduler.INTERACTIVE):
+        if self._iface is None:
+            # session has been started offline
+            self._login()
         try:
-            with self._lock:
-                if (time.time() - self._last_req_ts) < self._reqs_interval:
-                    # we should go to sleep for not too long because new
-                    # request can arrive at any time so maybe it can happen
-                    # that the timeout is just about to expire
-                    left_to_wait = self._reqs_interval - (time.time() - self._last_req_ts)
-                    time.sleep(left_to_wait)
-
-                self._last_req_ts = time.time()
-                ret = self._iface.call(method)
-                self._last_req_ts = time.time()
-                return ret
+            return scheduler.scheduler.run(
+                self._iface.url, lambda: self._get_iface().call(method),
+                priority)
         except OSError as exc:
             raise exceptions.BlogInternetError(exc) from exc
         except wordpress_xmlrpc.exceptions.InvalidCredentialsError as exc:
@@ -98,7 +173,7 @@ class Blog:
             self._iface = wordpress_xmlrpc.Client(address,
                                                   self.config_dict["user_name"],
                                                   self.config_dict["password"])
-            self._last_req_ts = time.time()
+            self._local.iface = self._iface
         except OSError as exc:
             raise exceptions. BlogConfigurationError(exc) from exc
         except Exception as exc:
@@ -110,8 +185,10 @@ class Blog:
 
         :param post_id: id of the post to add the comment to.
         :param text: text of the comment.
+
+        :return: id of the new comment.
         """
-        self._call(wordpress_xmlrpc.methods.comments.NewComment(
+        return self._call(wordpress_xmlrpc.methods.comments.NewComment(
                    post_id, wordpress_xmlrpc.WordPressComment(
                        {"content": text})))
 
@@ -119,18 +196,36 @@ class Blog:
 class _OwnBlog(Blog):
     """
     Blog that the user has an administrative access to.
+    Posts, pages and comments are read from the local mirror of the blog,
+    see `post_store`, which is kept up to date with `sync`.
+
+    :param custom_config: blog configuration, the one from
+    the blog config file by default.
+    :param offline: whether the blog can be used without the Internet
+    connection, provided that it has already been mirrored.
     """
 
     USER_PHOTO_PATH = os.path.join(dirs.get_user_dir("pictures"),
                                    "blog_user_photo.jpg")
 
-    def __init__(self, custom_config=None):
+    def __init__(self, custom_config=None, offline=False):
         self.max_posts = 1000
         self.max_comments = 1000
         self.about_me_page_title = "O mnie"  # displayed title of the "About me" page
         self.pending_post = None  # post instance being edited at a moment
         self.post_images = []  # list to store images to be attached to the current post
-        super().__init__(custom_config=custom_config)
+        self._uploaded = {}  # URLs of the 'post_images' uploaded so far
+        config_dict = custom_config or config.get_blog_config()
+        self.store = post_store.PostStore(config_dict["address"])
+        self._sync_lock = threading.Lock()
+        try:
+            super().__init__(custom_config=config_dict)
+        except exceptions.BlogInternetError:
+            if not offline or self.store.get_state("post") is None:
+                raise
+            _LOG.warning("No Internet connection, blog is served "
+                         "from the local mirror.")
+            return
         if not self.get_about_me_page():
             self._create_about_me_page()
         self._cache_user_photo()
@@ -174,10 +269,16 @@ class _OwnBlog(Blog):
         if not (hasattr(post, "post_type") and post.post_type == "page"):
             post.comment_status = "open"
         if hasattr(post, "id"):
-            method = wordpress_xmlrpc.methods.posts.EditPost(post.id, post)
+            self._call(wordpress_xmlrpc.methods.posts.EditPost(post.id, post))
         else:
-            method = wordpress_xmlrpc.methods.posts.NewPost(post)
-        self._call(method)
+            post.id = self._call(wordpress_xmlrpc.methods.posts.NewPost(post))
+        try:
+            self.store.put_posts([self._call(
+                wordpress_xmlrpc.methods.posts.GetPost(post.id))])
+        except (pisak_exceptions.PisakException, socket.error) as exc:
+            # mirrored with the next synchronization
+            _LOG.warning("Published post {} could not be mirrored: {}".format(
+                post.id, exc))
 
     def attach_thumbnail(self, post, image_path):
         """
@@ -206,31 +307,52 @@ class _OwnBlog(Blog):
         post.content = html_parsers.embed_images(
             text, html_parsers.list_images(post.content))
 
-    def attach_images(self, post):
+    def attach_images(self, post, progress=None):
         """
         Upload all images stored on the 'post_images' list to the
-        server and attach them to the given post.
+        server and attach them to the given post. Images are prepared
+        and uploaded in parallel. If any upload fails, the images that
+        have been uploaded already are not sent again on the next attempt.
 
         :param post: instance of the post.
-        """
-        image_urls = []
-        for image_path in self.post_images:
-            # send image to the server
-            image_urls.append(self._upload_media(image_path)["url"])
-        post.content = html_parsers.embed_images(post.content, image_urls)
+        :param progress: function called with the number of the uploaded
+        images and the number of all the images, after each upload.
+        """
+        pending = [path for path in dict.fromkeys(self.post_images)
+                   if path not in self._uploaded]
+        total = len(dict.fromkeys(self.post_images))
+        done = total - len(pending)
+        failure = None
+        with futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as \
+                executor:
+            uploads = {executor.submit(self._upload_media, path): path
+                       for path in pending}
+            for upload in futures.as_completed(uploads):
+                try:
+                    self._uploaded[uploads[upload]] = upload.result()["url"]
+                except (pisak_exceptions.PisakException, socket.error) as exc:
+                    _LOG.warning("Failed to upload {}: {}".format(
+                        uploads[upload], exc))
+                    failure = failure or exc
+                    continue
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+        if failure is not None:
+            raise failure
+        post.content = html_parsers.embed_images(
+            post.content, [self._uploaded[path] for path in self.post_images])
         self.post_images.clear()
+        self._uploaded.clear()
 
     def _upload_media(self, media_path, post_id=None):
         data = {}
         if post_id:
             data["post_id"] = post_id
         data["name"] = os.path.basename(media_path)
-        magician = magic.open(magic.MIME_TYPE | magic.SYMLINK)
-        magician.load()
-        data["type"] = magician.file(media_path)
-        with open(media_path, "rb") as file:
-            data["bits"] = wordpress_xmlrpc.compat.xmlrpc_client.Binary(
-                file.read())
+        data["type"] = _get_mime_type(media_path)
+        data["bits"] = wordpress_xmlrpc.compat.xmlrpc_client.Binary(
+            _read_media(media_path))
         return self._call(wordpress_xmlrpc.methods.media.UploadFile(data))
 
     def update_about_me_bio(self, text):
@@ -263,12 +385,13 @@ class _OwnBlog(Blog):
         """
         Get page with informations about me.
 
-        :return: instance of the about me page.
+        :return: instance of the about me page or None.
         """
-        page_list = self._call(wordpress_xmlrpc.methods.posts.GetPosts(
-            {'post_type': 'page', 'title': self.about_me_page_title,
-             'number': 1}))
-        return page_list[0] if page_list else None
+        if self.store.get_state("page") is None:
+            # pages have never been mirrored, there are
+            # not many of them so they are fetched at once
+            self._sync_posts("page", scheduler.INTERACTIVE)
+        return self.store.get_page(self.about_me_page_title)
 
     def delete_post(self, post):
         """
@@ -277,6 +400,7 @@ class _OwnBlog(Blog):
         :param post: post to be deleted.
         """
         self._call(wordpress_xmlrpc.methods.posts.DeletePost(post.id))
+        self.store.remove_posts([post.id])
 
     def prepare_empty_post(self):
         """
@@ -292,9 +416,7 @@ class _OwnBlog(Blog):
 
         :return: list of posts sorted by date of the publication.
         """
-        return self._call(wordpress_xmlrpc.methods.posts.GetPosts(
-                {'number': self.max_posts,  'orderby': 'post_date',
-                 'order': 'DESC'}))
+        return self.store.get_many_posts(0, self.max_posts)
 
     def get_many_posts(self, offset, number):
         """
@@ -305,9 +427,34 @@ class _OwnBlog(Blog):
 
         :return: list of posts.
         """
-        return self._call(wordpress_xmlrpc.methods.posts.GetPosts(
-                {'offset': offset, 'number': number, 'orderby': 'post_date',
-                 'order': 'DESC'}))
+        return self.store.get_many_posts(offset, number)
+
+    def get_post_ids(self):
+        """
+        Get ids of all the posts.
+
+        :return: list of ids sorted by date of the publication.
+        """
+        return self.store.get_post_ids()
+
+    def get_post_versions(self):
+        """
+        Get dates of the last modifications of all the posts.
+
+        :return: dictionary with ids of the posts as keys and the dates
+        as values.
+        """
+        return self.store.get_post_versions()
+
+    def get_posts(self, ids):
+        """
+        Get the posts with the given ids.
+
+        :param ids: list of ids.
+
+        :return: list of posts, None in place of any unknown post.
+        """
+        return self.store.get_posts(ids)
 
     def get_all_comments_for_post(self, post_id):
         """
@@ -317,9 +464,26 @@ class _OwnBlog(Blog):
 
         :return: list of comment instances sorted by the creation date.
         """
-        return self._call(wordpress_xmlrpc.methods.comments.GetComments(
-                {"post_id": post_id, 'orderby': 'date_created',
-                    'order': 'DESC', 'number': self.max_comments}))
+        if self.store.get_state("comment") is None:
+            # comments have not been mirrored yet
+            comments = self._call(
+                wordpress_xmlrpc.methods.comments.GetComments(
+                    {"post_id": post_id, 'orderby': 'date_created',
+                     'order': 'DESC', 'number': self.max_comments}))
+            self.store.put_comments(comments)
+            return comments
+        return self.store.get_comments(post_id, self.max_comments)
+
+    def add_comment(self, post_id, text):
+        comment_id = super().add_comment(post_id, text)
+        try:
+            self.store.put_comments([self._call(
+                wordpress_xmlrpc.methods.comments.GetComment(comment_id))])
+        except (pisak_exceptions.PisakException, socket.error) as exc:
+            # mirrored with the next synchronization
+            _LOG.warning("Added comment {} could not be mirrored: {}".format(
+                comment_id, exc))
+        return comment_id
 
     def delete_comment(self, comment_id):
         """
@@ -328,6 +492,107 @@ class _OwnBlog(Blog):
         :param comment_id: id of the comment to be deleted.
         """
         self._call(wordpress_xmlrpc.methods.comments.DeleteComment(comment_id))
+        self.store.remove_comments([comment_id])
+
+    def sync(self):
+        """
+        Bring the local mirror up to date with the blog. Only the posts
+        modified and the comments added since the previous synchronization
+        are fetched.
+
+        :return: True if anything has changed, False otherwise.
+        """
+        with self._sync_lock:
+            changed = False
+            for post_type in ("post", "page"):
+                changed = self._sync_posts(post_type) or changed
+            return self._sync_comments() or changed
+
+    def sync_in_background(self, callback=None):
+        """
+        Synchronize the local mirror in a background thread.
+
+        :param callback: function called from the background thread
+        once the mirror has been synchronized, only if anything has changed.
+        """
+        def sync():
+            try:
+                changed = self.sync()
+            except (pisak_exceptions.PisakException, socket.error) as exc:
+                _LOG.warning("Blog synchronization failed: {}".format(exc))
+                return
+            if changed and callback is not None:
+                callback()
+
+        threading.Thread(target=sync, daemon=True).start()
+
+    def _sync_posts(self, post_type, priority=scheduler.PREFETCH):
+        """
+        Fetch posts of the given type, the most recently modified first,
+        until the ones that have been modified before the previous
+        synchronization are reached. Remove posts deleted from the blog.
+
+        :return: True if anything has changed, False otherwise.
+        """
+        since = self.store.get_state(post_type)
+        newest = since
+        changed = 0
+        offset = 0
+        while True:
+            posts = self._call(wordpress_xmlrpc.methods.posts.GetPosts(
+                {'post_type': post_type, 'orderby': 'post_modified',
+                 'order': 'DESC', 'offset': offset, 'number': SYNC_PAGE}),
+                priority) or []
+            fresh = [post for post in posts if
+                     since is None or post.date_modified >= since]
+            changed += self.store.put_posts(fresh)
+            for post in fresh:
+                if newest is None or post.date_modified > newest:
+                    newest = post.date_modified
+            if len(fresh) < SYNC_PAGE:
+                break
+            offset += SYNC_PAGE
+        changed += self._remove_deleted_posts(post_type, priority)
+        self.store.set_state(post_type, newest or datetime.min)
+        return changed > 0
+
+    def _remove_deleted_posts(self, post_type, priority):
+        listed = time.time()
+        ids = []
+        offset = 0
+        while True:
+            posts = self._call(wordpress_xmlrpc.methods.posts.GetPosts(
+                {'post_type': post_type, 'offset': offset,
+                 'number': ID_PAGE}, ['post_id']), priority) or []
+            ids.extend(post.id for post in posts)
+            if len(posts) < ID_PAGE:
+                break
+            offset += ID_PAGE
+        return self.store.remove_missing_posts(post_type, ids, listed)
+
+    def _sync_comments(self, priority=scheduler.PREFETCH):
+        """
+        Fetch comments, the most recent first, until the already known
+        ones are reached.
+
+        :return: True if anything has changed, False otherwise.
+        """
+        complete = self.store.get_state("comment") is not None
+        changed = 0
+        offset = 0
+        while True:
+            comments = self._call(
+                wordpress_xmlrpc.methods.comments.GetComments(
+                    {'offset': offset, 'number': SYNC_PAGE}), priority) or []
+            new = self.store.put_comments(comments)
+            changed += new
+            # once a known comment is reached, all the older ones are known
+            # too, unless the first synchronization has been interrupted
+            if len(comments) < SYNC_PAGE or complete and new < len(comments):
+                break
+            offset += SYNC_PAGE
+        self.store.set_state("comment", True)
+        return changed > 0
 
     def edit_user_profile(self, desc):
         """
@@ -357,17 +622,41 @@ class _OwnBlog(Blog):
     def compose_post_view(self, post):
         """
         Compose and arrange all the post elements into a single html document.
+        Composed documents are cached, see `post_cache`.
 
         :param post: post instance.
 
         :return: properly constructed post view.
         """
+        all_comments = self.get_all_comments_for_post(post.id)
+        return post_cache.renderer.get(
+            self._get_view_key(post, all_comments),
+            lambda: self._compose_post_view(post, all_comments))
+
+    def prerender_post_view(self, post):
+        """
+        Compose the post view in the background, so that it
+        can be displayed at once later on.
+
+        :param post: post instance.
+        """
+        if self.store.get_state("comment") is None:
+            return  # comments would have to be fetched right here
+        all_comments = self.get_all_comments_for_post(post.id)
+        post_cache.renderer.prerender(
+            self._get_view_key(post, all_comments),
+            lambda: self._compose_post_view(post, all_comments))
+
+    def _get_view_key(self, post, all_comments):
+        return (self.config_dict["address"], post.id, post.date_modified,
+                tuple(comment.id for comment in all_comments))
+
+    def _compose_post_view(self, post, all_comments):
         line_break = "<br>"
         space = 2 * line_break
         mark = '<div class="published">' + 'Post opublikowany  ' + \
                str(post.date) + '</div>'
         doc = [post.title, post.content, mark]
-        all_comments = self.get_all_comments_for_post(post.id)
         if all_comments:
             wrote = "  napisał/a:"
             comments_header = "KOMENTARZE({}):".format(len(all_comments))
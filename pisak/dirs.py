@@ -133,6 +133,11 @@ Path to the symbols entries file generated by "symboler" application.
 """
 HOME_SYMBOLS_ENTRY = os.path.join(HOME_PISAK_DIR, "symbols_entry.ini")
 
+"""
+Index of the symbols spreadsheets compiled for "symboler" application.
+"""
+HOME_SYMBOLS_BOOK = os.path.join(HOME_PISAK_DATABASES, "symbols_book.json")
+
 """
 Path to a file containing all information and list of URLs to blogs that are being
 followed by the user.
@@ -145,6 +150,22 @@ credentials, blog address etc.
 """
 HOME_BLOG_CONFIG = os.path.join(HOME_PISAK_CONFIGS, "blog_config.ini")
 
+"""
+Local mirror of the posts, pages and comments of the user's own blog.
+"""
+HOME_BLOG_MIRROR_DB = os.path.join(HOME_PISAK_DATABASES, "blog_mirror.db")
+
+"""
+On-disk cache of the responses of the followed blogs.
+"""
+HOME_BLOG_HTTP_CACHE_DB = os.path.join(HOME_PISAK_DATABASES,
+                                       "blog_http_cache.db")
+
+"""
+Directory with local copies of the images embedded in the blog posts.
+"""
+HOME_BLOG_IMAGES_DIR = ensure_dir(os.path.join(HOME_PISAK_DIR, "blog_images"))
+
 """
 Path to a file where all the necessary setting of an email account are stored.
 """
@@ -156,11 +177,32 @@ Path to the file with email application address book.
 HOME_EMAIL_ADDRESS_BOOK = os.path.join(
     HOME_PISAK_DATABASES, "email_address_book.db")
 
+"""
+Local cache of the messages of the email account.
+"""
+HOME_EMAIL_CACHE_DB = os.path.join(HOME_PISAK_DATABASES, "email_cache.db")
+
+"""
+Queue of the email messages waiting to be sent.
+"""
+HOME_EMAIL_OUTBOX_DB = os.path.join(HOME_PISAK_DATABASES, "email_outbox.db")
+
 """
 Database with info about text files generated by the 'speller' application.
 """
 HOME_TEXT_DOCUMENTS_DB = os.path.join(HOME_PISAK_DATABASES,'documents.db')
 
+"""
+Database with n-gram counts learnt from the texts written by the user.
+"""
+HOME_USER_NGRAMS_DB = os.path.join(HOME_PISAK_DATABASES, 'user_n_grams.db')
+
+"""
+Directory with journals of the texts being written, used to recover them
+after a crash.
+"""
+HOME_JOURNALS_DIR = ensure_dir(os.path.join(HOME_PISAK_DIR, "journals"))
+
 
 # ----------------------------------------------------------------------
 
@@ -1,6 +1,10 @@
 """
 Email address book management.
 """
+import bisect
+import heapq
+import re
+import threading
 from contextlib import contextmanager
 from functools import wraps
 
@@ -32,13 +36,29 @@ class _Contact(_Base):
     photo = Column(String, nullable=True)
 
 
+class _ContactUsage(_Base):
+    """
+    Object representing number of messages sent to an address.
+    """
+    __tablename__ = "address_usage"
+
+    address = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+#: Engine shared by all the sessions, created together with the schema once
+_DB_ENGINE = create_engine(_DB_ENGINE_URL,
+                           connect_args={"check_same_thread": False})
+
+_Base.metadata.create_all(_DB_ENGINE)
+
+#: Factory of the database sessions
+_DBSession = orm.sessionmaker(bind=_DB_ENGINE, autoflush=False)
+
+
 @contextmanager
 def _establish_db_session():
-    engine = create_engine(_DB_ENGINE_URL)
-    _Base.metadata.create_all(engine)
-    session = orm.sessionmaker(autoflush=False)
-    session.configure(bind=engine)
-    db_session = session()
+    db_session = _DBSession()
     try:
         yield db_session
         db_session.commit()
@@ -67,10 +87,158 @@ def _db_session_handler(func):
             obj.sess = None
             return ret
         except SQLAlchemyError as exc:
+            # changes may have been applied to the index but not to the
+            # database, so the index is loaded anew
+            _INDEX.invalidate()
             raise AddressBookError(exc) from exc
     return wrapper
 
 
+#: Maximum number of suggestions returned by the contact search
+MAX_SUGGESTIONS = 10
+
+_TOKEN_SEPARATORS = re.compile(r"[\s.@_+-]+")
+
+
+def _tokenize(address, name):
+    """
+    Split the contact into lower-cased tokens it can be found by:
+    whole address, whole name and all their separate parts.
+    """
+    tokens = set()
+    for text in (address, name):
+        if text:
+            text = text.lower()
+            tokens.add(text)
+            tokens.update(token for token in _TOKEN_SEPARATORS.split(text)
+                          if token)
+    return tokens
+
+
+class _ContactIndex:
+    """
+    In-memory index of all the contacts, for a prefix search on their
+    names and addresses. Loaded from the database on the first use and
+    kept in sync by the `AddressBook` methods. Results are ranked by the
+    number of messages sent to the addresses. Can be used from many threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        # sorted list of (token, address) pairs
+        self._tokens = []
+        # tokens of each address
+        self._contacts = {}
+        self._usage = {}
+
+    def invalidate(self):
+        """
+        Drop the index, it will be loaded again on the next use.
+        """
+        with self._lock:
+            self._loaded = False
+            self._tokens = []
+            self._contacts = {}
+            self._usage = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        try:
+            with _establish_db_session() as sess:
+                contacts = sess.query(_Contact.address, _Contact.name).all()
+                usage = sess.query(_ContactUsage.address,
+                                   _ContactUsage.count).all()
+        except SQLAlchemyError as exc:
+            raise AddressBookError(exc) from exc
+        self._contacts = {address: _tokenize(address, name)
+                          for address, name in contacts}
+        self._tokens = sorted((token, address) for address, tokens in
+                              self._contacts.items() for token in tokens)
+        self._usage = dict(usage)
+        self._loaded = True
+
+    def add(self, address, name):
+        """
+        Add the contact to the index.
+
+        :param address: address of the contact.
+        :param name: name of the contact or None.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            self.remove(address)
+            tokens = _tokenize(address, name)
+            self._contacts[address] = tokens
+            for token in tokens:
+                bisect.insort(self._tokens, (token, address))
+
+    def remove(self, address):
+        """
+        Remove the contact from the index.
+
+        :param address: address of the contact.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            for token in self._contacts.pop(address, ()):
+                idx = bisect.bisect_left(self._tokens, (token, address))
+                if idx < len(self._tokens) and \
+                        self._tokens[idx] == (token, address):
+                    del self._tokens[idx]
+
+    def add_usage(self, address, count):
+        """
+        Update the number of messages sent to the address.
+
+        :param address: address of the contact.
+        :param count: current number of messages.
+        """
+        with self._lock:
+            if self._loaded:
+                self._usage[address] = count
+
+    def _match_prefix(self, prefix):
+        tokens = self._tokens
+        idx = bisect.bisect_left(tokens, (prefix,))
+        matches = set()
+        while idx < len(tokens) and tokens[idx][0].startswith(prefix):
+            matches.add(tokens[idx][1])
+            idx += 1
+        return matches
+
+    def search(self, feed, limit=MAX_SUGGESTIONS):
+        """
+        Find contacts that have a token starting with each of the
+        words of the feed.
+
+        :param feed: text typed by the user.
+        :param limit: maximum number of the results.
+
+        :return: list of addresses, the most frequently used first.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            words = feed.lower().split()
+            if words:
+                matches = self._match_prefix(words[0])
+                for word in words[1:]:
+                    matches.intersection_update(self._match_prefix(word))
+            else:
+                matches = self._contacts
+            usage = self._usage
+            return heapq.nsmallest(
+                limit, matches,
+                key=lambda address: (-usage.get(address, 0), address))
+
+
+#: Index shared by all the address book instances
+_INDEX = _ContactIndex()
+
+
 class AddressBookError(exceptions.PisakException):
     """
     Address book unexpected condition, maybe problems when accessing the database.
@@ -93,7 +261,7 @@ class AddressBook(text_tools.Predictor):
     def __init__(self):
         super().__init__()
         self.sess = None  # database session instance
-        self.basic_content = self._book_lookup()
+        self.basic_content = _INDEX.search("")
         self.apply_props()
 
     def do_prediction(self, text, position):
@@ -102,10 +270,11 @@ class AddressBook(text_tools.Predictor):
 
         :param text: text to feed the predictor with.
         :param position: how many signs from the given text should ba taken.
+
+        :return: list of matching addresses.
         """
         feed = text[0 : position]
-        self.content = self._book_lookup(feed)
-        self.notify_content_update()
+        return _INDEX.search(feed)
 
     @_db_session_handler
     def get_contact(self, contact_id):
@@ -196,6 +365,7 @@ class AddressBook(text_tools.Predictor):
                     name=contact.get("name"),
                     address=address,
                     photo=contact.get("photo")))
+            _INDEX.add(address, contact.get("name"))
             return True
         else:
             _LOG.warning(
@@ -215,6 +385,7 @@ class AddressBook(text_tools.Predictor):
              _Contact.id == contact_id).first()
         if contact:
             self.sess.delete(contact)
+            _INDEX.remove(contact.address)
         else:
             _LOG.warning("Trying to delete not existing "
                             "contact with id: {}.".format(contact_id))
@@ -251,13 +422,23 @@ class AddressBook(text_tools.Predictor):
         contact = self.sess.query(_Contact).filter(
              _Contact.id == contact_id).first()
         if contact:
+            _INDEX.remove(contact.address)
             setattr(contact, key, value)
+            _INDEX.add(contact.address, contact.name)
 
     @_db_session_handler
-    def _book_lookup(self, feed=""):
-        match = self.sess.query(_Contact.address).filter(
-             _Contact.address.startswith(feed) |
-            (_Contact.name & _Contact.name.startswith(feed))).order_by(
-            _Contact.address).all()
-        self.sess.expunge_all()
-        return match
+    def record_usage(self, addresses):
+        """
+        Count a message sent to the given addresses, so that the most
+        frequently used contacts are suggested first.
+
+        :param addresses: list of addresses.
+        """
+        for address in addresses:
+            usage = self.sess.query(_ContactUsage).filter(
+                _ContactUsage.address == address).first()
+            if usage is None:
+                usage = _ContactUsage(address=address, count=0)
+                self.sess.add(usage)
+            usage.count += 1
+            _INDEX.add_usage(address, usage.count)
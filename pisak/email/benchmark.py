@@ -0,0 +1,114 @@
+"""
+Benchmark of the email previews parsing. Generates a response to a FETCH
+command of message headers, as received for a mailbox listing, and measures
+the time of parsing it in two variants:
+
+* single-pass - `parsers.parse_mailbox_list`, with cold and warm memos;
+* search - previous parser, looking for every header in the whole text.
+
+Usage::
+
+    python3 -m pisak.email.benchmark [MESSAGES]
+"""
+import random
+import sys
+import time
+
+from pisak.email import parsers
+
+
+def make_fetch_dump(count, headers=("Subject", "From", "Date"), seed=0):
+    """
+    Generate a synthetic response to a `HEADER.FIELDS` FETCH command,
+    in the form returned by `imaplib`, with repeated senders and dates,
+    encoded subjects and folded header lines, as in a real mailbox.
+
+    :param count: number of messages.
+    :param headers: names of the fetched headers.
+    :param seed: seed of the random generator.
+
+    :return: list of tuples with the response spec and raw headers,
+    interleaved with closing parentheses.
+    """
+    rand = random.Random(seed)
+    senders = ["Jan Kowalski <jan{}@example.com>".format(idx)
+               for idx in range(50)] + \
+        ["=?utf-8?q?Zofia_=C5=BB=C3=B3=C5=82w?= <zofia@example.com>",
+         "=?iso-8859-2?q?Pawe=B3?= <pawel@example.com>"]
+    subjects = ["Re: spotkanie {}".format(idx) for idx in range(200)] + \
+        ["=?utf-8?b?WmHFvMOzxYLEhyBnxJnFm2zEhSBqYcW6xYQ=?=",
+         "Bardzo d\u0142ugi temat wiadomo\u015bci, kt\u00f3ry\r\n "
+         "zosta\u0142 z\u0142amany na dwie linie"]
+    data = []
+    for uid in range(1, count + 1):
+        values = {
+            "Subject": rand.choice(subjects),
+            "From": rand.choice(senders),
+            "To": rand.choice(senders),
+            "Reply-To": rand.choice(senders),
+            "Date": "Mon, {} Jan 2018 {:02}:00:00 +0100".format(
+                rand.randint(1, 28), rand.randint(0, 23))
+        }
+        fields = ["Reply-To"] + list(headers)
+        raw = "".join("{}: {}\r\n".format(name, values[name])
+                      for name in fields) + "\r\n"
+        spec = "{} (UID {} BODY[HEADER.FIELDS ({})] {{{}}}".format(
+            uid, uid, " ".join(headers).upper(), len(raw))
+        data.append((spec.encode(), raw.encode(parsers.DEFAULT_CHARSET)))
+        data.append(b")")
+    return data
+
+
+def _parse_preview_by_search(uid, raw_headers, headers):
+    # previous parser, looking for every header in the whole text
+    parsed_msg = {"UID": uid}
+    str_msg = raw_headers.decode(parsers.DEFAULT_CHARSET, "replace")
+    for header_name in headers:
+        parsed_header = parsers._decode_header(str_msg[
+            str_msg.find(header_name) + len(header_name)+1: ].split("\r\n")[0])
+        if header_name == "Date":
+            parsed_msg[header_name] = \
+                parsers._parse_date.__wrapped__(parsed_header) or parsed_header
+        elif header_name in ("From", "To"):
+            parsed_msg[header_name] = parsers._get_addresses(parsed_header)
+        else:
+            parsed_msg[header_name] = parsed_header
+    return parsed_msg
+
+
+def run(count=10000, headers=("Subject", "From", "Date")):
+    """
+    Run the benchmark.
+
+    :param count: number of messages in the dump.
+    :param headers: names of the parsed headers.
+
+    :return: tuple with the time in seconds taken by the single-pass parser
+    with cold memos, with warm memos and by the previous parser.
+    """
+    data = make_fetch_dump(count, headers)
+    ids = [str(uid) for uid in range(count, 0, -1)]
+    parsers._decode_raw_header.cache_clear()
+    parsers._parse_date.cache_clear()
+    parsers._parse_address.cache_clear()
+    times = []
+    for _run in range(2):
+        start = time.perf_counter()
+        parsers.parse_mailbox_list(ids, data, headers)
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for idx, (_spec, msg) in enumerate(reversed(data[::2])):
+        _parse_preview_by_search(ids[idx], msg, headers)
+    times.append(time.perf_counter() - start)
+    return tuple(times)
+
+
+def main(args):
+    count = int(args[0]) if args else 10000
+    cold, warm, by_search = run(count)
+    print("{} previews: single pass {:.3f} s (warm memos {:.3f} s), "
+          "previous parser {:.3f} s".format(count, cold, warm, by_search))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
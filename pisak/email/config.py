@@ -76,6 +76,8 @@ class Config:
                 self.DEFAULT_SENT_BOX[server] if \
                 server in self.DEFAULT_SENT_BOX else \
                 self.DEFAULT_SENT_BOX["unknown"]
+        ret_setup["push_mail"] = self._config.as_bool("push_mail") if \
+            "push_mail" in self._config else True
         return ret_setup
 
     @staticmethod
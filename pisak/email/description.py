@@ -6,7 +6,8 @@ from gi.repository import GObject, Pango
 
 from pisak import res, logger, exceptions, handlers
 from pisak.viewer import model
-from pisak.email import address_book, message, imap_client, config, widgets
+from pisak.email import address_book, message, imap_client, config, \
+    widgets, watcher, outbox
 
 import pisak.email.handlers  # @UnusedImport
 import pisak.speller.handlers  # @UnusedImport
@@ -29,6 +30,8 @@ ELEMENTS = {
     "imap_client": imap_client.IMAPClient()
 }
 
+ELEMENTS["outbox"] = outbox.Outbox(ELEMENTS["imap_client"])
+
 
 VIEWS_MAP = {
     "new_message_initial_view": "email/speller_message_subject"
@@ -89,7 +92,8 @@ def prepare_main_view(app, window, script, data):
         return False
     
     client = app.box["imap_client"]
-    oblig_keys =  {key:client._setup[key] for key in client._setup if key!='sent_folder'}
+    oblig_keys =  {key:client._setup[key] for key in client._setup
+                   if key not in ('sent_folder', 'push_mail')}
     if ( any(bool(value) == False for value in oblig_keys.values()) ):
             window.load_popup(MESSAGES["empty_config"], 'main_panel/main')
             return False
@@ -103,14 +107,27 @@ def prepare_main_view(app, window, script, data):
             window.load_popup(MESSAGES["login_fail"], app.main_quit)
             return False
         else:
-            try:
-                inbox_all, inbox_unseen = client.get_inbox_status()
+            def show_inbox_status(inbox_all, inbox_unseen):
                 window.ui.button_inbox.set_extra_label(
                     counter_label.format("  /  ".join([str(inbox_unseen),
                                                        str(inbox_all)]))
                 )
+
+            try:
+                show_inbox_status(*client.get_inbox_status())
             except imap_client.IMAPClientError:
                 return False # TODO: do something
+
+            # messages left unsent by the previous sessions
+            app.box["outbox"].start()
+
+            inbox_watcher = _start_inbox_watcher(app)
+            if inbox_watcher is not None:
+                handler = inbox_watcher.connect(
+                    "inbox-status", lambda _watcher, inbox_all, inbox_unseen:
+                    show_inbox_status(inbox_all, inbox_unseen))
+                window.ui.button_inbox.connect(
+                    "destroy", lambda *_: inbox_watcher.disconnect(handler))
             
             try:
                 sent_box_count = client.get_sent_box_count()
@@ -127,6 +144,22 @@ def prepare_main_view(app, window, script, data):
         window.load_popup(MESSAGES["unknown"], app.main_quit)
         return False
             
+
+def _start_inbox_watcher(app):
+    """
+    Start watching the inbox for new messages in the background, unless
+    it is being watched already or it has been switched off in the config.
+
+    :param app: reference to the application.
+
+    :return: `watcher.MailboxWatcher` instance or None.
+    """
+    client = app.box["imap_client"]
+    if "inbox_watcher" not in app.box and client._setup.get("push_mail"):
+        app.box["inbox_watcher"] = watcher.MailboxWatcher(client)
+        app.box["inbox_watcher"].start()
+    return app.box.get("inbox_watcher")
+
 def prepare_drafts_view(app, window, script, data):
     """
     View preparator.
@@ -191,6 +224,11 @@ def prepare_inbox_view(app, window, script, data):
                               container=window.ui.pager)
         else:
             data_source.lazy_loading = True
+            inbox_watcher = app.box.get("inbox_watcher")
+            if inbox_watcher is not None:
+                data_source.watch(inbox_watcher)
+                window.ui.pager.connect(
+                    "destroy", lambda *_: data_source.unwatch())
 
 
 def prepare_sent_view(app, window, script, data):
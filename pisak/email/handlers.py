@@ -3,9 +3,12 @@ Email application specific signal handlers.
 """
 import socket
 
-from pisak import exceptions, signals
+from pisak import exceptions, signals, logger
 from pisak.email.widgets import ERROR_MESSAGES
-from pisak.email import message
+from pisak.email import message, outbox, address_book
+
+
+_LOG = logger.get_logger(__name__)
 
 
 @signals.registered_handler("email/new_message_add_subject")
@@ -35,20 +38,27 @@ def add_body(text_box, app):
 @signals.registered_handler("email/new_message_send")
 def send(source, app):
     """
-    Send the new message.
+    Send the new message. Message is put in the outbox and sent in the
+    background, so nothing is lost when the network is down.
 
     :param source: source of a signal that triggered this function.
     :param app: application instance that stores the message
     that should be send.
     """
     try:
-        app.box["new_message"].send()
+        app.box["new_message"].send(app.box.get("outbox"))
     except socket.timeout:
         app.window.load_popup(ERROR_MESSAGES["too-slow-connection"], app.main_quit)
-    except message.EmailSendingError as e:
+    except (message.EmailSendingError, outbox.OutboxError) as e:
         app.window.load_popup(ERROR_MESSAGES["message_send_fail"],
                               "email/main")
     except exceptions.NoInternetError as e:
         app.window.load_popup(ERROR_MESSAGES["no_internet"], "email/main")
+    else:
+        try:
+            app.box["address_book"].record_usage(
+                app.box["new_message"].recipients)
+        except address_book.AddressBookError as exc:
+            _LOG.warning("Usage of the contacts not saved: {}".format(exc))
 
     app.box["new_message"].clear()
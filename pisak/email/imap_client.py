@@ -1,15 +1,23 @@
 """
 Module providing access to the email account through the imap client.
 """
+import os
 import threading
 import socket
+import select
+import ssl
 import imaplib
 import email
 import time
 import functools
+import re
+import collections
+import contextlib
+import heapq
+import itertools
 
-from pisak import logger, exceptions
-from pisak.email import config, parsers
+from pisak import logger, exceptions, dirs
+from pisak.email import config, parsers, message_cache
 
 
 # monkeypatch because of too low limit set by default in the std module,
@@ -19,6 +27,18 @@ imaplib._MAXLINE = 1000000
 
 _LOG = logger.get_logger(__name__)
 
+_FETCH_UID = re.compile(rb"UID (\d+)")
+
+_IDLE_CHANGE = re.compile(rb"\* (\d+ (EXISTS|EXPUNGE|FETCH)|VANISHED)\b")
+
+_LITERAL = re.compile(rb"\{(\d+)\}$")
+
+#: Maximum number of messages fetched with a single command
+FETCH_BATCH_SIZE = 50
+
+#: Size in bytes of the chunks that attachments are fetched in
+ATTACHMENT_CHUNK_SIZE = 2**20
+
 
 class IMAPClientError(exceptions.PisakException):
     """
@@ -42,6 +62,13 @@ class InvalidCredentialsError(IMAPClientError):
     pass
 
 
+class AttachmentError(IMAPClientError):
+    """
+    Error raised when an attachment can not be saved.
+    """
+    pass
+
+
 def _imap_errors_handler(custom_error):
         """
         Decorator. Handles errors related to IMAP server connection.
@@ -70,27 +97,49 @@ MAILBOX_HEADERS = {
 }
 
 
-class IMAPClient:
+#: Priority of the requests the user is waiting for
+INTERACTIVE = 0
+
+#: Priority of the requests loading data in the background
+PREFETCH = 1
+
+#: Maximum number of connections to the server kept by a single client
+POOL_SIZE = 3
+
+#: Seconds after which an idle connection is sent a NOOP, so that
+#: neither the server nor any NAT on the way drops it
+KEEPALIVE_INTERVAL = 240
+
+#: Seconds after which IDLE is restarted, the servers are allowed
+#: to drop connections idling for more than 30 minutes
+IDLE_TIMEOUT = 25 * 60
+
+#: Seconds between checks whether IDLE should be ended
+IDLE_POLL_INTERVAL = 0.5
+
+
+class IMAPConnection:
     """
-    Class representing an email account connection.
-    Used access protocol - IMAP.
+    Single authenticated connection to the IMAP server. Remembers which
+    mailbox is selected, so that it is not selected again by every command.
+    Not thread-safe, used by one thread at a time, through `ConnectionPool`.
+
+    :param setup: account setup.
     """
-    def __init__(self, custom_config=None):
-        self._lock = threading.RLock()
-        self._conn = None
+    def __init__(self, setup):
+        self._setup = setup
         self._positive_response_code = "OK"
-        self._setup = custom_config or config.Config().get_account_setup()
-        self._sent_box_name = self._setup["sent_folder"]
-
-    def _call(self, method, *args, **kwargs):
-        with self._lock:
-            func = getattr(self._conn, method)
-            return func(*args, **kwargs)
+        self._conn = None
+        # name of the currently selected mailbox and whether it is read-only
+        self._selected = None
+        self._selected_state = None
+        self.last_used = time.monotonic()
+        self._idle_stop = threading.Event()
 
     @_imap_errors_handler(IMAPClientError)
-    def login(self):
+    def connect(self):
         """
-        Login to the IMAP account.
+        Connect to the server and login to the account.
         """
         server_in = self._setup["IMAP_server"]
         port_in = self._setup["IMAP_port"]
@@ -108,12 +157,506 @@ class IMAPClient:
                 port_in = "143"
             self._conn = imaplib.IMAP4(server_in, port=port_in)
         self._do_login()
+        self._enable_condstore()
 
     @_imap_errors_handler(InvalidCredentialsError)
     def _do_login(self):
-        self._call('login',
-                   self._setup["address"],
-                   self._setup["password"])
+        self.call('login',
+                  self._setup["address"],
+                  self._setup["password"])
+
+    def _enable_condstore(self):
+        """
+        Enable the CONDSTORE extension if the server supports it, so that
+        the mod-sequence of a mailbox tells if anything has changed there.
+        """
+        try:
+            res, data = self.call('capability')
+            if res != self._positive_response_code:
+                return
+            capabilities = tuple(data[0].decode(
+                parsers.DEFAULT_CHARSET, "replace").upper().split())
+            self._conn.capabilities = capabilities
+            if "CONDSTORE" in capabilities and "ENABLE" in capabilities:
+                self.call('enable', 'CONDSTORE')
+        except imaplib.IMAP4.error as exc:
+            _LOG.warning("Could not enable CONDSTORE: {}".format(exc))
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call a method of the underlying `imaplib` connection.
+
+        :param method: name of the method.
+
+        :return: whatever the method returns.
+        """
+        self.last_used = time.monotonic()
+        return getattr(self._conn, method)(*args, **kwargs)
+
+    def select(self, mailbox, readonly=False, refresh=False):
+        """
+        Select the mailbox, unless it is selected already. Mailbox selected
+        for writing serves the read-only queries as well, the other way round
+        it has to be selected again.
+
+        :param mailbox: name of the mailbox.
+        :param readonly: whether the mailbox is only going to be read,
+        it is EXAMINEd then, so that no flags can change by accident.
+        :param refresh: whether the mailbox should be selected anyway, to get
+        its current state.
+
+        :return: tuple with number of messages in the mailbox, its UIDVALIDITY
+        and its highest mod-sequence, None if the server does not support it,
+        as of the time the mailbox was selected.
+        """
+        if not refresh and self._selected is not None and \
+                self._selected[0] == mailbox and \
+                (readonly or not self._selected[1]):
+            return self._selected_state
+        self._selected = None
+        res, data = self.call('select', mailbox, readonly)
+        if res != self._positive_response_code:
+            raise MailboxNotFoundError(
+                "Can not select mailbox {}.".format(mailbox))
+        uidvalidity = self.call('response', 'UIDVALIDITY')[1][-1]
+        modseq = self.call('response', 'HIGHESTMODSEQ')[1][-1]
+        self._selected = (mailbox, readonly)
+        self._selected_state = int(data[0] or 0), int(uidvalidity or 0), \
+            int(modseq) if modseq else None
+        return self._selected_state
+
+    def fetch(self, uids, items):
+        """
+        Fetch data of many messages, split into batches of
+        `FETCH_BATCH_SIZE` messages. All the batch commands are sent
+        to the server at once and only then their responses are read,
+        so the whole fetch takes a single round-trip.
+
+        :param uids: list of UIDs of the messages in the selected mailbox.
+        :param items: message data items to be fetched.
+
+        :return: list of the raw FETCH responses.
+        """
+        batches = [",".join(map(str, uids[idx : idx + FETCH_BATCH_SIZE]))
+                   for idx in range(0, len(uids), FETCH_BATCH_SIZE)]
+        self.last_used = time.monotonic()
+        conn = self._conn
+        conn.untagged_responses.pop('FETCH', None)
+        tags = [conn._command('UID', 'FETCH', batch, items)
+                for batch in batches]
+        results = []
+        # every response has to be read, so that the connection stays usable
+        for tag in tags:
+            try:
+                results.append(conn._command_complete('UID', tag))
+            except imaplib.IMAP4.abort:
+                raise
+            except imaplib.IMAP4.error as exc:
+                results.append(("BAD", [exc]))
+        _typ, data = conn._untagged_response('OK', [None], 'FETCH')
+        for res, res_data in results:
+            if res != self._positive_response_code:
+                raise IMAPClientError("UID FETCH failed: {}.".format(res_data))
+        return [item for item in data if item is not None]
+
+    def stream(self, uid, section, chunk_size=ATTACHMENT_CHUNK_SIZE):
+        """
+        Fetch a section of a message in chunks, with partial FETCH commands.
+        Next chunk is requested before the previous one is read, so
+        the transfer does not stop for a round-trip after every chunk.
+
+        :param uid: UID of the message in the selected mailbox.
+        :param section: section specifier, like '2' or '1.3'.
+        :param chunk_size: size of a chunk in bytes.
+
+        :return: generator of raw chunks.
+        """
+        conn = self._conn
+        offsets = itertools.count(0, chunk_size)
+        pending = collections.deque()
+
+        def request():
+            pending.append(conn._command(
+                'UID', 'FETCH', str(uid), "(BODY.PEEK[{}]<{}.{}>)".format(
+                    section, next(offsets), chunk_size)))
+
+        self.last_used = time.monotonic()
+        conn.untagged_responses.pop('FETCH', None)
+        request()
+        request()
+        try:
+            while pending:
+                res, data = conn._command_complete('UID', pending.popleft())
+                _typ, fetched = conn._untagged_response('OK', [None], 'FETCH')
+                if res != self._positive_response_code:
+                    raise IMAPClientError("UID FETCH failed: {}.".format(data))
+                chunk = b"".join(item[1] for item in fetched if
+                                 isinstance(item, tuple))
+                if len(chunk) == chunk_size:
+                    request()
+                yield chunk
+        finally:
+            # responses to the commands sent already have to be read,
+            # so that the connection stays usable
+            for tag in pending:
+                try:
+                    conn._command_complete('UID', tag)
+                except imaplib.IMAP4.error:
+                    pass
+            conn.untagged_responses.pop('FETCH', None)
+            self.last_used = time.monotonic()
+
+    def uid_search(self, *criteria):
+        """
+        Search the selected mailbox.
+
+        :param criteria: search criteria.
+
+        :return: list of UIDs of the matching messages.
+        """
+        res, data = self.call('uid', 'SEARCH', *criteria)
+        if res != self._positive_response_code:
+            raise IMAPClientError("UID SEARCH failed: {}.".format(data))
+        return [int(uid) for uid in data[0].split()]
+
+    @property
+    def supports_idle(self):
+        """
+        Whether the server supports the IDLE command.
+        """
+        return "IDLE" in self._conn.capabilities
+
+    def idle(self, timeout=IDLE_TIMEOUT):
+        """
+        Wait, with the IDLE command, until the server reports a change
+        in the selected mailbox, `stop_idle` is called or the timeout
+        passes. Mailbox has to be selected first. IDLE is ended by this
+        very thread, at most `IDLE_POLL_INTERVAL` after it has been stopped.
+
+        :param timeout: maximum time of waiting, in seconds.
+
+        :return: True if the mailbox has changed, False otherwise.
+        """
+        conn = self._conn
+        tag = conn._new_tag()
+        conn.send(tag + b" IDLE\r\n")
+        deadline = time.monotonic() + timeout
+        confirmed = done = changed = False
+        try:
+            while True:
+                # DONE can be sent only after the server has confirmed the IDLE
+                if confirmed and not done and (
+                        changed or self._idle_stop.is_set() or
+                        time.monotonic() >= deadline):
+                    conn.send(b"DONE\r\n")
+                    done = True
+                if not self._wait_for_response(IDLE_POLL_INTERVAL):
+                    continue
+                line = conn._get_line()
+                literal = _LITERAL.search(line)
+                if literal:
+                    conn.read(int(literal.group(1)))
+                if line.startswith(tag):
+                    if line[len(tag):].split()[0] != b"OK":
+                        raise IMAPClientError("IDLE failed: {}.".format(line))
+                    return changed
+                if line.startswith(b"+"):
+                    confirmed = True
+                elif _IDLE_CHANGE.match(line):
+                    changed = True
+        finally:
+            conn.tagged_commands.pop(tag, None)
+            self._idle_stop.clear()
+            self.last_used = time.monotonic()
+
+    def _wait_for_response(self, timeout):
+        """
+        Wait until a response from the server can be read.
+
+        :param timeout: maximum time of waiting, in seconds.
+
+        :return: True if there is anything to read, False otherwise.
+        """
+        conn = self._conn
+        previous = conn.sock.gettimeout()
+        conn.sock.settimeout(0)
+        try:
+            # data read ahead, by imaplib or by the SSL layer, is never
+            # reported by select
+            buffered = conn.file.peek(1)
+        except (BlockingIOError, ssl.SSLWantReadError):
+            buffered = b""
+        finally:
+            conn.sock.settimeout(previous)
+        if buffered:
+            return True
+        return bool(select.select([conn.sock], [], [], timeout)[0])
+
+    def stop_idle(self):
+        """
+        Stop waiting with the IDLE command, the running one or the next
+        one to be started. Can be called from any thread, only a flag
+        is set, checked by the idling thread.
+        """
+        self._idle_stop.set()
+
+    def keep_alive(self):
+        """
+        Let the server know that the connection is still in use.
+        """
+        self.call('noop')
+
+    def close(self):
+        """
+        Close the selected mailbox, if any, and logout.
+        """
+        if self._selected is not None:
+            self.call('close')
+            self._selected = None
+        self.call('logout')
+
+
+class ConnectionPool:
+    """
+    Pool of connections to the IMAP server, opened on demand.
+    Requests are served in order of their priorities and one connection
+    is always left for the `INTERACTIVE` requests, so that the user never
+    waits behind the data loaded in the background. Idle connections
+    are kept alive by a background thread.
+
+    :param factory: function returning a new, ready to use connection.
+    :param size: maximum number of connections.
+    :param connections: list of connections opened already.
+    """
+    def __init__(self, factory, size=POOL_SIZE, connections=()):
+        self._factory = factory
+        self.size = size
+        self._idle = list(connections)
+        self._count = len(self._idle)
+        self._busy = {INTERACTIVE: 0, PREFETCH: 0}
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._keeper = threading.Thread(target=self._keep_alive, daemon=True)
+        self._keeper.start()
+
+    def _can_serve(self, priority):
+        if not self._idle and self._count >= self.size:
+            return False
+        return priority == INTERACTIVE or \
+            self._busy[PREFETCH] < max(1, self.size - 1)
+
+    def acquire(self, priority=INTERACTIVE):
+        """
+        Take a connection from the pool, waiting for it if necessary.
+
+        :param priority: priority of the request.
+
+        :return: connection.
+        """
+        with self._cond:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._waiting[0] != entry or \
+                        not self._can_serve(priority):
+                    self._cond.wait()
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            self._busy[priority] += 1
+            # the last idle connection is left for the interactive requests,
+            # unless no new connection can be opened
+            if self._idle and (priority == INTERACTIVE or len(self._idle) > 1
+                               or self._count >= self.size):
+                return self._idle.pop()
+            self._count += 1
+        try:
+            return self._factory()
+        except Exception:
+            self._discard(priority)
+            raise
+
+    def release(self, connection, priority=INTERACTIVE, broken=False):
+        """
+        Give the connection back to the pool.
+
+        :param connection: connection taken with `acquire`.
+        :param priority: priority the connection was taken with.
+        :param broken: whether the connection is not usable anymore.
+        """
+        if broken or self._closed.is_set():
+            self._discard(priority)
+            if not broken:
+                self._logout(connection)
+            return
+        with self._cond:
+            self._busy[priority] -= 1
+            self._idle.append(connection)
+            self._cond.notify_all()
+
+    def _discard(self, priority):
+        with self._cond:
+            self._busy[priority] -= 1
+            self._count -= 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def connection(self, priority=INTERACTIVE):
+        """
+        Context manager holding a connection from the pool. Connection
+        is discarded if it gets broken on the way.
+
+        :param priority: priority of the request.
+        """
+        connection = self.acquire(priority)
+        broken = False
+        try:
+            yield connection
+        except (imaplib.IMAP4.abort, socket.error):
+            broken = True
+            raise
+        finally:
+            self.release(connection, priority, broken)
+
+    def _keep_alive(self):
+        while not self._closed.wait(KEEPALIVE_INTERVAL / 4):
+            now = time.monotonic()
+            with self._cond:
+                stale = [connection for connection in self._idle if
+                         now - connection.last_used >= KEEPALIVE_INTERVAL]
+                for connection in stale:
+                    self._idle.remove(connection)
+                    self._busy[PREFETCH] += 1
+            for connection in stale:
+                try:
+                    connection.keep_alive()
+                except (imaplib.IMAP4.error, socket.error) as exc:
+                    _LOG.info("Idle IMAP connection dropped: {}".format(exc))
+                    self._discard(PREFETCH)
+                else:
+                    self.release(connection, PREFETCH)
+
+    def close(self):
+        """
+        Logout all the idle connections and stop keeping them alive.
+        """
+        self._closed.set()
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+        for connection in idle:
+            self._logout(connection)
+
+    @staticmethod
+    def _logout(connection):
+        try:
+            connection.close()
+        except (imaplib.IMAP4.error, socket.error) as exc:
+            _LOG.warning("Failed to logout: {}".format(exc))
+
+
+class IMAPClient:
+    """
+    Class representing an email account connection.
+    Used access protocol - IMAP.
+
+    Messages are identified by their UIDs. Their previews and contents
+    are kept in a local cache, so only the changes in the mailboxes are
+    fetched from the server. Requests are served by a pool of connections,
+    the ones with the `INTERACTIVE` priority first.
+
+    :param custom_config: account setup, the one from the email
+    config by default.
+    :param cache_path: path to the local cache database.
+    :param pool_size: maximum number of connections to the server.
+    """
+    def __init__(self, custom_config=None, cache_path=None,
+                 pool_size=POOL_SIZE):
+        self._lock = threading.RLock()
+        self._pool = None
+        self._pool_size = pool_size
+        self._positive_response_code = "OK"
+        self._setup = custom_config or config.Config().get_account_setup()
+        self._sent_box_name = self._setup["sent_folder"]
+        self._cache_path = cache_path or dirs.HOME_EMAIL_CACHE_DB
+        self._cache = None
+
+    @property
+    def cache(self):
+        """
+        Local cache of the account messages, opened on the first use.
+        """
+        with self._lock:
+            if self._cache is None:
+                self._cache = message_cache.MessageCache(
+                    self._cache_path, "{} {}".format(
+                        self._setup["address"], self._setup["IMAP_server"]))
+            return self._cache
+
+    def _connect(self):
+        connection = IMAPConnection(self._setup)
+        connection.connect()
+        return connection
+
+    def _run(self, operation, priority=INTERACTIVE, retry=True):
+        """
+        Run the operation on a connection from the pool. If the connection
+        turns out to be dropped by the server, the operation is retried,
+        once, on a new connection.
+
+        :param operation: function taking the connection as an argument.
+        :param priority: priority of the request.
+        :param retry: whether the operation can be safely retried.
+
+        :return: whatever the operation returns.
+        """
+        with self._lock:
+            pool = self._pool
+        if pool is None:
+            raise IMAPClientError("Not logged in.")
+        while True:
+            try:
+                with pool.connection(priority) as connection:
+                    return operation(connection)
+            except socket.timeout:
+                raise
+            except (imaplib.IMAP4.abort, socket.error) as exc:
+                if not retry:
+                    raise
+                retry = False
+                _LOG.warning("IMAP connection lost, reconnecting: {}".format(
+                    exc))
+
+    def _call(self, method, *args, **kwargs):
+        return self._run(
+            lambda connection: connection.call(method, *args, **kwargs))
+
+    @_imap_errors_handler(IMAPClientError)
+    def open_connection(self):
+        """
+        Open a new connection to the account, apart from the pool, for
+        a long running use, like waiting for changes with IDLE.
+        It should be closed by the caller.
+
+        :return: connection.
+        """
+        return self._connect()
+
+    @_imap_errors_handler(IMAPClientError)
+    def login(self):
+        """
+        Login to the IMAP account. Only the first connection is opened here,
+        the other ones are opened when needed.
+        """
+        connection = self._connect()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+            self._pool = ConnectionPool(self._connect, self._pool_size,
+                                        [connection])
 
     @_imap_errors_handler(IMAPClientError)
     def logout(self):
@@ -121,11 +664,9 @@ class IMAPClient:
         Logout from the account.
         """
         with self._lock:
-            conn_open = self._conn is not None
-        if conn_open:
-            self._call('select')
-            self._call('close')
-            self._call('logout')
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
         else:
             _LOG.warning("There is no connection to the email account."
                          "Nowhere to logout from.")
@@ -169,27 +710,65 @@ class IMAPClient:
         """
         return self._get_message(self._sent_box_name, id)
 
-    def get_many_previews_from_inbox(self, ids):
+    def get_many_previews_from_inbox(self, ids, priority=PREFETCH):
         """
         Get many previews with the given ids from the inbox.
 
         :param ids: list of ids of the messages.
+        :param priority: priority of the request.
 
         :return: list of dictionaries with the previews; or False on query failure.
         """
         return self._get_many_previews("INBOX", ids,
-                                       MAILBOX_HEADERS["inbox"])
+                                       MAILBOX_HEADERS["inbox"], priority)
 
-    def get_many_previews_from_sent_box(self, ids):
+    def get_many_previews_from_sent_box(self, ids, priority=PREFETCH):
         """
         Get previews with the given ids from the box of sent messages.
 
         :param ids: list of ids of the previewss.
+        :param priority: priority of the request.
 
         :return: list of dictionaries with the previews; or False on query failure.
         """
         return self._get_many_previews(self._sent_box_name, ids,
-                                       MAILBOX_HEADERS["sent_box"])
+                                       MAILBOX_HEADERS["sent_box"], priority)
+
+    def save_attachment_from_inbox(self, id, attachment, path):
+        """
+        Fetch an attachment of the message from the inbox and save it
+        to a file. Attachment is streamed to the disk in chunks, so it
+        is never held in memory as a whole.
+
+        :param id: id of the message.
+        :param attachment: attachment description, one of the 'Attachments'
+        field of the message.
+        :param path: path to the target file.
+        """
+        self._save_attachment("INBOX", id, attachment, path)
+
+    def save_attachment_from_sent_box(self, id, attachment, path):
+        """
+        Fetch an attachment of the message from the box of sent messages
+        and save it to a file.
+
+        :param id: id of the message.
+        :param attachment: attachment description, one of the 'Attachments'
+        field of the message.
+        :param path: path to the target file.
+        """
+        self._save_attachment(self._sent_box_name, id, attachment, path)
+
+    def append_to_sent_box(self, message):
+        """
+        Save a copy of the message that has been sent in the sent box.
+
+        :param message: message object or the whole message as a string.
+
+        :return: True on success, False otherwise.
+        """
+        return self._append_to_mailbox(self._sent_box_name, message,
+                                       "(\\Seen)")
 
     def delete_message_from_inbox(self, id):
         """
@@ -207,51 +786,130 @@ class IMAPClient:
         """
         self._delete_message(self._sent_box_name, id)
 
-    def get_inbox_ids(self):
+    def get_cached_inbox_ids(self):
+        """
+        Get a list of ids of the messages in the inbox known from the
+        previous synchronization, without querying the server.
+
+        :return: list of ids.
+        """
+        return self._get_cached_ids("INBOX")
+
+    def get_cached_sent_box_ids(self):
+        """
+        Get a list of ids of the messages in the sent box known from the
+        previous synchronization, without querying the server.
+
+        :return: list of ids.
+        """
+        return self._get_cached_ids(self._sent_box_name)
+
+    def get_inbox_ids(self, priority=INTERACTIVE):
         """
         Get a list of ids of all the messages in the inbox.
 
+        :param priority: priority of the request.
+
         :return: list of ids; or False on query failure.
         """
-        return self._get_ids("INBOX")
+        return self._get_ids("INBOX", priority)
 
-    def get_sent_box_ids(self):
+    def get_sent_box_ids(self, priority=INTERACTIVE):
         """
         Get a list of ids of all the messages in the sent box.
 
+        :param priority: priority of the request.
+
         :return: list of ids; or False on query failure.
         """
-        return self._get_ids(self._sent_box_name)
+        return self._get_ids(self._sent_box_name, priority)
 
     @_imap_errors_handler(IMAPClientError)
-    def _get_ids(self, mailbox):
-        self._call('select', mailbox)
-        res, ids_data = self._call('search', None, "ALL")
-        if res != self._positive_response_code:
-            ret = False
-        else:
-             ret = ids_data[0].decode(
-                     parsers.DEFAULT_CHARSET, "replace").split()
-        return list(reversed(ret))
+    def _sync(self, mailbox, priority=INTERACTIVE):
+        """
+        Bring the cached list of messages up to date with the server.
+        Only the messages newer than the ones already known are looked for.
+        The whole list of UIDs is fetched only if some of the messages
+        have been removed or if the mailbox UIDVALIDITY has changed.
+        When the server supports CONDSTORE and the mailbox mod-sequence
+        has not changed since the last synchronization, nothing is fetched.
+
+        :param mailbox: name of the mailbox.
+        :param priority: priority of the request.
+
+        :return: list of UIDs of all the messages, in ascending order.
+        """
+        cache = self.cache
+
+        def query(connection):
+            exists, uidvalidity, modseq = connection.select(
+                mailbox, readonly=True, refresh=True)
+            state = cache.get_state(mailbox)
+            if state is None or state[0] != uidvalidity:
+                cache.reset(mailbox, uidvalidity)
+                state = (uidvalidity, None)
+            known = cache.get_uids(mailbox)
+            if modseq is not None and modseq == state[1]:
+                return modseq, known, [], []
+            if known:
+                new = [uid for uid in connection.uid_search(
+                       "UID", "{}:*".format(known[-1] + 1)) if uid > known[-1]]
+            else:
+                new = connection.uid_search("ALL")
+            removed = []
+            if len(known) + len(new) != exists:
+                current = set(connection.uid_search("ALL"))
+                removed = [uid for uid in known if uid not in current]
+                new = sorted(current.difference(known))
+            return modseq, known, new, removed
+
+        modseq, known, new, removed = self._run(query, priority)
+        if new or removed:
+            cache.remove(mailbox, removed)
+            cache.add_uids(mailbox, new)
+        cache.set_highest_modseq(mailbox, modseq)
+        return sorted(set(known).difference(removed).union(new))
+
+    def _get_ids(self, mailbox, priority=INTERACTIVE):
+        return [str(uid) for uid in reversed(self._sync(mailbox, priority))]
+
+    def _get_cached_ids(self, mailbox):
+        return [str(uid) for uid in reversed(self.cache.get_uids(mailbox))]
 
     @_imap_errors_handler(IMAPClientError)
     def _delete_message(self, mailbox, id):
-        self._call('select', mailbox)
-        self._call('store', id, "+FLAGS", "\\Deleted")
-        self._call('expunge')
+        def query(connection):
+            connection.select(mailbox)
+            connection.call('uid', 'STORE', id, "+FLAGS", "\\Deleted")
+            connection.call('expunge')
+
+        self._run(query)
+        self.cache.remove(mailbox, [int(id)])
 
     @_imap_errors_handler(IMAPClientError)
-    def _get_many_previews(self, mailbox, ids, headers):
-        self._call('select', mailbox)
-        res, previews_data = self._call('fetch',
-                ",".join(ids),
-                "(BODY.PEEK[HEADER.FIELDS ({})])".format(
+    def _get_many_previews(self, mailbox, ids, headers, priority=PREFETCH):
+        uids = [int(id) for id in ids]
+        previews = self.cache.get_previews(mailbox, uids)
+        missing = [uid for uid in uids if uid not in previews]
+        if missing:
+            def query(connection):
+                connection.select(mailbox, readonly=True)
+                return connection.fetch(
+                    missing, "(BODY.PEEK[HEADER.FIELDS ({})])".format(
                         " ".join(headers).upper()))
-        if res != self._positive_response_code:
-            ret = False
-        else:
-            ret = parsers.parse_mailbox_list(ids, previews_data, headers)
-        return ret
+
+            fetched = {}
+            for item in self._run(query, priority):
+                match = _FETCH_UID.search(item[0]) if \
+                    isinstance(item, tuple) else None
+                if match:
+                    uid = int(match.group(1))
+                    fetched[uid] = parsers.parse_preview(
+                        str(uid), item[1], headers)
+            self.cache.put_previews(mailbox, fetched)
+            previews.update(fetched)
+        # messages removed in the meantime are left as None
+        return [previews.get(uid) for uid in uids]
 
     @_imap_errors_handler(IMAPClientError)
     def _find_mailboxes(self):
@@ -269,25 +927,92 @@ class IMAPClient:
 
     @_imap_errors_handler(IMAPClientError)
     def _get_message(self, mailbox, id):
-        self._call('select', mailbox)
-        res, msg_data = self._call('fetch', id, '(RFC822)')
-        if res != self._positive_response_code:
-            ret = False
-        else:
-            ret =  parsers.parse_message(
-                msg_data[0][1].decode(parsers.DEFAULT_CHARSET, "replace"))
+        """
+        Get the message, fetching only its headers and the text parts
+        that are displayed. Attachments are only described, they can be
+        fetched later on, when needed.
+        """
+        ret = self.cache.get_message(mailbox, int(id))
+        if ret is not None:
+            return ret
+
+        def query(connection):
+            connection.select(mailbox)
+            # fetching the headers without PEEK marks the message as seen
+            res, msg_data = connection.call(
+                'uid', 'FETCH', id, '(BODYSTRUCTURE BODY[HEADER])')
+            fetched = parsers.parse_fetch_response(msg_data) if \
+                res == self._positive_response_code else []
+            if not fetched or "BODYSTRUCTURE" not in fetched[0]:
+                return None
+            parts = parsers.parse_bodystructure(fetched[0]["BODYSTRUCTURE"])
+            texts = [part for part in parts if parsers.is_displayed_text(part)]
+            if not texts and len(parts) == 1 and \
+                    parts[0]["type"].startswith("text/"):
+                texts = parts
+            contents = {}
+            if texts:
+                res, msg_data = connection.call(
+                    'uid', 'FETCH', id, "({})".format(" ".join(
+                        "BODY.PEEK[{}]".format(part["part"])
+                        for part in texts)))
+                if res == self._positive_response_code:
+                    contents = (parsers.parse_fetch_response(msg_data) or
+                                [{}])[0]
+            return fetched[0].get("BODY[HEADER]") or b"", parts, texts, \
+                contents
+
+        result = self._run(query)
+        if result is None:
+            return False
+        headers, parts, texts, contents = result
+        body = [parsers.decode_part(
+                    contents.get("BODY[{}]".format(part["part"])) or b"",
+                    part["encoding"], part["charset"]) for part in texts]
+        ret = parsers.parse_message_parts(
+            headers, body, [part for part in parts if
+                            parsers.is_attachment(part)])
+        self.cache.put_message(mailbox, int(id), ret)
         return ret
 
+    @_imap_errors_handler(IMAPClientError)
+    def _save_attachment(self, mailbox, id, attachment, path,
+                         priority=INTERACTIVE):
+        def write(file, data):
+            try:
+                file.write(data)
+            except OSError as exc:
+                raise AttachmentError(exc) from exc
+
+        def query(connection):
+            connection.select(mailbox, readonly=True)
+            file.seek(0)
+            file.truncate()
+            decoder = parsers.TransferDecoder(attachment["encoding"])
+            for chunk in connection.stream(id, attachment["part"]):
+                write(file, decoder.decode(chunk))
+            write(file, decoder.flush())
+
+        try:
+            file = open(path, "wb")
+        except OSError as exc:
+            raise AttachmentError(exc) from exc
+        try:
+            with file:
+                self._run(query, priority)
+        except Exception:
+            # no partially saved files are left behind
+            os.remove(path)
+            raise
+
     @_imap_errors_handler(IMAPClientError)
     def _get_mailbox_count(self, mailbox):
-        self._call('select', mailbox)
-        res, ids_data = self._call('search', None, "ALL")
+        res, status_data = self._call('status', mailbox, "(MESSAGES)")
         if res != self._positive_response_code:
-            ret = False
-        else:
-            ret = len(ids_data[0].decode(
-                parsers.DEFAULT_CHARSET, "replace").split())
-        return ret
+            raise MailboxNotFoundError(
+                "Can not get status of mailbox {}.".format(mailbox))
+        status = status_data[0].decode(parsers.DEFAULT_CHARSET, "replace")
+        return int(status[status.find("MESSAGES") : ].split()[1].rstrip(")"))
 
     @_imap_errors_handler(IMAPClientError)
     def _get_mailbox_status(self, mailbox):
@@ -301,10 +1026,13 @@ class IMAPClient:
         return ret
 
     @_imap_errors_handler(IMAPClientError)
-    def _append_to_mailbox(self, mailbox, message):
-        res, _query_ret  = self._call('append',
-                 mailbox, "", imaplib.Time2Internaldate(time.time()),
-                message.as_string())
+    def _append_to_mailbox(self, mailbox, message, flags=""):
+        if not isinstance(message, str):
+            message = message.as_string()
+        # not retried, so that the message is never appended twice
+        res, _query_ret = self._run(lambda connection: connection.call(
+            'append', mailbox, flags, imaplib.Time2Internaldate(time.time()),
+            message.encode(parsers.DEFAULT_CHARSET)), retry=False)
         return res == self._positive_response_code
 
     @_imap_errors_handler(IMAPClientError)
@@ -21,6 +21,35 @@ class  EmailSendingError(exceptions.PisakException):
     pass
 
 
+def connect_smtp(setup):
+    """
+    Connect to the SMTP server and login to the account.
+
+    :param setup: account setup.
+
+    :return: `smtplib.SMTP` instance.
+    """
+    server_out = "{}:{}".format(
+            setup["SMTP_server"], setup["SMTP_port"])
+    try:
+        server = smtplib.SMTP(server_out)
+        server.ehlo_or_helo_if_needed()
+        if server.has_extn("STARTTLS"):
+            server.starttls(
+                keyfile=setup.get("keyfile"), certfile=setup.get("certfile"))
+        else:
+            _LOG.warning("Server does not support STARTTLS.")
+        server.ehlo_or_helo_if_needed()
+        server.login(setup["address"], setup["password"])
+        return server
+    except socket.timeout:
+        raise
+    except socket.error as exc:
+        raise exceptions.NoInternetError(exc) from exc
+    except (smtplib.SMTPException, SSLError) as exc:
+        raise EmailSendingError(exc) from exc
+
+
 class SimpleMessage:
     """
     Simple message consisting of just a subject, body and recipients.
@@ -113,25 +142,21 @@ class SimpleMessage:
         msg["Subject"] = Header(self._msg["subject"], self.charset)
         return msg
 
-    def send(self):
+    def send(self, outbox=None):
         """
-        Send the message through the SMTP.
+        Send the message through the SMTP. When the outbox is given,
+        the message is only put in its queue and sent in the background.
+
+        :param outbox: `outbox.Outbox` instance or None.
         """
         msg = self._compose_message()
+        if outbox is not None:
+            outbox.put(msg, list(self.recipients))
+            return True
         config_obj = config.Config()
         setup = config_obj.get_account_setup()
-        server_out = "{}:{}".format(
-                setup["SMTP_server"], setup["SMTP_port"])
         try:
-            server = smtplib.SMTP(server_out)
-            server.ehlo_or_helo_if_needed()
-            if server.has_extn("STARTTLS"):
-                server.starttls(
-                    keyfile=setup.get("keyfile"), certfile=setup.get("certfile"))
-            else:
-                _LOG.warning("Server does not support STARTTLS.")
-            server.ehlo_or_helo_if_needed()
-            server.login(setup["address"], setup["password"])
+            server = connect_smtp(setup)
             server.sendmail(setup["address"],
                             self.recipients, msg.as_string())
             server.quit()
@@ -0,0 +1,227 @@
+"""
+Local cache of the email messages. Keeps previews and parsed messages
+fetched from the IMAP server, so that a mailbox can be displayed at once and
+only the changes are fetched from the server afterwards.
+
+Messages are identified by their UIDs, which are valid only as long as the
+UIDVALIDITY value of the mailbox stays the same. When it changes, everything
+cached for the mailbox is dropped.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from pisak import logger
+
+
+_LOG = logger.get_logger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS mailboxes ("
+    "account TEXT NOT NULL, mailbox TEXT NOT NULL, "
+    "uidvalidity INTEGER NOT NULL, highest_modseq INTEGER, "
+    "PRIMARY KEY (account, mailbox))",
+    "CREATE TABLE IF NOT EXISTS previews ("
+    "account TEXT NOT NULL, mailbox TEXT NOT NULL, uid INTEGER NOT NULL, "
+    "preview TEXT, PRIMARY KEY (account, mailbox, uid))",
+    "CREATE TABLE IF NOT EXISTS messages ("
+    "account TEXT NOT NULL, mailbox TEXT NOT NULL, uid INTEGER NOT NULL, "
+    "message TEXT NOT NULL, PRIMARY KEY (account, mailbox, uid))"
+)
+
+_DATETIME_KEY = "__datetime__"
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return {_DATETIME_KEY: obj.isoformat()}
+    raise TypeError("Can not serialize {!r}.".format(obj))
+
+
+def _object_hook(obj):
+    if _DATETIME_KEY in obj:
+        return datetime.strptime(obj[_DATETIME_KEY][:19], "%Y-%m-%dT%H:%M:%S")
+    return obj
+
+
+def _dumps(value):
+    return json.dumps(value, default=_default)
+
+
+def _loads(value):
+    return json.loads(value, object_hook=_object_hook)
+
+
+class MessageCache:
+    """
+    Cache of the messages of a single email account, stored
+    in a sqlite database. Can be used from many threads.
+
+    :param path: path to the database file.
+    :param account: identifier of the account.
+    """
+
+    def __init__(self, path, account):
+        self.account = account
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+
+    def _query(self, sql, *params):
+        with self._lock:
+            return self._conn.execute(sql, (self.account,) + params).fetchall()
+
+    def _modify(self, sql, params_list):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                sql, [(self.account,) + tuple(params) for params in params_list])
+
+    def get_state(self, mailbox):
+        """
+        Get the synchronization state of the mailbox.
+
+        :param mailbox: name of the mailbox.
+
+        :return: tuple with UIDVALIDITY and the highest mod-sequence
+        or None if nothing has been cached for the mailbox yet.
+        """
+        rows = self._query(
+            "SELECT uidvalidity, highest_modseq FROM mailboxes "
+            "WHERE account = ? AND mailbox = ?", mailbox)
+        return rows[0] if rows else None
+
+    def reset(self, mailbox, uidvalidity):
+        """
+        Drop everything cached for the mailbox and start anew with
+        the given UIDVALIDITY.
+
+        :param mailbox: name of the mailbox.
+        :param uidvalidity: current UIDVALIDITY of the mailbox.
+        """
+        with self._lock, self._conn:
+            for table in ("previews", "messages", "mailboxes"):
+                self._conn.execute(
+                    "DELETE FROM {} WHERE account = ? AND mailbox = ?".format(
+                        table), (self.account, mailbox))
+            self._conn.execute(
+                "INSERT INTO mailboxes VALUES (?, ?, ?, NULL)",
+                (self.account, mailbox, uidvalidity))
+
+    def set_highest_modseq(self, mailbox, modseq):
+        """
+        Save the highest mod-sequence the mailbox has been synchronized to.
+
+        :param mailbox: name of the mailbox.
+        :param modseq: mod-sequence value or None.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE mailboxes SET highest_modseq = ? "
+                "WHERE account = ? AND mailbox = ?",
+                (modseq, self.account, mailbox))
+
+    def get_uids(self, mailbox):
+        """
+        Get UIDs of all the known messages of the mailbox.
+
+        :param mailbox: name of the mailbox.
+
+        :return: list of integers, in ascending order.
+        """
+        return [uid for (uid,) in self._query(
+            "SELECT uid FROM previews WHERE account = ? AND mailbox = ? "
+            "ORDER BY uid", mailbox)]
+
+    def add_uids(self, mailbox, uids):
+        """
+        Register new messages, whose previews have not been fetched yet.
+
+        :param mailbox: name of the mailbox.
+        :param uids: list of UIDs.
+        """
+        self._modify(
+            "INSERT OR IGNORE INTO previews VALUES (?, ?, ?, NULL)",
+            [(mailbox, uid) for uid in uids])
+
+    def remove(self, mailbox, uids):
+        """
+        Remove messages that no longer exist on the server.
+
+        :param mailbox: name of the mailbox.
+        :param uids: list of UIDs.
+        """
+        for table in ("previews", "messages"):
+            self._modify(
+                "DELETE FROM {} WHERE account = ? AND mailbox = ? "
+                "AND uid = ?".format(table),
+                [(mailbox, uid) for uid in uids])
+
+    def get_previews(self, mailbox, uids):
+        """
+        Get cached previews of the messages.
+
+        :param mailbox: name of the mailbox.
+        :param uids: list of UIDs.
+
+        :return: dictionary with UIDs as keys and previews as values,
+        messages without a cached preview are left out.
+        """
+        previews = {}
+        for uid in uids:
+            rows = self._query(
+                "SELECT preview FROM previews WHERE account = ? AND "
+                "mailbox = ? AND uid = ? AND preview IS NOT NULL",
+                mailbox, uid)
+            if rows:
+                previews[uid] = _loads(rows[0][0])
+        return previews
+
+    def put_previews(self, mailbox, previews):
+        """
+        Save previews of the messages.
+
+        :param mailbox: name of the mailbox.
+        :param previews: dictionary with UIDs as keys and previews as values.
+        """
+        self._modify(
+            "INSERT OR REPLACE INTO previews VALUES (?, ?, ?, ?)",
+            [(mailbox, uid, _dumps(preview))
+             for uid, preview in previews.items()])
+
+    def get_message(self, mailbox, uid):
+        """
+        Get the cached message.
+
+        :param mailbox: name of the mailbox.
+        :param uid: UID of the message.
+
+        :return: dictionary with the parsed message or None.
+        """
+        rows = self._query(
+            "SELECT message FROM messages WHERE account = ? AND "
+            "mailbox = ? AND uid = ?", mailbox, uid)
+        return _loads(rows[0][0]) if rows else None
+
+    def put_message(self, mailbox, uid, message):
+        """
+        Save the parsed message.
+
+        :param mailbox: name of the mailbox.
+        :param uid: UID of the message.
+        :param message: dictionary with the parsed message.
+        """
+        try:
+            self._modify("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)",
+                         [(mailbox, uid, _dumps(message))])
+        except TypeError as exc:
+            _LOG.warning("Message {} can not be cached: {}".format(uid, exc))
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._conn.close()
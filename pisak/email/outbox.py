@@ -0,0 +1,288 @@
+"""
+Persistent queue of the outgoing email messages.
+
+Messages are saved in a local database first and delivered by a single
+background thread, so sending never blocks the user interface and nothing
+is lost when the network is down or the application is closed in the
+meantime. The sender keeps its SMTP connection open for the following
+messages and retries failed deliveries with an exponential backoff.
+Once a message has been accepted by the SMTP server, its copy is appended
+to the sent folder of the IMAP account.
+"""
+import json
+import socket
+import smtplib
+import sqlite3
+import threading
+import time
+from email.utils import formatdate, make_msgid
+from ssl import SSLError
+
+from pisak import logger, exceptions, dirs
+from pisak.email import config, message as email_message
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Delay in seconds before the first retry of a failed delivery,
+#: doubled after each consecutive failure
+RETRY_DELAY = 30
+
+#: Maximum delay in seconds between the delivery attempts
+MAX_RETRY_DELAY = 60 * 60
+
+#: Seconds an unused SMTP connection is kept open for the next messages
+SMTP_KEEP_OPEN = 60
+
+#: Domains of the providers whose SMTP servers save the sent messages
+#: in the sent folder by themselves
+SERVER_SAVED_SENT = ("gmail.com",)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS outbox ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL, "
+    "recipients TEXT NOT NULL, message TEXT NOT NULL, state TEXT NOT NULL, "
+    "attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, "
+    "error TEXT)"
+)
+
+# message waits for the delivery through the SMTP
+_QUEUED = "queued"
+
+# message has been delivered and waits to be appended to the sent folder
+_SENT = "sent"
+
+# message has been rejected by the SMTP server, it is never retried
+_FAILED = "failed"
+
+
+class OutboxError(exceptions.PisakException):
+    """
+    Error raised when a message can not be put in the outbox.
+    """
+    pass
+
+
+class Outbox:
+    """
+    Outbox of a single email account. Can be used from many threads.
+
+    :param imap_client: `imap_client.IMAPClient` instance used to append
+    the sent messages to the sent folder.
+    :param path: path to the database file.
+    :param setup: account setup, the one from the email config by default.
+    """
+
+    def __init__(self, imap_client, path=None, setup=None):
+        self._imap_client = imap_client
+        self._setup = setup
+        self._custom_setup = setup is not None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or dirs.HOME_EMAIL_OUTBOX_DB,
+                                     check_same_thread=False)
+        with self._conn:
+            self._conn.execute(_SCHEMA)
+        self._smtp = None
+        self._smtp_used = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def put(self, msg, recipients):
+        """
+        Put the message in the queue and return at once.
+        Delivery is started in the background.
+
+        :param msg: message object, as composed by `SimpleMessage`.
+        :param recipients: list of the recipients addresses.
+        """
+        sender = self._get_setup()["address"]
+        if msg["From"] is None:
+            msg["From"] = sender
+        if msg["Date"] is None:
+            msg["Date"] = formatdate(localtime=True)
+        if msg["Message-ID"] is None:
+            msg["Message-ID"] = make_msgid()
+        try:
+            self._modify(
+                "INSERT INTO outbox (sender, recipients, message, state, "
+                "next_attempt) VALUES (?, ?, ?, ?, ?)",
+                sender, json.dumps(sorted(recipients)), msg.as_string(),
+                _QUEUED, time.time())
+        except sqlite3.Error as exc:
+            raise OutboxError(exc) from exc
+        self.start()
+
+    def start(self):
+        """
+        Start delivering the queued messages, including the ones
+        left from the previous sessions.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def get_pending_count(self):
+        """
+        Get number of messages that have not been delivered yet.
+
+        :return: integer.
+        """
+        return self._query(
+            "SELECT COUNT(*) FROM outbox WHERE state = ?", _QUEUED)[0][0]
+
+    def _get_setup(self):
+        with self._lock:
+            if self._setup is None:
+                self._setup = config.Config().get_account_setup()
+            return self._setup
+
+    def _reload_setup(self):
+        # the account settings could have been fixed in the meantime
+        if not self._custom_setup:
+            with self._lock:
+                self._setup = None
+
+    def _query(self, sql, *params):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _modify(self, sql, *params):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _run(self):
+        while True:
+            try:
+                timeout = self._process_due()
+            except sqlite3.Error as exc:
+                _LOG.error("Outbox database failure: {}".format(exc))
+                timeout = RETRY_DELAY
+            except Exception:
+                # the sender must survive anything, otherwise the queue
+                # would never be processed again
+                _LOG.exception("Outbox failure, retrying in {} s.".format(
+                    RETRY_DELAY))
+                timeout = RETRY_DELAY
+            self._wakeup.wait(timeout)
+
+    def _process_due(self):
+        """
+        Process all the messages that are due.
+
+        :return: time in seconds until anything else has to be done,
+        None if nothing is pending.
+        """
+        due = True
+        while due:
+            self._wakeup.clear()
+            now = time.time()
+            due = self._query(
+                "SELECT id, sender, recipients, message, state, attempts "
+                "FROM outbox WHERE state != ? AND next_attempt <= ? "
+                "ORDER BY id", _FAILED, now)
+            for entry in due:
+                self._process(*entry)
+        next_attempt = self._query(
+            "SELECT MIN(next_attempt) FROM outbox WHERE state != ?",
+            _FAILED)[0][0]
+        timeout = None if next_attempt is None else max(0, next_attempt - now)
+        if self._smtp is not None:
+            keep_open = self._smtp_used + SMTP_KEEP_OPEN - time.monotonic()
+            if keep_open <= 0:
+                self._close_smtp()
+            else:
+                timeout = keep_open if timeout is None else \
+                    min(timeout, keep_open)
+        return timeout
+
+    def _process(self, id, sender, recipients, msg, state, attempts):
+        try:
+            if state == _QUEUED:
+                self._deliver(sender, json.loads(recipients), msg)
+                _LOG.debug("Email was sent successfully.")
+                attempts = 0
+                self._modify(
+                    "UPDATE outbox SET state = ?, attempts = 0, error = NULL "
+                    "WHERE id = ?", _SENT, id)
+            self._save_sent(msg)
+            self._modify("DELETE FROM outbox WHERE id = ?", id)
+        except (exceptions.PisakException, socket.error) as exc:
+            cause = exc.__cause__ or exc
+            if isinstance(cause, smtplib.SMTPResponseException) and \
+                    cause.smtp_code >= 500 and \
+                    not isinstance(cause, smtplib.SMTPAuthenticationError) or \
+                    isinstance(cause, smtplib.SMTPRecipientsRefused):
+                _LOG.error("Email was rejected: {}".format(cause))
+                self._modify("UPDATE outbox SET state = ?, error = ? "
+                             "WHERE id = ?", _FAILED, str(cause), id)
+                return
+            self._retry_later(id, attempts, cause)
+        except sqlite3.Error:
+            raise
+        except Exception as exc:
+            # unexpected error, e.g. broken account config or message, is
+            # retried with the same backoff so that it can not loop hot
+            _LOG.exception("Unexpected error while sending the email.")
+            self._close_smtp()
+            self._reload_setup()
+            self._retry_later(id, attempts, exc)
+
+    def _retry_later(self, id, attempts, cause):
+        delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2**attempts)
+        _LOG.warning("Email delivery failed, retrying in {} s: {}".format(
+            delay, cause))
+        self._modify(
+            "UPDATE outbox SET attempts = ?, next_attempt = ?, error = ? "
+            "WHERE id = ?", attempts + 1, time.time() + delay,
+            str(cause), id)
+
+    def _deliver(self, sender, recipients, msg):
+        """
+        Send the message through the SMTP connection kept open,
+        reconnecting once if it has been dropped by the server.
+        """
+        for retry in (True, False):
+            smtp = self._get_smtp()
+            try:
+                smtp.sendmail(sender, recipients, msg)
+                self._smtp_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected as exc:
+                self._close_smtp()
+                if not retry:
+                    raise email_message.EmailSendingError(exc) from exc
+            # SMTP and SSL errors are socket errors as well, but only
+            # a dropped connection is worth sending the message again
+            except (smtplib.SMTPException, SSLError) as exc:
+                self._close_smtp()
+                raise email_message.EmailSendingError(exc) from exc
+            except socket.error as exc:
+                self._close_smtp()
+                if not retry:
+                    raise exceptions.NoInternetError(exc) from exc
+
+    def _get_smtp(self):
+        if self._smtp is None:
+            try:
+                self._smtp = email_message.connect_smtp(self._get_setup())
+            except email_message.EmailSendingError:
+                self._reload_setup()
+                raise
+            self._smtp_used = time.monotonic()
+        return self._smtp
+
+    def _close_smtp(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, socket.error):
+                smtp.close()
+
+    def _save_sent(self, msg):
+        setup = self._get_setup()
+        if setup["address"].split("@")[-1] not in SERVER_SAVED_SENT and \
+                not self._imap_client.append_to_sent_box(msg):
+            raise OutboxError("Message could not be saved in the sent folder.")
@@ -1,7 +1,15 @@
 """
 Email parsers.
 """
+import base64
+import binascii
 import email
+import email.header
+import email.utils
+import functools
+import itertools
+import quopri
+import re
 import time
 from datetime import datetime
 
@@ -13,6 +21,21 @@ _LOG = logger.get_logger(__name__)
 
 DEFAULT_CHARSET = "utf-8"
 
+#: Number of distinct header values whose decoded form is remembered
+MEMO_SIZE = 4096
+
+# line break followed by whitespace, that is a folded header line
+_FOLD = re.compile(r"\r?\n(?=[ \t])")
+
+_LINE_BREAK = re.compile(r"\r?\n")
+
+# single token of an IMAP response: parenthesis, quoted string, literal
+# size or an atom, possibly with a bracketed section like BODY[1.2]<0>
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\r?\n?$|'
+                    rb'((?:[^\s()\[\]"]|\[[^\]]*\])+))')
+
+_QUOTED_ESCAPE = re.compile(rb"\\(.)")
+
 
 def _decode_message(message):
     """
@@ -49,6 +72,12 @@ def _get_addresses(value, header=None):
                    "'email.message.Message' instance are accepted.")
 
 
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _parse_address(raw_address):
+    return email.utils.parseaddr(raw_address)
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
 def _parse_date(raw_date):
     """
     Parse date of the message.
@@ -88,6 +117,11 @@ def _decode_header(header):
         return "".join(headers)
 
 
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _decode_raw_header(header):
+    return _decode_header(header)
+
+
 def parse_message(raw_message):
     """
     Parse the given raw message.
@@ -96,7 +130,6 @@ def parse_message(raw_message):
 
     :return: dictionary containing all fields of parsed message.
     """
-    parsed_msg = {}
     msg = email.message_from_string(raw_message)
 
     content_type = msg.get_content_maintype()
@@ -109,8 +142,18 @@ def parse_message(raw_message):
                 body.append(_decode_message(part))
     elif content_type in ("text/plain", "text"):
         body.append(_decode_message(msg))
-    parsed_msg["Body"] = "\n".join(body)
+    return _parse_fields(msg, {"Body": "\n".join(body)})
 
+
+def _parse_fields(msg, parsed_msg):
+    """
+    Put all the header fields of the message into the dictionary.
+
+    :param msg: `email.message.Message` instance.
+    :param parsed_msg: dictionary to be updated.
+
+    :return: updated dictionary.
+    """
     # put all the message fields into a dictionary
     parsed_msg.update(msg.items())
 
@@ -131,6 +174,303 @@ def parse_message(raw_message):
     return parsed_msg
 
 
+def parse_message_parts(raw_headers, body_parts, attachments=()):
+    """
+    Parse message fetched part by part.
+
+    :param raw_headers: raw bytes with the message headers.
+    :param body_parts: list of decoded text parts of the message body.
+    :param attachments: list of attachments, as returned by
+    `parse_bodystructure`.
+
+    :return: dictionary containing all fields of parsed message, like the
+    one returned by `parse_message`, with extra 'Attachments' field.
+    """
+    parsed_msg = {"Body": "\n".join(body_parts),
+                  "Attachments": list(attachments)}
+    return _parse_fields(email.message_from_bytes(raw_headers), parsed_msg)
+
+
+def _tokenize_response(data):
+    """
+    Split raw FETCH response data, as returned by `imaplib`, into tokens.
+    Literals, that `imaplib` hands over separately, are put back in place.
+    """
+    for item in data:
+        chunks = [item] if isinstance(item, bytes) else [item[0], item[1]]
+        for idx, chunk in enumerate(chunks):
+            if idx == 1:
+                # literal
+                yield "literal", chunk
+                continue
+            pos = 0
+            while pos < len(chunk):
+                match = _TOKEN.match(chunk, pos)
+                if match is None or match.end() == pos:
+                    break
+                pos = match.end()
+                opening, closing, quoted, _size, atom = match.groups()
+                if opening:
+                    yield "(", None
+                elif closing:
+                    yield ")", None
+                elif quoted is not None:
+                    yield "literal", _QUOTED_ESCAPE.sub(rb"\1", quoted)
+                elif atom is not None:
+                    yield "atom", atom
+
+
+def parse_fetch_response(data):
+    """
+    Parse FETCH response into a nested structure.
+
+    :param data: raw FETCH response data, as returned by `imaplib`.
+
+    :return: list with an item for every message, each being a dictionary
+    with upper case names of the message data items as keys. Atoms are
+    returned as strings, NIL as None, strings and literals as bytes and
+    parenthesized lists as lists.
+    """
+    stack = [[]]
+    for kind, value in _tokenize_response(data):
+        if kind == "(":
+            stack.append([])
+        elif kind == ")":
+            if len(stack) > 1:
+                closed = stack.pop()
+                stack[-1].append(closed)
+        elif kind == "atom":
+            atom = value.decode(DEFAULT_CHARSET, "replace")
+            stack[-1].append(None if atom.upper() == "NIL" else atom)
+        else:
+            stack[-1].append(value)
+    messages = []
+    for item in stack[0]:
+        if isinstance(item, list):
+            messages.append({str(name).upper(): value for name, value in
+                             zip(item[::2], item[1::2])})
+    return messages
+
+
+def _as_text(value):
+    if isinstance(value, bytes):
+        return value.decode(DEFAULT_CHARSET, "replace")
+    return value
+
+
+def _as_params(value):
+    if not isinstance(value, list):
+        return {}
+    return {_as_text(name).lower(): _as_text(param) for name, param in
+            zip(value[::2], value[1::2])}
+
+
+def _part_filename(params, disposition_params):
+    for source in (disposition_params, params):
+        for key in ("filename*", "name*"):
+            if source.get(key):
+                return email.utils.collapse_rfc2231_value(
+                    email.utils.decode_rfc2231(source[key]))
+        for key in ("filename", "name"):
+            if source.get(key):
+                return _decode_header(source[key])
+    return None
+
+
+def parse_bodystructure(structure, prefix=""):
+    """
+    Flatten BODYSTRUCTURE of a message into a list of its leaf parts.
+    Messages attached to the message are not looked into.
+
+    :param structure: BODYSTRUCTURE, as parsed by `parse_fetch_response`.
+    :param prefix: part number of the structure, empty for the
+    whole message.
+
+    :return: list of dictionaries describing the parts, with keys:
+    'part' - part specifier to be used in FETCH BODY[...],
+    'type' - lower case content type, 'charset', 'encoding' - lower case
+    transfer encoding, 'size' - encoded size in bytes, 'disposition' - lower
+    case content disposition or None, 'filename' - name of the file or None.
+    """
+    if isinstance(structure[0], list):
+        parts = []
+        # children come first, followed by the subtype and extension data
+        children = itertools.takewhile(
+            lambda item: isinstance(item, list), structure)
+        for idx, child in enumerate(children):
+            parts.extend(parse_bodystructure(
+                child, "{}{}".format(prefix + "." if prefix else "", idx + 1)))
+        return parts
+    content_type = "{}/{}".format(_as_text(structure[0]),
+                                  _as_text(structure[1])).lower()
+    params = _as_params(structure[2])
+    # position of the extension data depends on the type of the part
+    if content_type == "message/rfc822":
+        extension = 10
+    elif content_type.startswith("text/"):
+        extension = 8
+    else:
+        extension = 7
+    disposition = structure[extension + 1] if \
+        len(structure) > extension + 1 else None
+    disposition_type, disposition_params = None, {}
+    if isinstance(disposition, list) and disposition:
+        disposition_type = _as_text(disposition[0]).lower()
+        disposition_params = _as_params(
+            disposition[1] if len(disposition) > 1 else None)
+    return [{
+        "part": prefix or "1",
+        "type": content_type,
+        "charset": params.get("charset", DEFAULT_CHARSET),
+        "encoding": (_as_text(structure[5]) or "7bit").lower(),
+        "size": int(structure[6] or 0),
+        "disposition": disposition_type,
+        "filename": _part_filename(params, disposition_params)
+    }]
+
+
+def is_displayed_text(part):
+    """
+    Check if the part is a text to be displayed as the message body.
+
+    :param part: part description, as returned by `parse_bodystructure`.
+
+    :return: True or False.
+    """
+    return part["type"] == "text/plain" and \
+        part["disposition"] in (None, "inline") and \
+        (part["disposition"] is None or not part["filename"])
+
+
+def is_attachment(part):
+    """
+    Check if the part is an attachment, to be fetched only on demand.
+
+    :param part: part description, as returned by `parse_bodystructure`.
+
+    :return: True or False.
+    """
+    return part["disposition"] == "attachment" or bool(part["filename"])
+
+
+class TransferDecoder:
+    """
+    Incremental decoder of the content transfer encodings, for decoding
+    parts of messages that are fetched in chunks.
+
+    :param encoding: content transfer encoding.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = (encoding or "7bit").lower()
+        self._pending = b""
+
+    def decode(self, chunk):
+        """
+        Decode the next chunk. Any incomplete piece at the end of the chunk
+        is kept until the next chunk comes.
+
+        :param chunk: bytes.
+
+        :return: decoded bytes.
+        """
+        data = self._pending + chunk
+        if self.encoding == "base64":
+            data = data.translate(None, b" \t\r\n")
+            complete = len(data) - len(data) % 4
+            data, self._pending = data[:complete], data[complete:]
+            try:
+                return base64.b64decode(data)
+            except binascii.Error as exc:
+                _LOG.warning("Invalid base64 data: {}".format(exc))
+                return b""
+        elif self.encoding == "quoted-printable":
+            end = data.rfind(b"\n") + 1
+            data, self._pending = data[:end], data[end:]
+            return quopri.decodestring(data)
+        return data
+
+    def flush(self):
+        """
+        Decode whatever has been left.
+
+        :return: decoded bytes.
+        """
+        data, self._pending = self._pending, b""
+        if not data:
+            return b""
+        if self.encoding == "base64":
+            try:
+                return base64.b64decode(data + b"=" * (-len(data) % 4))
+            except binascii.Error:
+                return b""
+        elif self.encoding == "quoted-printable":
+            return quopri.decodestring(data)
+        return data
+
+
+def decode_part(raw_part, encoding, charset):
+    """
+    Decode the whole fetched part of a message.
+
+    :param raw_part: raw bytes of the part.
+    :param encoding: content transfer encoding.
+    :param charset: character set of the text.
+
+    :return: decoded text.
+    """
+    decoder = TransferDecoder(encoding)
+    content = decoder.decode(raw_part) + decoder.flush()
+    try:
+        return content.decode(charset or DEFAULT_CHARSET, "replace")
+    except LookupError:
+        return content.decode(DEFAULT_CHARSET, "replace")
+
+
+def split_headers(raw_headers):
+    """
+    Split raw message headers into fields, in a single pass. Folded
+    header lines are joined back. Only the first occurrence of every
+    header is kept.
+
+    :param raw_headers: raw bytes with the message headers.
+
+    :return: dictionary with lowercase header names as keys and
+    raw header values as values.
+    """
+    fields = {}
+    text = _FOLD.sub("", raw_headers.decode(DEFAULT_CHARSET, "replace"))
+    for line in _LINE_BREAK.split(text):
+        name, colon, value = line.partition(":")
+        if colon and name and not name[0].isspace():
+            fields.setdefault(name.rstrip().lower(), value.strip())
+    return fields
+
+
+def parse_preview(uid, raw_headers, headers):
+    """
+    Parse preview of a single message.
+
+    :param uid: id of the message.
+    :param raw_headers: raw bytes with the message headers.
+    :param headers: list of headers to be parsed.
+
+    :return: dictionary containing parsed message preview.
+    """
+    parsed_msg = {"UID": uid}
+    fields = split_headers(raw_headers)
+    for header_name in headers:
+        raw_value = fields.get(header_name.lower(), "")
+        if header_name == "Date":
+            parsed_msg[header_name] = _parse_date(raw_value) or raw_value
+        elif header_name in ("From", "To"):
+            parsed_msg[header_name] = _parse_address(
+                _decode_raw_header(raw_value))
+        else:
+            parsed_msg[header_name] = _decode_raw_header(raw_value)
+    return parsed_msg
+
+
 def parse_mailbox_list(ids, msg_data, headers):
     """
     Parse list of message previews.
@@ -141,19 +481,5 @@ def parse_mailbox_list(ids, msg_data, headers):
 
     :return: list of dictionaries containing parsed message previews.
     """
-    mailbox_list = []
-    for idx, (_spec, msg) in enumerate(reversed(msg_data[::2])):
-        parsed_msg = {"UID": ids[idx]}
-        str_msg = msg.decode(DEFAULT_CHARSET, "replace")
-        for header_name in headers:
-            parsed_header = _decode_header(str_msg[
-                str_msg.find(header_name) + len(header_name)+1: ].split("\r\n")[0])
-            if header_name == "Date":
-                parsed_msg[header_name] = _parse_date(parsed_header) or \
-                                          parsed_header
-            elif header_name in ("From", "To"):
-                parsed_msg[header_name] = _get_addresses(parsed_header, header_name)
-            else:
-                parsed_msg[header_name] = parsed_header
-        mailbox_list.append(parsed_msg)
-    return mailbox_list
+    return [parse_preview(ids[idx], msg, headers) for idx, (_spec, msg) in
+            enumerate(reversed(msg_data[::2]))]
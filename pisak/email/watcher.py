@@ -0,0 +1,137 @@
+"""
+Background watcher of the inbox. Keeps a dedicated connection to the IMAP
+server waiting with IDLE for the server to report any change, so the local
+message cache and the counters are updated as soon as new mail arrives,
+instead of only when the user opens the mailbox. Servers without IDLE
+are polled instead.
+"""
+import imaplib
+import socket
+import threading
+
+from gi.repository import GObject, Clutter
+
+from pisak import logger, exceptions
+from pisak.email import imap_client
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Seconds between checks of the inbox when the server does not support IDLE
+POLL_INTERVAL = 120
+
+#: Seconds to wait before reconnecting after the connection has been lost
+RECONNECT_INTERVAL = 30
+
+
+class MailboxWatcher(GObject.GObject):
+    """
+    Watcher of the inbox of a single account. Signals are
+    emitted in the main thread.
+
+    :param client: logged in `imap_client.IMAPClient` instance.
+    """
+    __gsignals__ = {
+        # list of ids of the new messages and list of their previews
+        "new-messages": (
+            GObject.SIGNAL_RUN_FIRST, None,
+            (GObject.TYPE_PYOBJECT, GObject.TYPE_PYOBJECT)),
+        # list of ids of the removed messages
+        "removed-messages": (
+            GObject.SIGNAL_RUN_FIRST, None, (GObject.TYPE_PYOBJECT,)),
+        # number of all and number of unseen messages in the inbox
+        "inbox-status": (
+            GObject.SIGNAL_RUN_FIRST, None,
+            (GObject.TYPE_INT64, GObject.TYPE_INT64))
+    }
+
+    def __init__(self, client):
+        super().__init__()
+        self._client = client
+        self._ids = None
+        self._connection = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self.inbox_status = None
+
+    def start(self):
+        """
+        Start watching in a background thread.
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching. Returns at once, connection is closed by
+        the background thread.
+        """
+        self._stopped.set()
+        connection = self._connection
+        if connection is not None:
+            connection.stop_idle()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._watch()
+            except (exceptions.PisakException, socket.error) as exc:
+                _LOG.warning("Inbox watcher disconnected: {}".format(exc))
+                self._close()
+                self._stopped.wait(RECONNECT_INTERVAL)
+        self._close()
+
+    def _watch(self):
+        self._refresh()
+        connection = self._client.open_connection()
+        self._connection = connection
+        if not connection.supports_idle:
+            _LOG.info("Server does not support IDLE, inbox is polled.")
+            self._close()
+            while not self._stopped.wait(POLL_INTERVAL):
+                self._refresh()
+            return
+        try:
+            connection.select("INBOX", readonly=True)
+            # changes that happened while the connection was being opened
+            self._refresh()
+            while not self._stopped.is_set():
+                if connection.idle() and not self._stopped.is_set():
+                    self._refresh()
+        except imaplib.IMAP4.error as exc:
+            raise imap_client.IMAPClientError(exc) from exc
+
+    def _refresh(self):
+        """
+        Synchronize the inbox with the server and announce the changes.
+        """
+        client = self._client
+        ids = client.get_inbox_ids(imap_client.PREFETCH)
+        if self._ids is not None:
+            known = set(self._ids)
+            current = set(ids)
+            new = [ide for ide in ids if ide not in known]
+            removed = [ide for ide in self._ids if ide not in current]
+            if new:
+                previews = client.get_many_previews_from_inbox(
+                    new, imap_client.PREFETCH)
+                self._emit("new-messages", new, previews)
+            if removed:
+                self._emit("removed-messages", removed)
+        self._ids = ids
+        status = client.get_inbox_status()
+        if status and status != self.inbox_status:
+            self.inbox_status = status
+            self._emit("inbox-status", *status)
+
+    def _emit(self, signal, *args):
+        Clutter.threads_add_idle(0, lambda *_: self.emit(signal, *args))
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except (imaplib.IMAP4.error, socket.error) as exc:
+                _LOG.info("Failed to logout: {}".format(exc))
@@ -1,11 +1,15 @@
 """
 Email application specific widgets.
 """
+import collections
 import datetime
+import socket
+import threading
+
 from gi.repository import Clutter, Mx, Pango, GObject
 
 import pisak
-from pisak import logger, pager, widgets, layout, unit
+from pisak import logger, pager, widgets, layout, unit, exceptions
 from pisak.email import imap_client
 
 
@@ -78,6 +82,8 @@ class MailboxTileSource(pager.DataSource):
     def __init__(self):
         super().__init__()
         self._mailbox = None
+        self._watcher = None
+        self._watcher_handlers = []
         now = datetime.datetime.now()
         maxdelta = datetime.timedelta(10**4)
         self._data_sorting_key = lambda msg: ((now - msg["Date"]) if msg else maxdelta)
@@ -119,10 +125,92 @@ class MailboxTileSource(pager.DataSource):
             imap_client.get_many_previews_from_sent_box(ids)
 
     def _query_ids(self):
-        imap_client = pisak.app.box["imap_client"]
-        return imap_client.get_inbox_ids() if \
+        """
+        Serve ids of the messages known from the local cache, if there are
+        any, and synchronize them with the server in the background.
+        """
+        client = pisak.app.box["imap_client"]
+        cached = client.get_cached_inbox_ids() if \
             self._mailbox == 'inbox' else \
-            imap_client.get_sent_box_ids()
+            client.get_cached_sent_box_ids()
+        if cached:
+            threading.Thread(target=self._reconcile, daemon=True).start()
+            return cached
+        return self._query_server_ids(imap_client.INTERACTIVE)
+
+    def _query_server_ids(self, priority):
+        client = pisak.app.box["imap_client"]
+        return client.get_inbox_ids(priority) if \
+            self._mailbox == 'inbox' else \
+            client.get_sent_box_ids(priority)
+
+    def _reconcile(self):
+        """
+        Update the data served from the cache with the current
+        state of the mailbox on the server.
+        """
+        try:
+            ids = self._query_server_ids(imap_client.PREFETCH)
+            with self._lock:
+                new_ids = [ide for ide in ids if ide not in self._lazy_data]
+            previews = (self._query_portion_of_data(new_ids) if new_ids
+                        else None) or []
+        except (exceptions.PisakException, socket.error) as exc:
+            _LOG.warning("Mailbox synchronization failed: {}".format(exc))
+            return
+        with self._lock:
+            current = set(ids)
+            removed = [key for key in self._lazy_data if key not in current]
+        self._apply_changes(ids, new_ids, previews, removed)
+
+    def _apply_changes(self, ids, new_ids, previews, removed_ids):
+        with self._lock:
+            for key in removed_ids:
+                self._lazy_data.pop(key, None)
+            self._lazy_data.update(zip(new_ids, previews))
+            self._ids = ids
+            values = list(self._lazy_data.values())
+        self.data = self.produce_data([(val, None) for val in values],
+                                      self._data_sorting_key)
+
+    def watch(self, watcher):
+        """
+        Follow the changes reported by the mailbox watcher, tiles of the
+        new messages are inserted into the data without reloading it all.
+
+        :param watcher: `watcher.MailboxWatcher` instance.
+        """
+        self.unwatch()
+        self._watcher = watcher
+        self._watcher_handlers = [
+            watcher.connect("new-messages", self._on_new_messages),
+            watcher.connect("removed-messages", self._on_removed_messages)
+        ]
+
+    def unwatch(self):
+        """
+        Stop following the mailbox watcher.
+        """
+        if self._watcher is not None:
+            for handler in self._watcher_handlers:
+                self._watcher.disconnect(handler)
+            self._watcher = None
+            self._watcher_handlers = []
+
+    def _on_new_messages(self, _watcher, new_ids, previews):
+        with self._lock:
+            new = collections.OrderedDict(
+                (ide, preview) for ide, preview in zip(new_ids, previews)
+                if ide not in self._lazy_data)
+            ids = list(new) + [ide for ide in self._ids if ide not in new]
+        if new:
+            self._apply_changes(ids, list(new), list(new.values()), [])
+
+    def _on_removed_messages(self, _watcher, removed_ids):
+        removed = set(removed_ids)
+        with self._lock:
+            ids = [ide for ide in self._ids if ide not in removed]
+        self._apply_changes(ids, [], [], removed_ids)
 
 
 class DraftsTileSource(pager.DataSource):
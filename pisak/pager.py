@@ -88,11 +88,15 @@ class LazyWorker:
 
         :param ids: list of ids specifying which data items should be loaded.
         """
-        self._src._lazy_data.update(list(zip(map(str, ids),
-                                    self._src._query_portion_of_data(ids))))
+        portion = self._src._query_portion_of_data(ids)
+        with self._src._lock:
+            lazy_data = self._src._lazy_data
+            # items removed from the data source in the meantime are skipped
+            lazy_data.update([(key, value) for key, value in
+                              zip(map(str, ids), portion) if key in lazy_data])
+            values = list(lazy_data.values())
         self._src.data = self._src.produce_data(
-            [(val, None) for val in list(self._src._lazy_data.values())],
-            self._src._data_sorting_key)
+            [(val, None) for val in values], self._src._data_sorting_key)
 
     def _load_portion_by_number(self, offset, number):
         data = self._src._query_portion_of_data_by_number(offset, number)
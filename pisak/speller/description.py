@@ -17,6 +17,7 @@ def prepare_main_view(app, window, script, data):
     :param data: some specific data.
     """
     handlers.button_to_view(window, script, "button_exit")
+    script.get_object("text_box").enable_journal("speller")
 
 
 speller_app = {
@@ -43,12 +43,13 @@ def get_all_documents():
     """
     with _establish_session() as sess:
         documents = sess.query(Document).all()
+        missing = set(item.path for item in documents
+                      if not os.path.exists(item.path))
+        if missing:
+            sess.query(Document).filter(Document.path.in_(missing)).delete(
+                synchronize_session=False)
         sess.expunge_all()
-    for item in documents:
-        if not os.path.exists(item.path):
-            remove_document(item.path)
-            documents.remove(item)
-    return documents
+    return [item for item in documents if item.path not in missing]
 
 
 def remove_document(path):
@@ -108,11 +109,7 @@ def generate_new_path():
 
 @contextmanager
 def _establish_session():
-    engine = create_engine(_ENGINE_URL)
-    _Base.metadata.create_all(engine)
-    session = sessionmaker(autoflush=False)
-    session.configure(bind=engine)
-    db_session = session()
+    db_session = _Session()
     try:
         yield db_session
         db_session.commit()
@@ -132,3 +129,13 @@ class Document(_Base):
     path = Column(String, unique=True, nullable=False)
     name = Column(String, nullable=False)
     added_on = Column(DateTime, nullable=False, default=func.now())
+
+
+#: Engine shared by all the sessions, created together with the schema once
+_ENGINE = create_engine(_ENGINE_URL,
+                        connect_args={"check_same_thread": False})
+
+_Base.metadata.create_all(_ENGINE)
+
+#: Factory of the database sessions
+_Session = sessionmaker(bind=_ENGINE, autoflush=False)
@@ -123,6 +123,7 @@ def save(pop_up):
             documents_manager.add_document(name, file_path)
             with open(file_path, "w") as file:
                 file.write(text)
+            text_box.commit_text()
             message = save_success_message + "\n\n" + '"' + name + '"'
             pop_up.on_screen(message)
         else:
@@ -177,6 +178,7 @@ def new_document(text_box):
 
     :param text_box: text box.
     """
+    text_box.commit_text()
     text_box.clear_all()
 
 
@@ -189,6 +191,7 @@ def text_to_speech(text_box):
     """
     text = text_box.get_text()
     if text:
+        text_box.commit_text()
         synth = sound_effects.Synthesizer(text)
         if pisak.app.window.input_group.middleware == "scanning" and \
                 pisak.app.window.pending_group is not None:
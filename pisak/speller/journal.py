@@ -0,0 +1,214 @@
+"""
+Crash-safe journal of the speller text.
+
+Every change of the text buffer is appended to a write-ahead log by one
+background thread, the UI thread only puts the changes on a queue. Log is
+synced to the disk in batches, at most every `SYNC_INTERVAL` seconds. Writer
+thread keeps its own copy of the text, built from the very same changes, and
+every `CHECKPOINT_INTERVAL` changes saves it as a checkpoint, after which the
+log is started anew. Each change carries a sequence number and a checkpoint
+records the last one it includes, so a crash at any moment can be recovered
+from by reading the checkpoint and replaying the newer part of the log.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from pisak import logger
+from pisak.speller import text_model
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Maximum time in seconds between a change and syncing it to the disk
+SYNC_INTERVAL = 0.5
+
+#: Number of changes after which a checkpoint is made
+CHECKPOINT_INTERVAL = 500
+
+_LOG_EXTENSION = ".wal"
+
+_CHECKPOINT_EXTENSION = ".checkpoint"
+
+_STOP = object()
+
+
+def recover(path):
+    """
+    Recover text from the journal left by a previous session.
+
+    :param path: journal path, without an extension.
+
+    :return: tuple with the recovered text, empty if there was no journal,
+    and the sequence number of the last change it includes.
+    """
+    seq, text = 0, ""
+    try:
+        with open(path + _CHECKPOINT_EXTENSION, encoding="utf-8",
+                  newline="") as file:
+            seq = json.loads(file.readline())["seq"]
+            text = file.read()
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as exc:
+        _LOG.error("Damaged journal checkpoint: {}".format(exc))
+    model = text_model.TextModel(text)
+    try:
+        with open(path + _LOG_EXTENSION, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    change_seq, kind, pos, value = json.loads(line)
+                except ValueError:
+                    # change that was being written when the process died
+                    break
+                if change_seq > seq:
+                    _apply(model, kind, pos, value)
+                    seq = change_seq
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        _LOG.error("Can not read journal: {}".format(exc))
+    return model.get_text(), seq
+
+
+def discard(path):
+    """
+    Remove the journal files.
+
+    :param path: journal path, without an extension.
+    """
+    for extension in (_LOG_EXTENSION, _CHECKPOINT_EXTENSION):
+        try:
+            os.remove(path + extension)
+        except FileNotFoundError:
+            pass
+
+
+def _apply(model, kind, pos, value):
+    if kind == "i":
+        model.insert(pos, value)
+    else:
+        model.delete(pos, pos + value)
+
+
+def _fsync_write(path, content):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8", newline="") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+class Journal:
+    """
+    Journal of a single text buffer.
+
+    :param path: journal path, without an extension.
+    :param text: current text of the buffer, saved as the first checkpoint.
+    :param seq: sequence number of the last change included in the text,
+    as returned by `recover`, so that the previous log is never replayed
+    on top of the new checkpoint.
+    """
+
+    def __init__(self, path, text="", seq=0):
+        self.path = path
+        self._queue = queue.Queue()
+        self._seq = seq
+        self._model = text_model.TextModel(text)
+        self._log = None
+        self._disabled = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record_insertion(self, pos, text):
+        """
+        Record text insertion.
+
+        :param pos: position of the insertion.
+        :param text: inserted text.
+        """
+        if not self._disabled:
+            self._queue.put(("i", pos, text))
+
+    def record_deletion(self, pos, length):
+        """
+        Record text deletion.
+
+        :param pos: position of the deletion.
+        :param length: number of deleted characters.
+        """
+        if not self._disabled:
+            self._queue.put(("d", pos, length))
+
+    def close(self, remove=False):
+        """
+        Write and sync all the pending changes and stop the writer thread.
+
+        :param remove: whether the journal files should be removed afterwards.
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        if remove:
+            discard(self.path)
+
+    def _run(self):
+        try:
+            self._checkpoint()
+        except OSError as exc:
+            _LOG.error("Journal not available: {}".format(exc))
+            # changes are dropped from now on, instead of piling up
+            self._disabled = True
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    return
+        dirty = False
+        last_sync = time.monotonic()
+        since_checkpoint = 0
+        while True:
+            timeout = max(0, last_sync + SYNC_INTERVAL - time.monotonic()) \
+                if dirty else None
+            try:
+                change = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                change = None
+            try:
+                if change is _STOP:
+                    self._sync()
+                    self._log.close()
+                    return
+                if change is not None:
+                    self._seq += 1
+                    self._log.write(json.dumps([self._seq] + list(change)) + "\n")
+                    _apply(self._model, *change)
+                    dirty = True
+                    since_checkpoint += 1
+                if dirty and time.monotonic() - last_sync >= SYNC_INTERVAL:
+                    if since_checkpoint >= CHECKPOINT_INTERVAL:
+                        self._checkpoint()
+                        since_checkpoint = 0
+                    else:
+                        self._sync()
+                    dirty = False
+                    last_sync = time.monotonic()
+            except OSError as exc:
+                _LOG.error("Journal write failed: {}".format(exc))
+
+    def _sync(self):
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def _checkpoint(self):
+        if self._log is not None:
+            self._sync()
+        _fsync_write(self.path + _CHECKPOINT_EXTENSION,
+                     json.dumps({"seq": self._seq}) + "\n" +
+                     self._model.get_text())
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.path + _LOG_EXTENSION, "w", encoding="utf-8")
+        self._sync()
@@ -0,0 +1,97 @@
+"""
+Prediction latency benchmark. Replays recorded typing traces, that is plain
+text files with the text typed by a user, character by character, and
+measures the latency of every prediction query in four variants:
+
+* cold - new Pressagio instance for every query, as done originally;
+* warm - long-lived Pressagio instance of the prediction service;
+* indexed - completion index for single words, warm Pressagio otherwise;
+* cached - indexed variant behind the service's LRU cache.
+
+Usage::
+
+    python3 -m pisak.speller.prediction.benchmark TRACE [TRACE ...]
+"""
+import sys
+import time
+
+import pressagio
+
+from pisak.speller.widgets import Dictionary
+from pisak.speller.prediction import predictor
+
+
+def replay_contexts(trace):
+    """
+    Generate prediction contexts the same way the speller does while
+    the given text is being typed.
+
+    :param trace: typed text.
+
+    :return: generator of contexts.
+    """
+    for end in range(1, len(trace) + 1):
+        context = Dictionary.get_prediction_context(trace[:end])
+        if context:
+            yield context
+
+
+def _cold(context):
+    callback = predictor._Callback()
+    callback.buffer = predictor._BUFFER_PREFIX + context
+    engine = pressagio.Pressagio(callback, predictor._CONFIG_PARSER)
+    try:
+        return engine.predict()
+    finally:
+        engine.close_database()
+
+
+def _warm(context):
+    return predictor.get_service().predict(context)
+
+
+def _indexed(context):
+    return predictor.get_service()._get_predictions(context)
+
+
+VARIANTS = (("cold", _cold), ("warm", _warm), ("indexed", _indexed),
+            ("cached", predictor.get_predictions))
+
+
+def run(traces):
+    """
+    Run the benchmark.
+
+    :param traces: list of typed texts.
+
+    :return: dictionary with variant names as keys and
+    `predictor.LatencyHistogram` instances as values.
+    """
+    contexts = [context for trace in traces
+                for context in replay_contexts(trace)]
+    if not contexts:
+        return {}
+    # warm up, so that the one-time setup is not counted
+    _indexed(contexts[0])
+    results = {}
+    for name, query in VARIANTS:
+        histogram = predictor.LatencyHistogram()
+        for context in contexts:
+            start = time.perf_counter()
+            query(context)
+            histogram.add(time.perf_counter() - start)
+        results[name] = histogram
+    return results
+
+
+def main(paths):
+    traces = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            traces.append(file.read())
+    for name, histogram in sorted(run(traces).items()):
+        print("{}: {}".format(name, histogram.summary()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,207 @@
+"""
+Completion index over the unigram vocabulary of the n-gram database.
+
+Vocabulary is compiled once into a compact binary file, which is then
+memory-mapped, so the words are never loaded into the Python heap as a whole.
+File layout, all integers being native unsigned 32-bit ones:
+
+* header: magic, format version, number of words;
+* offsets of the words inside the words blob, one more than the words;
+* count of every word;
+* ranking, that is indices of all the words sorted by descending count;
+* words blob, UTF-8 encoded words sorted in the byte order.
+
+Words starting with a given prefix occupy a contiguous range in the sorted
+vocabulary, found with two binary searches. Most frequent words from the range
+are then taken either by walking the global ranking (wide ranges, short
+prefixes) or by selecting from the range itself (narrow ranges).
+"""
+import heapq
+import mmap
+import os
+import sqlite3
+import struct
+from array import array
+
+from pisak import exceptions
+
+
+_MAGIC = b"PSKC"
+
+_VERSION = 1
+
+_HEADER = struct.Struct("=4sII")
+
+_ITEM_SIZE = array("I").itemsize
+
+_MAX_COUNT = 2**32 - 1
+
+
+class CompletionIndexError(exceptions.PisakException):
+    """
+    Index file is missing, corrupted or can not be compiled.
+    """
+    pass
+
+
+def compile_index(db_path, index_path):
+    """
+    Compile completion index from the unigram table of the n-gram database.
+    Index file is replaced atomically.
+
+    :param db_path: path to the n-gram sqlite database.
+    :param index_path: path where the index should be saved.
+    """
+    if not os.path.isfile(db_path):
+        raise CompletionIndexError("No n-gram database: {}.".format(db_path))
+    connection = sqlite3.connect(db_path)
+    try:
+        rows = connection.execute("SELECT word, count FROM _1_gram").fetchall()
+    except sqlite3.Error as exc:
+        raise CompletionIndexError(exc) from exc
+    finally:
+        connection.close()
+    entries = sorted((word.encode("utf-8"), count) for word, count in rows
+                     if word)
+    offsets = array("I")
+    position = 0
+    for word, _count in entries:
+        offsets.append(position)
+        position += len(word)
+    offsets.append(position)
+    counts = array("I", (min(count, _MAX_COUNT) for _word, count in entries))
+    ranking = array("I", sorted(range(len(entries)),
+                                key=lambda idx: -counts[idx]))
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, len(entries)))
+        offsets.tofile(file)
+        counts.tofile(file)
+        ranking.tofile(file)
+        file.write(b"".join(word for word, _count in entries))
+    os.replace(temp_path, index_path)
+
+
+def open_index(db_path, index_path):
+    """
+    Open completion index, compiling it first if it does not exist yet
+    or is older than the n-gram database.
+
+    :param db_path: path to the n-gram sqlite database.
+    :param index_path: path to the index file.
+
+    :return: `CompletionIndex` instance.
+    """
+    if not os.path.isfile(index_path) or \
+            os.path.getmtime(index_path) < os.path.getmtime(db_path):
+        compile_index(db_path, index_path)
+    return CompletionIndex(index_path)
+
+
+class CompletionIndex:
+    """
+    Read-only, memory-mapped index of the vocabulary, giving the most frequent
+    completions of a word prefix. Can be safely shared between threads.
+
+    :param path: path to a compiled index file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, size = _HEADER.unpack_from(self._map)
+        except struct.error as exc:
+            raise CompletionIndexError(exc) from exc
+        if magic != _MAGIC or version != _VERSION:
+            raise CompletionIndexError("Invalid index file: {}.".format(path))
+        self.size = size
+        self._view = view = memoryview(self._map)
+        start = _HEADER.size
+        self._offsets = view[start : start + (size + 1) * _ITEM_SIZE].cast("I")
+        start += (size + 1) * _ITEM_SIZE
+        self._counts = view[start : start + size * _ITEM_SIZE].cast("I")
+        start += size * _ITEM_SIZE
+        self._ranking = view[start : start + size * _ITEM_SIZE].cast("I")
+        self._words_start = start + size * _ITEM_SIZE
+
+    def __len__(self):
+        return self.size
+
+    def _word(self, idx):
+        start = self._words_start + self._offsets[idx]
+        end = self._words_start + self._offsets[idx + 1]
+        return self._map[start : end]
+
+    def _bisect(self, key):
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._word(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def prefix_range(self, prefix):
+        """
+        Find the range of words starting with the given prefix.
+
+        :param prefix: word prefix, string.
+
+        :return: tuple with the first and one after the last word index.
+        """
+        key = prefix.encode("utf-8")
+        # 0xff byte never occurs in UTF-8, so it sorts after any continuation
+        return self._bisect(key), self._bisect(key + b"\xff")
+
+    def count(self, word):
+        """
+        Get count of the given word.
+
+        :param word: word, string.
+
+        :return: count of the word, 0 if it is not in the vocabulary.
+        """
+        low, high = self.prefix_range(word)
+        if low < high and self._word(low) == word.encode("utf-8"):
+            return self._counts[low]
+        return 0
+
+    def complete(self, prefix, limit):
+        """
+        Get the most frequent words starting with the given prefix.
+
+        :param prefix: word prefix, string.
+        :param limit: maximum number of completions.
+
+        :return: list of tuples with words and their counts,
+        sorted by descending count.
+        """
+        low, high = self.prefix_range(prefix)
+        width = high - low
+        if width == 0 or limit <= 0:
+            return []
+        # walking the ranking costs about limit * size / width steps,
+        # selecting from the range costs width steps
+        if width * width <= limit * self.size:
+            selected = heapq.nlargest(limit, range(low, high),
+                                      key=self._counts.__getitem__)
+        else:
+            selected = []
+            for idx in self._ranking:
+                if low <= idx < high:
+                    selected.append(idx)
+                    if len(selected) == limit:
+                        break
+        return [(self._word(idx).decode("utf-8"), self._counts[idx])
+                for idx in selected]
+
+    def close(self):
+        """
+        Release the memory map.
+        """
+        for view in (self._offsets, self._counts, self._ranking):
+            view.release()
+        self._view.release()
+        self._map.close()
@@ -2,8 +2,26 @@
 # -*- coding: utf-8 -*-
 """
 Prediction module. Uses Pressagio as an engine.
+
+Pressagio instance, together with its connection to the n-gram database,
+is created only once and then lives for the whole session inside a dedicated
+service thread. Sqlite connections can not be shared between threads, so all
+the queries are performed by that single thread, callers only wait for the
+results.
+
+Completions of a single word, with no preceding context, are served straight
+from the memory-mapped `completion_index`, Pressagio is asked only when there
+is a bigram or trigram context. Words learnt from the user's own texts, see
+`user_ngrams`, are merged into the ranking ahead of the static ones. Results
+are memoised by the service in a small LRU cache, keyed by the context.
 """
+import bisect
+import collections
+import os
 import platform
+import threading
+import time
+from concurrent import futures
 
 import pressagio.callback
 import pressagio
@@ -13,8 +31,11 @@ try:
 except ImportError:
     import ConfigParser as configparser
 
-from pisak import res
+from pisak import res, logger, dirs
+from pisak.speller.prediction import completion_index, user_ngrams
+
 
+_LOG = logger.get_logger(__name__)
 
 _DB_PATH = res.get("n_grams.sqlite")
 
@@ -26,6 +47,19 @@ _CONFIG_PARSER.read(_CONFIG_FILE)
 
 _CONFIG_PARSER["Database"]["database"] = _DB_PATH
 
+_INDEX_PATH = os.path.join(dirs.HOME_PISAK_DATABASES, "n_grams_unigrams.idx")
+
+_SUGGESTIONS = _CONFIG_PARSER.getint("Selector", "suggestions")
+
+#: Prefix added to every buffer passed to the engine
+_BUFFER_PREFIX = " " if platform.linux_distribution()[0] == "Ubuntu" else ""  # temporary fix
+
+#: Number of predictions after which the latency summary gets logged
+_LATENCY_LOG_INTERVAL = 100
+
+#: Number of contexts whose predictions are memoised
+_CACHE_SIZE = 256
+
 
 def get_predictions(string):
     """
@@ -35,25 +69,273 @@ def get_predictions(string):
 
     :return: list of predictions, as strings.
     """
-    callback = __CallbackClass(string)
-    predictions = pressagio.Pressagio(callback, _CONFIG_PARSER).predict()
-    if string.rstrip().split()[-1][0].isupper() and string[-1] != ' ':  # capital letters are handled here
-        predictions = [p[0].upper() + p[1:] for p in predictions]
-    if string in predictions:
-        predictions.remove(string)
-    return predictions
+    return get_service().get_predictions(string)
+
+
+def learn(text):
+    """
+    Learn from the text committed by the user, so that future predictions
+    take it into account.
+
+    :param text: committed text.
+    """
+    get_user_store().learn(text)
+    get_service().invalidate_cache()
+
+
+def get_service():
+    """
+    Get the prediction service shared by the whole application.
+    Service is created on the first call.
+
+    :return: `PredictionService` instance.
+    """
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = PredictionService()
+        return _SERVICE
+
+
+def get_completion_index():
+    """
+    Get the completion index of the n-gram database vocabulary.
+    Index is compiled, if needed, and opened on the first call.
+
+    :return: `completion_index.CompletionIndex` instance or None
+    if the index is not available.
+    """
+    global _INDEX
+    with _SERVICE_LOCK:
+        if _INDEX is None:
+            try:
+                _INDEX = completion_index.open_index(_DB_PATH, _INDEX_PATH)
+            except (OSError, completion_index.CompletionIndexError) as exc:
+                _LOG.warning("Completion index not available: {}".format(exc))
+                _INDEX = False
+        return _INDEX or None
+
+
+def get_user_store():
+    """
+    Get the store of n-grams learnt from the user's texts.
+    Store is created on the first call.
 
+    :return: `user_ngrams.UserNgramStore` instance.
+    """
+    global _USER_STORE
+    with _SERVICE_LOCK:
+        if _USER_STORE is None:
+            _USER_STORE = user_ngrams.UserNgramStore(
+                dirs.HOME_USER_NGRAMS_DB, on_load=_on_user_store_load)
+        return _USER_STORE
+
+
+def _on_user_store_load():
+    # predictions memoised before the load lack the user's words
+    if _SERVICE is not None:
+        _SERVICE.invalidate_cache()
+
+
+class LatencyHistogram:
+    """
+    Histogram of prediction latencies. Samples are counted in buckets
+    with fixed upper bounds, given in milliseconds.
+
+    :param bounds: ascending sequence of buckets' upper bounds, in ms.
+    """
 
-class __CallbackClass(pressagio.callback.Callback):
-    def __init__(self, buffer):
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self, bounds=BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.max = 0.
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        """
+        Record single latency sample.
+
+        :param latency: latency in seconds.
+        """
+        latency_ms = latency * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, latency_ms)] += 1
+            self.total += 1
+            self.max = max(self.max, latency_ms)
+
+    def percentile(self, perc):
+        """
+        Get an upper bound of the given latency percentile.
+
+        :param perc: percentile, number from 0 to 100.
+
+        :return: upper bound of the bucket that the percentile falls into, in ms,
+        or None if there are no samples yet.
+        """
+        with self._lock:
+            if self.total == 0:
+                return None
+            threshold = self.total * perc / 100
+            running = 0
+            for bound, count in zip(self.bounds, self.counts):
+                running += count
+                if running >= threshold:
+                    return bound
+            return self.max
+
+    def summary(self):
+        """
+        Get a human readable summary of the histogram.
+
+        :return: string.
+        """
+        with self._lock:
+            buckets = ", ".join(
+                "<={}ms: {}".format(bound, count) for bound, count in
+                zip(self.bounds, self.counts) if count)
+            overflow = self.counts[-1]
+            total, maximum = self.total, self.max
+        if overflow:
+            buckets += ", >{}ms: {}".format(self.bounds[-1], overflow)
+        return "{} predictions, p50 <= {}ms, p99 <= {}ms, max {:.1f}ms ({})".format(
+            total, self.percentile(50), self.percentile(99), maximum, buckets)
+
+
+class PredictionService:
+    """
+    Long-lived prediction service. Keeps one Pressagio instance
+    with an open database connection for the whole session.
+    All the predictions are executed in one service thread.
+    Predictions are memoised in an LRU cache keyed by the context,
+    which must be invalidated whenever the n-gram counts change.
+
+    :param cache_size: maximum number of memoised contexts.
+    """
+
+    def __init__(self, cache_size=_CACHE_SIZE):
+        self.latency = LatencyHistogram()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor = futures.ThreadPoolExecutor(max_workers=1)
+        self._callback = None
+        self._engine = None
+
+    def get_predictions(self, string):
+        """
+        Get prediction for the given string, from the cache if possible.
+
+        :param string: some string.
+
+        :return: list of predictions, as strings.
+        """
+        with self._cache_lock:
+            predictions = self._cache.get(string)
+            if predictions is not None:
+                self._cache.move_to_end(string)
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+            lookups = self.cache_hits + self.cache_misses
+        if lookups % _LATENCY_LOG_INTERVAL == 0:
+            _LOG.debug("Prediction cache hit ratio: {:.2f} ({} lookups).".format(
+                self.cache_hits / lookups, lookups))
+        if predictions is None:
+            predictions = self._get_predictions(string)
+            with self._cache_lock:
+                self._cache[string] = predictions
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return list(predictions)
+
+    def invalidate_cache(self):
+        """
+        Drop all the memoised predictions.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def predict(self, string):
+        """
+        Get raw engine predictions for the given string. Blocks until
+        the service thread has finished the query.
+
+        :param string: text being a context for prediction.
+
+        :return: list of predictions, as strings.
+        """
+        return self._executor.submit(self._predict, string).result()
+
+    def _get_predictions(self, string):
+        words = string.split()
+        index = get_completion_index()
+        if index is not None and len(words) == 1 and not string[-1].isspace():
+            predictions = [word for word, _count in
+                           index.complete(words[0].lower(), _SUGGESTIONS)]
+        else:
+            predictions = self.predict(string)
+        partial = not string[-1].isspace()
+        own = get_user_store().suggest(
+            [word.lower() for word in words], partial, _SUGGESTIONS)
+        if own:
+            predictions = own + [word for word in predictions
+                                 if word not in own]
+            predictions = predictions[:_SUGGESTIONS]
+        if string.rstrip().split()[-1][0].isupper() and string[-1] != ' ':  # capital letters are handled here
+            predictions = [p[0].upper() + p[1:] for p in predictions]
+        if string in predictions:
+            predictions.remove(string)
+        return tuple(predictions)
+
+    def close(self):
+        """
+        Close the database connection and stop the service thread.
+        """
+        self._executor.submit(self._close_engine)
+        self._executor.shutdown(wait=True)
+
+    def _ensure_engine(self):
+        if self._engine is None:
+            self._callback = _Callback()
+            self._engine = pressagio.Pressagio(self._callback, _CONFIG_PARSER)
+
+    def _close_engine(self):
+        if self._engine is not None:
+            self._engine.close_database()
+            self._engine = None
+
+    def _predict(self, string):
+        start = time.perf_counter()
+        self._ensure_engine()
+        self._callback.buffer = _BUFFER_PREFIX + string
+        predictions = self._engine.predict()
+        self.latency.add(time.perf_counter() - start)
+        if self.latency.total % _LATENCY_LOG_INTERVAL == 0:
+            _LOG.debug("Prediction latency: " + self.latency.summary())
+        return predictions
+
+
+class _Callback(pressagio.callback.Callback):
+    def __init__(self):
         super().__init__()
-        if platform.linux_distribution()[0] == 'Ubuntu':  # temporary fix
-            self.buffer = ' ' + buffer
-        else:	
-            self.buffer = buffer
+        self.buffer = ''
 
     def past_stream(self):
         return self.buffer
 
     def future_stream(self):
-        return ''
\ No newline at end of file
+        return ''
+
+
+_SERVICE = None
+
+_INDEX = None
+
+_USER_STORE = None
+
+_SERVICE_LOCK = threading.Lock()
@@ -0,0 +1,217 @@
+"""
+User specific n-gram store. Learns words and word pairs from the text
+committed by the user, so that the predictions adapt to the names and phrases
+the user types every day.
+
+Counts are kept in memory and all the disk operations happen in one background
+thread: loading the store at start, merging the learnt batches into the
+database every now and then and compacting the database when it grows too big.
+Learning and querying never touch the disk. Words are also kept sorted,
+so the words starting with the typed prefix are found with a binary search.
+"""
+import bisect
+import collections
+import re
+import sqlite3
+import threading
+
+from pisak import logger
+
+
+_LOG = logger.get_logger(__name__)
+
+_SENTENCE_BREAK = re.compile(r"[.!?;\n]+")
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS unigrams ("
+    "word TEXT PRIMARY KEY, count INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS bigrams ("
+    "word_1 TEXT NOT NULL, word TEXT NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (word_1, word))"
+)
+
+
+def tokenize(text):
+    """
+    Split text into sentences of lowercase words.
+
+    :param text: any text.
+
+    :return: list of lists of words.
+    """
+    sentences = (_WORD.findall(sentence.lower())
+                 for sentence in _SENTENCE_BREAK.split(text))
+    return [words for words in sentences if words]
+
+
+class UserNgramStore:
+    """
+    Store of n-gram counts learnt from the user's texts.
+
+    :param path: path to the sqlite database file.
+    :param merge_interval: seconds between merges of the learnt batches
+    into the database.
+    :param max_entries: maximum number of unigrams and of bigrams kept, least
+    frequent ones are dropped on compaction.
+    :param min_count: how many times a word has to be used before
+    being suggested.
+    :param on_load: function called from the background thread once
+    the store has been loaded from the disk.
+    """
+
+    def __init__(self, path, merge_interval=60, max_entries=20000, min_count=2,
+                 on_load=None):
+        self.path = path
+        self.merge_interval = merge_interval
+        self.max_entries = max_entries
+        self.min_count = min_count
+        self.on_load = on_load
+        self.unigrams = collections.Counter()
+        self._words = []  # keys of the unigrams, sorted
+        self.bigrams = collections.defaultdict(collections.Counter)
+        self._pending_unigrams = collections.Counter()
+        self._pending_bigrams = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def learn(self, text):
+        """
+        Learn words and word pairs from the given text. Counts are updated
+        in memory only, the batch is saved later on, in the background.
+
+        :param text: text committed by the user.
+        """
+        with self._lock:
+            for words in tokenize(text):
+                for idx, word in enumerate(words):
+                    if word not in self.unigrams:
+                        bisect.insort(self._words, word)
+                    self.unigrams[word] += 1
+                    self._pending_unigrams[word] += 1
+                    if idx > 0:
+                        self.bigrams[words[idx - 1]][word] += 1
+                        self._pending_bigrams[(words[idx - 1], word)] += 1
+
+    def suggest(self, words, partial, limit):
+        """
+        Get the user's own words matching the given context.
+
+        :param words: lowercase words of the context, the last one being
+        the word being typed if `partial` is True.
+        :param partial: whether the last word is still being typed.
+        :param limit: maximum number of suggestions.
+
+        :return: list of words, the most frequent first.
+        """
+        prefix = words[-1] if partial else ""
+        previous = words[-2] if partial and len(words) > 1 else \
+            (words[-1] if not partial and words else None)
+        with self._lock:
+            ranked = []
+            if previous is not None:
+                ranked.extend(
+                    (count, word) for word, count in
+                    self.bigrams.get(previous, {}).items()
+                    if word.startswith(prefix) and count >= self.min_count)
+            if partial:
+                seen = set(word for _count, word in ranked)
+                start = bisect.bisect_left(self._words, prefix)
+                end = bisect.bisect_left(self._words, prefix + "\uffff", start)
+                ranked.extend(
+                    (self.unigrams[word], word) for word in
+                    self._words[start:end] if word not in seen and
+                    self.unigrams[word] >= self.min_count)
+        ranked.sort(key=lambda item: -item[0])
+        return [word for _count, word in ranked[:limit]]
+
+    def close(self):
+        """
+        Merge the pending batch and stop the background thread.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        try:
+            connection = sqlite3.connect(self.path)
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            self._load(connection)
+        except sqlite3.Error as exc:
+            _LOG.error("User n-gram store not available: {}".format(exc))
+            return
+        if self.on_load is not None:
+            self.on_load()
+        try:
+            while not self._stop.wait(self.merge_interval):
+                self._merge(connection)
+            self._merge(connection)
+        finally:
+            connection.close()
+
+    def _load(self, connection):
+        unigrams = connection.execute("SELECT word, count FROM unigrams")
+        bigrams = connection.execute("SELECT word_1, word, count FROM bigrams")
+        with self._lock:
+            for word, count in unigrams:
+                self.unigrams[word] += count
+            for word_1, word, count in bigrams:
+                self.bigrams[word_1][word] += count
+            self._words = sorted(self.unigrams)
+
+    def _merge(self, connection):
+        with self._lock:
+            unigrams, self._pending_unigrams = \
+                self._pending_unigrams, collections.Counter()
+            bigrams, self._pending_bigrams = \
+                self._pending_bigrams, collections.Counter()
+        if not unigrams and not bigrams:
+            return
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR IGNORE INTO unigrams VALUES (?, 0)",
+                    ((word,) for word in unigrams))
+                connection.executemany(
+                    "UPDATE unigrams SET count = count + ? WHERE word = ?",
+                    ((count, word) for word, count in unigrams.items()))
+                connection.executemany(
+                    "INSERT OR IGNORE INTO bigrams VALUES (?, ?, 0)",
+                    bigrams.keys())
+                connection.executemany(
+                    "UPDATE bigrams SET count = count + ? "
+                    "WHERE word_1 = ? AND word = ?",
+                    ((count, word_1, word) for (word_1, word), count in
+                     bigrams.items()))
+            self._compact(connection)
+        except sqlite3.Error as exc:
+            _LOG.error("Failed to save user n-grams: {}".format(exc))
+            with self._lock:
+                self._pending_unigrams.update(unigrams)
+                self._pending_bigrams.update(bigrams)
+
+    def _compact(self, connection):
+        with connection:
+            connection.execute(
+                "DELETE FROM unigrams WHERE word NOT IN (SELECT word FROM "
+                "unigrams ORDER BY count DESC LIMIT ?)", (self.max_entries,))
+            connection.execute(
+                "DELETE FROM bigrams WHERE rowid NOT IN (SELECT rowid FROM "
+                "bigrams ORDER BY count DESC LIMIT ?)", (self.max_entries,))
+        with self._lock:
+            if len(self.unigrams) > self.max_entries:
+                self.unigrams = collections.Counter(
+                    dict(self.unigrams.most_common(self.max_entries)))
+                self._words = sorted(self.unigrams)
+            if sum(map(len, self.bigrams.values())) > self.max_entries:
+                pairs = sorted(
+                    ((count, word_1, word) for word_1, followers in
+                     self.bigrams.items() for word, count in followers.items()),
+                    reverse=True)
+                self.bigrams = collections.defaultdict(collections.Counter)
+                for count, word_1, word in pairs[:self.max_entries]:
+                    self.bigrams[word_1][word] = count
@@ -0,0 +1,214 @@
+"""
+Text model of the speller documents.
+
+Text is kept as a list of small chunks, that is a flat rope, together with
+the start offsets of the chunks. Edits rebuild only the chunk they touch and
+the offsets are recomputed lazily, starting from the first chunk that has been
+edited, so typing at the end of a document never walks the whole text.
+Length is known in a constant time and any position is located with a binary
+search over the offsets.
+"""
+import bisect
+import sys
+import time
+
+
+#: Target length of a single chunk, chunks longer than twice that are split
+CHUNK_SIZE = 1024
+
+
+class TextModel:
+    """
+    Model owning the text of a document.
+
+    :param text: initial text.
+    """
+
+    def __init__(self, text=""):
+        self.set_text(text)
+
+    def __len__(self):
+        return self._length
+
+    def set_text(self, text):
+        """
+        Replace the whole text.
+
+        :param text: new text.
+        """
+        self._chunks = [""]
+        self._starts = [0]
+        self._valid = 1
+        self._length = 0
+        self.insert(0, text)
+
+    def get_text(self):
+        """
+        Get the whole text. Involves copying of the whole text, so should
+        be avoided on every keystroke.
+
+        :return: string.
+        """
+        return "".join(self._chunks)
+
+    def get_slice(self, start, end):
+        """
+        Get a fragment of the text.
+
+        :param start: start position, inclusive.
+        :param end: end position, exclusive.
+
+        :return: string.
+        """
+        start, end = max(0, start), min(end, self._length)
+        if start >= end:
+            return ""
+        idx, offset = self._locate(start)
+        parts = []
+        missing = end - start
+        while missing > 0:
+            part = self._chunks[idx][offset : offset + missing]
+            parts.append(part)
+            missing -= len(part)
+            idx, offset = idx + 1, 0
+        return "".join(parts)
+
+    def char_at(self, pos):
+        """
+        Get a single character.
+
+        :param pos: position of the character.
+
+        :return: string with the character.
+        """
+        if not 0 <= pos < self._length:
+            raise IndexError("Text position out of range: {}.".format(pos))
+        idx, offset = self._locate(pos)
+        return self._chunks[idx][offset]
+
+    def rfind(self, chars, end=None):
+        """
+        Find the last occurrence of any of the given characters.
+
+        :param chars: string with characters to look for.
+        :param end: position that the search should stop at, exclusive,
+        the end of the text by default.
+
+        :return: position of the character or -1 if there is no such one.
+        """
+        end = self._length if end is None else min(end, self._length)
+        idx, offset = self._locate(end)
+        chunk = self._chunks[idx][:offset]
+        while True:
+            found = max(chunk.rfind(char) for char in chars)
+            if found >= 0:
+                return self._starts[idx] + found
+            if idx == 0:
+                return -1
+            idx -= 1
+            chunk = self._chunks[idx]
+
+    def insert(self, pos, text):
+        """
+        Insert text.
+
+        :param pos: position to insert the text at.
+        :param text: text to be inserted.
+        """
+        if not text:
+            return
+        idx, offset = self._locate(pos)
+        chunk = self._chunks[idx]
+        self._replace_chunks(idx, idx, chunk[:offset] + text + chunk[offset:])
+        self._length += len(text)
+
+    def delete(self, start, end):
+        """
+        Delete a fragment of the text.
+
+        :param start: start position, inclusive.
+        :param end: end position, exclusive.
+
+        :return: deleted text.
+        """
+        start, end = max(0, start), min(end, self._length)
+        if start >= end:
+            return ""
+        removed = self.get_slice(start, end)
+        first, first_offset = self._locate(start)
+        last, last_offset = self._locate(end)
+        self._replace_chunks(first, last, self._chunks[first][:first_offset] +
+                             self._chunks[last][last_offset:])
+        self._length -= len(removed)
+        return removed
+
+    def _replace_chunks(self, first, last, text):
+        if len(text) > 2 * CHUNK_SIZE:
+            new_chunks = [text[idx : idx + CHUNK_SIZE]
+                          for idx in range(0, len(text), CHUNK_SIZE)]
+        else:
+            new_chunks = [text] if text else []
+        self._chunks[first : last + 1] = new_chunks
+        self._starts[first : last + 1] = [0] * len(new_chunks)
+        if not self._chunks:
+            self._chunks, self._starts = [""], [0]
+        self._valid = min(self._valid, first)
+
+    def _refresh(self):
+        if self._valid == 0:
+            self._starts[0] = 0
+            self._valid = 1
+        starts, chunks = self._starts, self._chunks
+        for idx in range(self._valid, len(chunks)):
+            starts[idx] = starts[idx - 1] + len(chunks[idx - 1])
+        self._valid = len(chunks)
+
+    def _locate(self, pos):
+        if self._valid < len(self._chunks):
+            self._refresh()
+        if pos >= self._length:
+            return len(self._chunks) - 1, len(self._chunks[-1])
+        idx = bisect.bisect_right(self._starts, pos) - 1
+        return idx, pos - self._starts[idx]
+
+
+def benchmark(sizes=(10**4, 10**5, 10**6), keystrokes=1000):
+    """
+    Compare typing into documents of the given sizes using the text model
+    and using a plain string copied on every keystroke, as done by reading
+    the whole text buffer back from Clutter.
+
+    :param sizes: lengths of the documents, in characters.
+    :param keystrokes: number of characters typed into each document.
+
+    :return: list of tuples with document size and the mean time per
+    keystroke in seconds, for the model and for the plain string.
+    """
+    results = []
+    for size in sizes:
+        initial = ("lorem ipsum dolor sit amet " * (size // 27 + 1))[:size]
+        model = TextModel(initial)
+        start = time.perf_counter()
+        for _idx in range(keystrokes):
+            pos = len(model)
+            model.insert(pos, "a")
+            model.get_slice(pos - 256, pos + 1)
+            model.rfind(" \n")
+        model_time = (time.perf_counter() - start) / keystrokes
+        text = initial
+        start = time.perf_counter()
+        for _idx in range(keystrokes):
+            text = text + "a"
+            copy = text.encode("utf-8").decode("utf-8")
+            copy[-257:]
+            copy.rfind(" ")
+        plain_time = (time.perf_counter() - start) / keystrokes
+        results.append((size, model_time, plain_time))
+    return results
+
+
+if __name__ == "__main__":
+    for size, model_time, plain_time in benchmark(
+            [int(arg) for arg in sys.argv[1:]] or (10**4, 10**5, 10**6)):
+        print("{:>8} chars: model {:.1f} us, plain copy {:.1f} us".format(
+            size, model_time * 10**6, plain_time * 10**6))
@@ -0,0 +1,102 @@
+"""
+Undo history of the speller text operations.
+"""
+import collections
+import json
+import tempfile
+
+from pisak import logger
+
+
+_LOG = logger.get_logger(__name__)
+
+
+class UndoHistory:
+    """
+    Bounded history of text operations. Every new operation is first offered
+    to the most recent one, through its `compose` method, so that consecutive
+    operations of the same kind form a single undo unit. Only the `limit` most
+    recent units are kept in memory, older ones are spilled, in blocks, to a
+    temporary file and are read back when the memory part runs out.
+
+    :param operation_types: classes of the operations that can be stored,
+    needed to restore them from the disk.
+    :param unit: size of the undo units, passed to the `compose` method,
+    either 'word' or 'phrase'.
+    :param limit: maximum number of units kept in memory.
+    :param spill: whether the units exceeding the limit should be kept
+    on the disk, otherwise they are discarded.
+    """
+
+    def __init__(self, operation_types, unit="word", limit=200, spill=True):
+        self.unit = unit
+        self.limit = limit
+        self.spill = spill
+        self._types = {op_type.__name__: op_type for op_type in operation_types}
+        self._entries = collections.deque()
+        self._spill_file = None
+        self._spill_offsets = []
+
+    def __len__(self):
+        return len(self._entries) + sum(
+            count for _offset, count in self._spill_offsets)
+
+    def push(self, operation):
+        """
+        Add new operation to the history, composing it with the most recent one
+        if possible.
+
+        :param operation: text operation.
+        """
+        if not self._entries or \
+                not self._entries[-1].compose(operation, self.unit):
+            self._entries.append(operation)
+            if len(self._entries) > self.limit:
+                self._spill_block()
+
+    def pop(self):
+        """
+        Remove and return the most recent undo unit.
+
+        :return: text operation or None if the history is empty.
+        """
+        if not self._entries and self._spill_offsets:
+            self._restore_block()
+        if self._entries:
+            return self._entries.pop()
+
+    def clear(self):
+        """
+        Remove the whole history.
+        """
+        self._entries.clear()
+        self._spill_offsets = []
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _spill_block(self):
+        size = self.limit // 2 or 1
+        block = [self._entries.popleft() for _idx in range(size)]
+        if not self.spill:
+            return
+        try:
+            if self._spill_file is None:
+                self._spill_file = tempfile.TemporaryFile(
+                    mode="w+", encoding="utf-8")
+            self._spill_file.seek(0, 2)
+            offset = self._spill_file.tell()
+            self._spill_file.write(json.dumps(
+                [[type(op).__name__, vars(op)] for op in block]) + "\n")
+            self._spill_file.flush()
+            self._spill_offsets.append((offset, len(block)))
+        except OSError as exc:
+            _LOG.warning("Can not spill undo history: {}".format(exc))
+
+    def _restore_block(self):
+        offset, _count = self._spill_offsets.pop()
+        self._spill_file.seek(offset)
+        block = json.loads(self._spill_file.readline())
+        self._spill_file.seek(offset)
+        self._spill_file.truncate()
+        self._entries.extend(self._types[name](**attrs) for name, attrs in block)
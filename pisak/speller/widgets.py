@@ -1,13 +1,15 @@
 """
 Definitions of widgets specific to speller applet
 """
+import os
 import re
 
 from gi.repository import Clutter, Mx, GObject, Pango
 
 import pisak
 from pisak import res, unit, layout, properties, scanning, configurator, \
-    style, text_tools, widgets, exceptions
+    style, text_tools, widgets, exceptions, dirs
+from pisak.speller import text_model, undo, journal
 from pisak.speller.prediction import predictor
 
 
@@ -95,6 +97,9 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
            style.StylableContainer):
     """
     Speller specific text box where all the text operations happen.
+    Text is owned by a `text_model.TextModel` kept in sync with the Clutter
+    text buffer, so that any queries about the text do not have to copy
+    the whole buffer out of Clutter.
 
    Properties:
 
@@ -135,16 +140,21 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
             end = self.pos + len(self.value)
             text.clutter_text.delete_text(self.pos, end)
 
-        def compose(self, operation):
+        def compose(self, operation, unit="word"):
             """
             Compose two insertions into one text modification.
 
             :param operation: type of operation to be performed.
+            :param unit: 'word' or 'phrase', how far the insertions can be
+            composed.
             """
             if isinstance(operation, Text.Insertion):
                 consecutive = self.pos + len(self.value) == operation.pos
-                compatible = not self.value[-1].isspace() or \
-                    operation.value[0].isspace()
+                if unit == "phrase":
+                    boundary = Text.ends_sentence(self.value)
+                else:
+                    boundary = self.value[-1].isspace()
+                compatible = not boundary or operation.value[0].isspace()
                 if consecutive and compatible:
                     self.value = self.value + operation.value
                     return True
@@ -190,16 +200,21 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
             """
             text.clutter_text.insert_text(self.value, self.pos)
 
-        def compose(self, operation):
+        def compose(self, operation, unit="word"):
             """
             Compose two deletions into one text modification.
 
             :param operation: type of operation to be performed.
+            :param unit: 'word' or 'phrase', how far the deletions can be
+            composed.
             """
             if isinstance(operation, Text.Deletion):
                 consecutive = operation.pos + len(operation.value) == self.pos
-                compatible = operation.value[-1].isspace() or \
-                    not self.value[0].isspace()
+                if unit == "phrase":
+                    compatible = not Text.ends_sentence(operation.value)
+                else:
+                    compatible = operation.value[-1].isspace() or \
+                        not self.value[0].isspace()
                 if consecutive and compatible:
                     self.pos = operation.pos
                     self.value = operation.value + self.value
@@ -260,6 +275,21 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         def __str__(self):
             return "{} -> {} @ {}".format(self.before, self.after, self.pos)
 
+    #: Characters ending a sentence, that is a phrase undo unit
+    SENTENCE_ENDS = ".!?\n"
+
+    @staticmethod
+    def ends_sentence(text):
+        """
+        Check if the given text ends a sentence, not counting trailing spaces.
+
+        :param text: some text.
+
+        :return: boolean.
+        """
+        stripped = text.rstrip(" ")
+        return bool(stripped) and stripped[-1] in Text.SENTENCE_ENDS
+
     __gtype_name__ = "PisakScrolledText"
     __gproperties__ = {
         "ratio_width": (GObject.TYPE_FLOAT, None, None, 0, 1., 0, GObject.PARAM_READWRITE),
@@ -267,7 +297,10 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
 
     def __init__(self):
         super().__init__()
-        self.history = []
+        self.history = undo.UndoHistory(
+            (Text.Insertion, Text.Deletion, Text.Replacement), unit="phrase")
+        self._committed_text = ""
+        self._journal = None
         self._scroll_step = 50
         self._init_text()
         self.prepare_style()
@@ -286,12 +319,36 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         self.text.set_margin(self.margin)
         self.box.add_actor(self.text, 0)
         self.clutter_text = self.text.get_clutter_text()
+        self.model = text_model.TextModel(self.clutter_text.get_text())
+        text_buffer = self.clutter_text.get_buffer()
+        text_buffer.connect("inserted-text", self._on_inserted_text)
+        text_buffer.connect("deleted-text", self._on_deleted_text)
         self.connect("notify::mapped", self._init_setup)
         self._set_text_params()
         self.add_actor(self.box)
         self.clutter_text.connect("cursor-changed",
                                   self._scroll_to_view)
 
+    def _on_inserted_text(self, text_buffer, position, chars, n_chars):
+        self.model.insert(position, chars[:n_chars])
+        if self._journal is not None:
+            self._journal.record_insertion(position, chars[:n_chars])
+
+    def _on_deleted_text(self, text_buffer, position, n_chars):
+        self.model.delete(position, position + n_chars)
+        if self._journal is not None:
+            self._journal.record_deletion(position, n_chars)
+
+    def _close_journal(self, *args):
+        if self._journal is not None:
+            self._journal.close(remove=True)
+            self._journal = None
+
+    def _char_at(self, pos):
+        if pos < 0:
+            pos += self.get_text_length()
+        return self.model.char_at(pos)
+
     def _init_setup(self, *args):
         self.parent = self.get_parent()
         if isinstance(self.parent, CursorGroup):
@@ -311,13 +368,12 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
             'falling to default cursor size: 100.')
             cursor_height = 100
         lines = self.clutter_text.get_layout().get_line_count()
-        text_len = len(self.text.get_text())
+        text_len = self.get_text_length()
         factor = 1.5*text_len**0.55/lines
         self.clutter_text.set_cursor_size(cursor_height*factor)
         
     def _add_operation(self, operation):
-        if len(self.history) == 0 or not self.history[-1].compose(operation):
-            self.history.append(operation)
+        self.history.push(operation)
         operation.apply(self)
 
     def _set_text_params(self):
@@ -394,10 +450,30 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         """
         Undo the previous operation.
         """
-        if len(self.history) > 0:
-            self.history.pop().revert(self)
+        operation = self.history.pop()
+        if operation is not None:
+            operation.revert(self)
         self.clutter_text.emit('cursor-changed')
 
+    def enable_journal(self, name):
+        """
+        Start journaling all the changes of the text, so that it can be
+        recovered after a crash. If a journal with the given name has been
+        left by a previous session, its text is recovered first. Journal is
+        removed when the text box is destroyed in a normal way.
+
+        :param name: name of the journal, unique for the text box.
+        """
+        if self._journal is not None:
+            return
+        path = os.path.join(dirs.HOME_JOURNALS_DIR, name)
+        text, seq = journal.recover(path)
+        if text:
+            self.clear_all()
+            self.type_text(text)
+        self._journal = journal.Journal(path, self.get_text(), seq)
+        self.connect("destroy", self._close_journal)
+
     def get_cursor_position(self):
         """
         Get current position of the cursor in the number of chars.
@@ -422,7 +498,39 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
 
         :return: entire text, string.
         """
-        return self.clutter_text.get_text()
+        return self.model.get_text()
+
+    def get_text_slice(self, start_pos, end_pos):
+        """
+        Return a fragment of the text from the text buffer.
+
+        :param start_pos: start position given in characters.
+        :param end_pos: end position given in characters, exclusive.
+
+        :return: fragment of the text, string.
+        """
+        return self.model.get_slice(start_pos, end_pos)
+
+    def commit_text(self):
+        """
+        Mark the current text as committed by the user, for example saved
+        or read aloud, and let the predictor learn from it. Text committed
+        previously is not learnt again, only the part after the point
+        where the current text diverges from it. A word split by that point,
+        for example typed further after the previous commit, is learnt
+        as a whole.
+        """
+        text = self.get_text()
+        if text == self._committed_text:
+            return
+        start = len(os.path.commonprefix([self._committed_text, text]))
+        self._committed_text = text
+        if 0 < start < len(text) and text[start - 1].isalpha() and \
+                text[start].isalpha():
+            while start > 0 and text[start - 1].isalpha():
+                start -= 1
+        if text[start:].strip():
+            predictor.learn(text[start:])
 
     def get_text_length(self):
         """
@@ -430,7 +538,7 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
 
         :return: length of the text, integer.
         """
-        return len(self.clutter_text.get_text())
+        return len(self.model)
         
     def type_text(self, text):
         """
@@ -457,7 +565,7 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
             return
         elif pos > 0:
             pos -= 1
-        text = self.get_text()[pos]
+        text = self.model.char_at(pos)
         operation = Text.Deletion(pos, text)
         self._add_operation(operation)
         self.clutter_text.emit('cursor-changed')
@@ -477,7 +585,7 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         """
         text = self.get_text()
         if len(text) > 0:
-            operation = Text.Deletion(0, self.get_text())
+            operation = Text.Deletion(0, text)
             self._add_operation(operation)
         self.clutter_text.emit('cursor-changed')
 
@@ -488,11 +596,11 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
 
         :return: endmost string, string.
         """
-        text = self.get_text()
-        stripped_text = text.rstrip()
-        start_pos = stripped_text.rfind(' ') + 1
-        end_pos = len(stripped_text)
-        return text[start_pos : end_pos]
+        end_pos = self.get_text_length()
+        while end_pos > 0 and self.model.char_at(end_pos - 1).isspace():
+            end_pos -= 1
+        start_pos = self.model.rfind(' ', end_pos) + 1
+        return self.model.get_slice(start_pos, end_pos)
 
     def replace_endmost_string(self, text_after):
         """
@@ -506,24 +614,23 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         #automatically add whitespace after predicted word
         #this is the default in most prediction software
 
-        current_text = self.get_text()
+        text_length = self.get_text_length()
         # if the text buffer is empty, or ends with whitespace, simply
         # add predicted words. Otherwise, replace the last word.
-        if current_text:
+        if text_length:
+            last_char = self.model.char_at(text_length - 1)
             # if the text buffer ends in a commas, add a space before
             # adding the predicted word
             #exception are non-letter characters that reset the context
             
             exceptions = '''1 2 3 4 5 6 7 8 9 0 . , ; ? ! : ' " - = + _ ( ) [ ] < > / \ | & @ % *''' 
-            if current_text[-1] in exceptions.split():
+            if last_char in exceptions.split():
                 self.type_text(' ' + text_after)
-            elif current_text[-1] == ' ':
+            elif last_char == ' ':
                 self.type_text(text_after)
             else:
-                stripped_text = current_text.rstrip(" ")
-                start_pos = max(stripped_text.rfind(' '),
-                                stripped_text.rfind("\n")) + 1
-                text_before = current_text[start_pos : -1]
+                start_pos = self.model.rfind(" \n") + 1
+                text_before = self.model.get_slice(start_pos, text_length - 1)
                 operation = Text.Replacement(start_pos, text_before, text_after)
                 self._add_operation(operation)
         else:
@@ -554,19 +661,18 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         Move cursor one word backward.
         """
         current_position = self.get_cursor_position()
-        text = self.clutter_text.get_text()
         if current_position == 0:
             pass
         else:
             if current_position == -1:
-                current_position = len(text) - 1
-            letter = text[current_position-1]
+                current_position = self.get_text_length() - 1
+            letter = self._char_at(current_position-1)
             while letter == ' ':
                 current_position -= 1
-                letter = text[current_position]
+                letter = self._char_at(current_position)
             while letter != ' ':
                 current_position -= 1
-                letter = text[current_position-1]
+                letter = self._char_at(current_position-1)
                 if current_position == 0:
                     break
             self.clutter_text.set_cursor_position(current_position)
@@ -576,18 +682,17 @@ class Text(Mx.ScrollView, properties.PropertyAdapter, configurator.Configurable,
         Move cursor one word forward.
         """
         current_position = self.get_cursor_position()
-        text = self.clutter_text.get_text()
         if current_position <= -1:
             pass
         else:
             try:
-                letter = text[current_position]
+                letter = self._char_at(current_position)
                 while letter == ' ':
                     current_position += 1
-                    letter = text[current_position]
+                    letter = self._char_at(current_position)
                 while letter != ' ':
                     current_position += 1
-                    letter = text[current_position-1]
+                    letter = self._char_at(current_position-1)
             except IndexError:
                 current_position = -1
         self.clutter_text.set_cursor_position(current_position)
@@ -902,6 +1007,8 @@ class Dictionary(text_tools.Predictor):
        """
     LAST_CONTEXT = re.compile(LAST_CONTEXT_SRC, re.VERBOSE|re.IGNORECASE)
 
+    CONTEXT_SIZE = 256
+
     def __init__(self):
         super().__init__()
         self.basic_content = list(pisak.config['prediction'].values())
@@ -914,14 +1021,14 @@ class Dictionary(text_tools.Predictor):
         :param text: text that needs a prediction, string.
         :param position: number of characters from the beginning position
         of the text that should be included.
+
+        :return: list of predicted words.
         """
         text_segment = text[0:position]
         context = self.get_prediction_context(text_segment)
         if len(text_segment) == 0 or not context:
-            self.content = self.basic_content
-        else:
-            self.content = predictor.get_predictions(context)
-        self.notify_content_update()
+            return self.basic_content
+        return predictor.get_predictions(context)
 
     @staticmethod
     def get_prediction_context(text):
@@ -1157,6 +1264,7 @@ class PopUp(widgets.DialogWindow):
             new_text = self.target.get_text()
             with open(path, "w") as file:
                 file.write(new_text)
+            self.target.commit_text()
         elif self.mode == "load":
             with open(path, "r") as file:
                 text = file.read()
@@ -0,0 +1,150 @@
+"""
+Benchmark of the symbols search. Generates a book of symbols and measures
+the time of finding the symbols for the queries typed letter by letter,
+with and without typos, in two variants:
+
+* scan - every symbol checked against the query, one by one;
+* index - `symbol_search.SymbolIndex`.
+
+Usage::
+
+    python3 -m pisak.symboler.benchmark [CATEGORIES [SYMBOLS]]
+"""
+import random
+import sys
+import time
+
+from pisak.symboler import symbol_search
+
+
+#: Number of queries typed in every variant
+QUERIES = 50
+
+_SYLLABLES = ["ba", "be", "bo", "ci", "cze", "da", "do", "gra", "ka", "ko",
+              "la", "łó", "ma", "mi", "na", "no", "pa", "po", "ra", "rze",
+              "sa", "sto", "ta", "wa", "wie", "za", "ża", "źró"]
+
+
+def generate_categories(categories, symbols):
+    """
+    Generate categories with symbols of random names.
+
+    :param categories: number of categories.
+    :param symbols: number of symbols in every category.
+
+    :return: list of pairs: label of the category and list of names.
+    """
+    rand = random.Random(categories * 1000 + symbols)
+
+    def word():
+        return "".join(rand.choice(_SYLLABLES)
+                       for _ in range(rand.randint(2, 4)))
+
+    return [(word(), ["_".join(word() for _ in range(rand.randint(1, 3)))
+                      for _ in range(symbols)])
+            for _ in range(categories)]
+
+
+def generate_queries(categories, typos):
+    """
+    Generate queries, each being a prefix of a symbol name.
+
+    :param categories: categories the names are taken from.
+    :param typos: whether a letter of each query should be mistaken.
+
+    :return: list of queries, every one as typed letter by letter.
+    """
+    rand = random.Random(len(categories) + typos)
+    names = [name for _label, names in categories for name in names]
+    queries = []
+    for _ in range(QUERIES):
+        query = rand.choice(names).replace("_", " ")[:rand.randint(4, 8)]
+        if typos:
+            idx = rand.randrange(1, len(query))
+            query = query[:idx] + "x" + query[idx+1:]
+        queries.append([query[:length] for length in
+                        range(1, len(query) + 1)])
+    return queries
+
+
+def _within_one_edit(first, second):
+    """
+    Check whether the words differ by at most a single letter inserted,
+    deleted, substituted or two neighbouring letters transposed.
+    """
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    idx = 0
+    while idx < len(first) and first[idx] == second[idx]:
+        idx += 1
+    if len(first) < len(second):
+        return first[idx:] == second[idx+1:]
+    if first[idx+1:] == second[idx+1:]:
+        return True
+    return idx + 1 < len(first) and first[idx] == second[idx+1] and \
+        first[idx+1] == second[idx] and first[idx+2:] == second[idx+2:]
+
+
+def _scan(categories, query):
+    query_words = symbol_search.split_words(query)
+    # symbol can be found by the labels of all its categories
+    symbols = {}
+    for label, names in categories:
+        label_words = symbol_search.split_words(label)
+        for name in names:
+            symbols.setdefault(
+                name, symbol_search.split_words(name)).extend(label_words)
+    return [name for name, words in symbols.items() if all(
+        any(word.startswith(query_word) or (
+            len(query_word) >= symbol_search.MIN_FUZZY_LENGTH and
+            any(_within_one_edit(query_word, word[:length])
+                for length in range(len(query_word) - 1,
+                                    len(query_word) + 2)))
+            for word in words) for query_word in query_words)]
+
+
+def run(categories, symbols):
+    """
+    Run the benchmark.
+
+    :param categories: number of categories.
+    :param symbols: number of symbols in every category.
+
+    :return: time of building the index, in seconds, and dictionary with
+    variant names as keys and mean times of a single lookup, in seconds,
+    as values.
+    """
+    book = generate_categories(categories, symbols)
+    start = time.perf_counter()
+    index = symbol_search.SymbolIndex(book)
+    build = time.perf_counter() - start
+    results = {}
+    for typos in (False, True):
+        queries = [query for typed in generate_queries(book, typos)
+                   for query in typed]
+        for query in queries[::10]:
+            assert sorted(_scan(book, query)) == sorted(index.search(query))
+        for name, search in (("scan", lambda query: _scan(book, query)),
+                             ("index", index.search)):
+            start = time.perf_counter()
+            for query in queries:
+                search(query)
+            name += ", with typos" if typos else ""
+            results[name] = (time.perf_counter() - start) / len(queries)
+    return build, results
+
+
+def main(args):
+    categories = int(args[0]) if args else 50
+    symbols = int(args[1]) if len(args) > 1 else 100
+    print("book: {} categories, {} symbols each".format(categories, symbols))
+    build, results = run(categories, symbols)
+    print("index built in {:.0f} ms".format(build * 1000))
+    for name, mean in sorted(results.items()):
+        print("{}: {:.3f} ms".format(name, mean * 1000))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,163 @@
+"""
+Compiled book of symbols.
+
+Symbols are arranged in spreadsheets: the table of contents lists the
+categories and every category has a spreadsheet of its own, each sheet
+being a single page of symbols. Parsing the spreadsheets is slow, so their
+content is compiled once into a JSON index, which is then used to generate
+the pages. A spreadsheet is compiled again only if it has been modified
+or replaced by another one since the last compilation.
+
+Index can be compiled in advance with::
+
+    python3 -m pisak.symboler.symbol_book
+"""
+import json
+import os
+
+import ezodf
+
+from pisak import logger, dirs, exceptions
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Name of the table of contents spreadsheet
+TOC = "table_of_contents"
+
+_VERSION = 1
+
+
+class SymbolBookError(exceptions.PisakException):
+    """
+    Spreadsheet is missing or can not be compiled.
+    """
+    pass
+
+
+def compile_spreadsheet(path):
+    """
+    Compile the spreadsheet into lists of plain values.
+
+    :param path: path to the spreadsheet.
+
+    :return: list of sheets, each being a list of rows, each being a list
+    of cell values, None for the empty cells.
+    """
+    try:
+        document = ezodf.opendoc(path)
+    except (OSError, KeyError, ValueError) as exc:
+        raise SymbolBookError(exc) from exc
+    return [[[cell.value or None for cell in row] for row in sheet.rows()]
+            for sheet in document.sheets]
+
+
+class SymbolBook:
+    """
+    Index of the symbols spreadsheets, compiled on demand.
+
+    :param path: path to the index file.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or dirs.HOME_SYMBOLS_BOOK
+        self._spreadsheets = {}
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                index = json.load(file)
+            if index.get("version") == _VERSION:
+                self._spreadsheets = index["spreadsheets"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as exc:
+            _LOG.warning("Symbols index is corrupted, compiling it "
+                         "again: {}".format(exc))
+
+    def get_toc(self):
+        """
+        Get the table of contents.
+
+        :return: list of sheets, see `compile_spreadsheet`.
+        """
+        return self.get_sheets(TOC)
+
+    def get_categories(self):
+        """
+        Get names of all the categories, in the table of contents order.
+
+        :return: list of names.
+        """
+        return [value for sheet in self.get_toc() for row in sheet
+                for value in row if value and isinstance(value, str)]
+
+    def get_sheets(self, name):
+        """
+        Get content of the spreadsheet, compile it if it has not been
+        compiled yet or has changed since then.
+
+        :param name: name of the spreadsheet, without any extension.
+
+        :return: list of sheets, see `compile_spreadsheet`.
+        """
+        if self._compile(name):
+            self._save()
+        return self._spreadsheets[name]["sheets"]
+
+    def compile_all(self):
+        """
+        Compile the table of contents and all the categories.
+        """
+        changed = [self._compile(name)
+                   for name in [TOC] + self.get_categories()]
+        if any(changed):
+            self._save()
+
+    def _compile(self, name):
+        """
+        Compile the spreadsheet if it is stale.
+
+        :return: True if the spreadsheet has been compiled.
+        """
+        try:
+            path = dirs.get_symbols_spreadsheet(name)
+            mtime = os.path.getmtime(path)
+        except OSError as exc:
+            raise SymbolBookError(exc) from exc
+        entry = self._spreadsheets.get(name)
+        if entry is not None and entry["path"] == path and \
+                entry["mtime"] == mtime:
+            return False
+        _LOG.debug("Compiling symbols spreadsheet {}.".format(path))
+        self._spreadsheets[name] = {"path": path, "mtime": mtime,
+                                    "sheets": compile_spreadsheet(path)}
+        return True
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"version": _VERSION,
+                           "spreadsheets": self._spreadsheets}, file,
+                          ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError as exc:
+            _LOG.warning("Symbols index could not be saved: {}".format(exc))
+
+
+_BOOK = None
+
+
+def get_book():
+    """
+    Get the book shared by all the symbols views, loaded on the first call.
+
+    :return: `SymbolBook` instance.
+    """
+    global _BOOK
+    if _BOOK is None:
+        _BOOK = SymbolBook()
+    return _BOOK
+
+
+if __name__ == "__main__":
+    get_book().compile_all()
@@ -0,0 +1,202 @@
+"""
+Search over the book of symbols.
+
+Every symbol can be found by its name and by the labels of the categories
+it belongs to, all split into words and folded to lower case letters without
+diacritics. Each word of the query has to be a prefix of some word of the
+symbol, possibly with a single typo: a letter missing, superfluous,
+mistaken or two neighbouring letters swapped.
+
+Words are kept sorted, so the words starting with a prefix occupy
+a contiguous range, found with a binary search. For the typos, all the
+variants of the query word differing by a single edit, made with the letters
+present in the index, are looked up the same way. Nothing but the sorted
+words has to be built then, and a lookup costs a few hundred binary searches.
+
+Lookup time can be measured with::
+
+    python3 -m pisak.symboler.benchmark
+"""
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+
+from pisak import logger
+from pisak.symboler import symbol_book
+
+
+_LOG = logger.get_logger(__name__)
+
+#: Minimal length of a query word that can have a typo
+MIN_FUZZY_LENGTH = 3
+
+# ranking costs of a single query word match
+_NAME, _CATEGORY, _NAME_TYPO, _CATEGORY_TYPO = range(4)
+
+_WORD_SEPARATORS = re.compile(r"[\W_]+")
+
+_FOLDED_LETTERS = str.maketrans("łŁ", "lL")
+
+
+def fold(text):
+    """
+    Fold the text for comparisons: lower case letters without diacritics.
+
+    :param text: any text.
+
+    :return: folded text.
+    """
+    text = unicodedata.normalize("NFKD", text.translate(_FOLDED_LETTERS))
+    return "".join(char for char in text
+                   if not unicodedata.combining(char)).lower()
+
+
+def split_words(text):
+    """
+    Split the text into folded words.
+
+    :param text: any text.
+
+    :return: list of words.
+    """
+    return [word for word in _WORD_SEPARATORS.split(fold(text)) if word]
+
+
+def _edits(word, alphabet):
+    """
+    Get all the variants of the word with a single letter deleted,
+    inserted, substituted or two neighbouring letters transposed.
+    """
+    splits = [(word[:idx], word[idx:]) for idx in range(len(word) + 1)]
+    edits = {head + tail[1:] for head, tail in splits if tail}
+    edits.update(head + tail[1] + tail[0] + tail[2:]
+                 for head, tail in splits if len(tail) > 1)
+    edits.update(head + letter + tail[1:] for head, tail in splits if tail
+                 for letter in alphabet)
+    edits.update(head + letter + tail for head, tail in splits
+                 for letter in alphabet)
+    edits.discard(word)
+    return edits
+
+
+class SymbolIndex:
+    """
+    Search index over the symbols.
+
+    :param categories: list of pairs: label of the category and list
+    of names of its symbols.
+    """
+
+    def __init__(self, categories):
+        self.symbols = []
+        ids = {}
+        words = defaultdict(dict)
+        for label, names in categories:
+            label_words = split_words(label)
+            for name in names:
+                if name not in ids:
+                    ids[name] = len(self.symbols)
+                    self.symbols.append(name)
+                    for word in split_words(name):
+                        words[word][ids[name]] = _NAME
+                for word in label_words:
+                    words[word].setdefault(ids[name], _CATEGORY)
+        self._words = sorted(words)
+        self._matches = [words[word] for word in self._words]
+        self._alphabet = sorted(set("".join(self._words)))
+
+    def _words_range(self, prefix):
+        start = bisect.bisect_left(self._words, prefix)
+        end = bisect.bisect_left(self._words, prefix + "\uffff", start)
+        return range(start, end)
+
+    def _match_word(self, query_word):
+        """
+        Find symbols with a word starting with the query word.
+
+        :return: dictionary with ids of the symbols as keys and ranking
+        costs as values.
+        """
+        found = {}
+        self._add_matches(found, self._words_range(query_word), 0)
+        if len(query_word) >= MIN_FUZZY_LENGTH:
+            for variant in _edits(query_word, self._alphabet):
+                self._add_matches(found, self._words_range(variant),
+                                  _NAME_TYPO - _NAME)
+        return found
+
+    def _add_matches(self, found, words_range, typo_cost):
+        for idx in words_range:
+            for symbol, cost in self._matches[idx].items():
+                cost += typo_cost
+                if found.get(symbol, cost + 1) > cost:
+                    found[symbol] = cost
+
+    def search(self, query, limit=None):
+        """
+        Find symbols matching all the words of the query.
+
+        :param query: text typed by the user.
+        :param limit: maximum number of the results, None for all.
+
+        :return: list of names of the symbols, the best matching first:
+        by the names before by the categories, without typos before
+        with typos, then the shortest.
+        """
+        query_words = split_words(query)
+        if not query_words:
+            return self.symbols[:limit]
+        found = None
+        for query_word in query_words:
+            matches = self._match_word(query_word)
+            if found is None:
+                found = matches
+            else:
+                found = {symbol: cost + matches[symbol]
+                         for symbol, cost in found.items()
+                         if symbol in matches}
+            if not found:
+                return []
+        symbols = self.symbols
+        ranked = sorted(found, key=lambda symbol: (
+            found[symbol], len(symbols[symbol]), symbols[symbol]))
+        return [symbols[symbol] for symbol in ranked[:limit]]
+
+
+def build_index(book=None):
+    """
+    Build search index over all the symbols of the book.
+
+    :param book: `symbol_book.SymbolBook` instance, the shared one
+    by default.
+
+    :return: `SymbolIndex` instance.
+    """
+    book = book or symbol_book.get_book()
+    categories = []
+    for label in book.get_categories():
+        try:
+            sheets = book.get_sheets(label)
+        except symbol_book.SymbolBookError as exc:
+            _LOG.error(exc)
+            continue
+        categories.append((label, [value for sheet in sheets for row in sheet
+                                   for value in row
+                                   if value and isinstance(value, str)]))
+    return SymbolIndex(categories)
+
+
+_INDEX = None
+
+
+def get_index():
+    """
+    Get the index shared by all the searches, built on the first call.
+
+    :return: `SymbolIndex` instance.
+    """
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = build_index()
+    return _INDEX
@@ -1,12 +1,12 @@
 """
 Module with widgets specific to symboler application.
 """
-import ezodf
 from gi.repository import Mx, Clutter, GObject
 
 from pisak import widgets, pager, layout, configurator, \
     dirs, logger
 from pisak.res import colors
+from pisak.symboler import symbol_book, symbol_search
 
 
 _LOG = logger.get_logger(__name__)
@@ -152,6 +152,20 @@ class Entry(layout.Box, widgets.TileContainer, configurator.Configurable):
         self.remove_all_children()
 
 
+def _produce_symbol_tile(value):
+    """
+    Produce tile with the symbol of the given name.
+    """
+    tile = widgets.PhotoTile()
+    tile.style_class = "PisakSymbolerPhotoTileLabel"
+    tile.hilite_tool = widgets.Aperture()
+    tile.set_background_color(colors.LIGHT_GREY)
+    tile.scale_mode = Mx.ImageScaleMode.FIT
+    tile.preview_path = dirs.get_symbol_path(value)
+    tile.label_text = value
+    return tile
+
+
 class TilesSource(pager.DataSource):
     """
     Data source generating tiles with symbols.
@@ -200,36 +214,30 @@ class TilesSource(pager.DataSource):
         self._target = value
 
     @staticmethod
-    def _open_odf_spreadsheet(path):
+    def _get_sheets(name):
+        """
+        Get sheets of the spreadsheet from the compiled book of symbols.
+        Missing or broken spreadsheet gives a single empty sheet.
+        """
         try:
-            return ezodf.opendoc(path)
-        except OSError as exc:
+            return symbol_book.get_book().get_sheets(name)
+        except symbol_book.SymbolBookError as exc:
             _LOG.error(exc)
-
-    def _get_toc_ods(self):
-        return self._open_odf_spreadsheet(
-            dirs.get_symbols_spreadsheet('table_of_contents'))
-
-    def _get_cat_ods(self, name):
-        return self._open_odf_spreadsheet(
-            dirs.get_symbols_spreadsheet(name))
+            return [[[None]]]
 
     def _parse_toc(self):
-        toc = self._get_toc_ods()
-        self._book.append({'ods': toc,
-                           'sheets': toc.sheets,
+        toc = self._get_sheets(symbol_book.TOC)
+        self._book.append({'sheets': toc,
                            'type': 'toc',
                            'name': None,
-                           'len': len(toc.sheets)})
+                           'len': len(toc)})
         self._ods_map['toc'] = 0
         idx = 1
-        for sheet in toc.sheets:
-            for row in sheet.rows():
-                for cell in row:
-                    value = cell.value
+        for sheet in toc:
+            for row in sheet:
+                for value in row:
                     if value and isinstance(value, str):
-                        self._book.append({'ods': None,
-                                           'sheets': None,
+                        self._book.append({'sheets': None,
                                            'type': 'cat',
                                            'name': value,
                                            'len': None})
@@ -254,17 +262,17 @@ class TilesSource(pager.DataSource):
         self.emit('length-changed', self._length)
 
     def _generate_items_custom(self):
-        if self._current_ods['ods'] is None:
+        if self._current_ods['sheets'] is None:
             self._load_category_ods(self._current_ods)
         sheet = self._current_ods['sheets'][self._sheet_idx]
-        self.target_spec["columns"] = sheet.ncols()  # custom number of columns
-        self.target_spec["rows"] = sheet.nrows()  # custom number of rows
+        # custom number of columns, rows of a sheet may differ in length
+        self.target_spec["columns"] = max(map(len, sheet), default=0)
+        self.target_spec["rows"] = len(sheet)  # custom number of rows
         items = []
         ods_type = self._current_ods['type']
-        for row in sheet.rows():
+        for row in sheet:
             items_row = []
-            for cell in row:
-                value = cell.value
+            for value in row:
                 if value:
                     item = self._item_producers[ods_type](value)
                 else:
@@ -289,14 +297,8 @@ class TilesSource(pager.DataSource):
         return tile
 
     def _produce_item(self, value):
-        tile = widgets.PhotoTile()
+        tile = _produce_symbol_tile(value)
         self._prepare_item(tile)
-        tile.style_class = "PisakSymbolerPhotoTileLabel"
-        tile.hilite_tool = widgets.Aperture()
-        tile.set_background_color(colors.LIGHT_GREY)
-        tile.scale_mode = Mx.ImageScaleMode.FIT
-        tile.preview_path = dirs.get_symbol_path(value)
-        tile.label_text = value
         return tile
 
     def _prepare_filler(self, filler):
@@ -361,7 +363,7 @@ class TilesSource(pager.DataSource):
                     else:
                         self._ods_idx = 0
                     self._current_ods = self._book[self._ods_idx]
-                    if self._current_ods['ods'] is None:
+                    if self._current_ods['sheets'] is None:
                         self._load_category_ods(self._current_ods)
         self._update_page_idx()
         return self._generate_items_custom()
@@ -385,20 +387,100 @@ class TilesSource(pager.DataSource):
                 else:
                     self._ods_idx = len(self._book) - 1
                 self._current_ods = self._book[self._ods_idx]
-                if self._current_ods['ods'] is None:
+                if self._current_ods['sheets'] is None:
                     self._load_category_ods(self._current_ods)
             self._sheet_idx = self._current_ods['len'] - 1
         self._update_page_idx()
         return self._generate_items_custom()
 
     def _load_category_ods(self, book_item):
-        book_item['ods'] = self._get_cat_ods(book_item['name'])
-        book_item['sheets'] = book_item['ods'].sheets
+        book_item['sheets'] = self._get_sheets(book_item['name'])
         book_item['len'] = len(book_item['sheets'])
         self._total_len += book_item['len']
         self._update_length()
 
 
+class SearchSource(pager.DataSource):
+    """
+    Data source generating tiles with the symbols found by the text
+    typed into the query field, the best matching first. Empty query
+    gives all the symbols.
+    """
+    __gtype_name__ = "PisakSymbolerSearchSource"
+    __gproperties__ = {
+        "target": (
+            Entry.__gtype__,
+            "symbol inserting target",
+            "id of entry to insert symbols",
+            GObject.PARAM_READWRITE),
+        "query_field": (
+            Clutter.Actor.__gtype__,
+            "query text field",
+            "id of text box with the query",
+            GObject.PARAM_READWRITE)
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._target = None
+        self._query_field = None
+
+    @property
+    def target(self):
+        """
+        Entry the chosen symbols are inserted into.
+        """
+        return self._target
+
+    @target.setter
+    def target(self, value):
+        self._target = value
+
+    @property
+    def query_field(self):
+        """
+        Text box followed for the query, the search is run
+        whenever its text changes.
+        """
+        return self._query_field
+
+    @query_field.setter
+    def query_field(self, value):
+        if self._query_field is not None:
+            self._query_field.clutter_text.disconnect_by_func(self._on_query)
+        self._query_field = value
+        if value is not None:
+            value.clutter_text.connect("text-changed", self._on_query)
+        self.search(value.get_text() if value is not None else "")
+
+    def _on_query(self, text_field):
+        self.search(text_field.get_text())
+
+    def search(self, query):
+        """
+        Find the symbols and provide them as the new data, the pager
+        is then reloaded to show the first page of them, an empty one
+        if nothing has been found.
+
+        :param query: text typed by the user.
+        """
+        names = symbol_search.get_index().search(query)
+        self.from_idx = self.to_idx = 0
+        self.data = [pager.DataItem(name, idx)
+                     for idx, name in enumerate(names)]
+        # before the first page is shown the pager does it on its own,
+        # on the data being ready
+        if self.target_spec is not None:
+            self.reload()
+
+    def _produce_item(self, data_item):
+        tile = _produce_symbol_tile(data_item.content)
+        tile.connect("clicked", lambda source, symbol:
+                     self.target.append_many_symbols([symbol]),
+                     data_item.content)
+        return tile
+
+
 class PopUp(widgets.DialogWindow):
     """
     Dialog window for purposes of saving and loading symbols entries.
@@ -0,0 +1,100 @@
+"""
+Tests of the memory-mapped completion index of the vocabulary.
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from pisak.speller.prediction import completion_index
+
+
+def _make_words(count, seed=0):
+    rand = random.Random(seed)
+    letters = "aąbcćdeęklłmnńoóprsśtwzźż"
+    words = set()
+    while len(words) < count:
+        words.add("".join(rand.choice(letters)
+                          for _ in range(rand.randint(1, 7))))
+    counts = rand.sample(range(1, count * 10), count)
+    return dict(zip(sorted(words), counts))
+
+
+class CompletionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.dir, "ngrams.db")
+        self.index_path = os.path.join(self.dir, "completions.idx")
+        self.words = _make_words(3000)
+        self.make_db(self.words)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_db(self, words):
+        connection = sqlite3.connect(self.db_path)
+        with connection:
+            connection.execute("DROP TABLE IF EXISTS _1_gram")
+            connection.execute(
+                "CREATE TABLE _1_gram (word TEXT, count INTEGER)")
+            connection.executemany("INSERT INTO _1_gram VALUES (?, ?)",
+                                   words.items())
+        connection.close()
+
+    def open(self):
+        index = completion_index.open_index(self.db_path, self.index_path)
+        self.addCleanup(index.close)
+        return index
+
+    def expected(self, prefix, limit):
+        return sorted(((word, count) for word, count in self.words.items()
+                       if word.startswith(prefix)),
+                      key=lambda item: -item[1])[:limit]
+
+    def test_complete(self):
+        index = self.open()
+        self.assertEqual(len(index), len(self.words))
+        # short prefixes walk the ranking, long ones select from the range
+        for prefix in ["", "a", "ż", "ka", "łó", "zzz", "ąb", "kot"]:
+            for limit in (1, 5, 50):
+                self.assertEqual(index.complete(prefix, limit),
+                                 self.expected(prefix, limit), prefix)
+        self.assertEqual(index.complete("a", 0), [])
+
+    def test_count(self):
+        index = self.open()
+        for word in random.Random(1).sample(sorted(self.words), 100):
+            self.assertEqual(index.count(word), self.words[word])
+        self.assertEqual(index.count("xyz"), 0)
+
+    def test_prefix_range(self):
+        index = self.open()
+        low, high = index.prefix_range("ą")
+        self.assertEqual(high - low, sum(
+            1 for word in self.words if word.startswith("ą")))
+
+    def test_recompiled_when_outdated(self):
+        self.open()
+        self.words = {"nowe": 5, "słowa": 3}
+        self.make_db(self.words)
+        os.utime(self.db_path, (os.path.getmtime(self.index_path) + 10,) * 2)
+        self.assertEqual(self.open().complete("", 5), [
+            ("nowe", 5), ("słowa", 3)])
+
+    def test_invalid_file(self):
+        with open(self.index_path, "wb") as file:
+            file.write(b"not an index")
+        with self.assertRaises(completion_index.CompletionIndexError):
+            completion_index.CompletionIndex(self.index_path)
+
+    def test_missing_database(self):
+        with self.assertRaises(completion_index.CompletionIndexError):
+            completion_index.compile_index(
+                os.path.join(self.dir, "missing.db"), self.index_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+"""
+Tests of the cache of the blog responses and of the conditional requests
+sent by the blog client, against a local HTTP server.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from pisak.blog import exceptions, http_cache, rest_client, scheduler
+
+
+class Resource:
+    """
+    Resource served by the fake blog.
+    """
+
+    def __init__(self, content, etag=None, last_modified=None,
+                 cache_control=None):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.cache_control = cache_control
+
+
+class FakeBlogServer(ThreadingHTTPServer):
+    """
+    Server of the blog resources, recording all the requests it receives.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.resources = {}
+        self.requests = []
+        self.clients = set()
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def address(self):
+        return "http://127.0.0.1:{}/site".format(self.server_address[1])
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        server.clients.add(self.client_address)
+        resource = server.resources.get(self.path)
+        if resource is None:
+            return self._send(404, {"error": "unknown_post"})
+        headers = {}
+        if resource.etag:
+            headers["ETag"] = resource.etag
+        if resource.last_modified:
+            headers["Last-Modified"] = resource.last_modified
+        if resource.cache_control:
+            headers["Cache-Control"] = resource.cache_control
+        if (resource.etag and
+                self.headers.get("If-None-Match") == resource.etag) or (
+                    resource.last_modified and
+                    self.headers.get("If-Modified-Since") ==
+                    resource.last_modified):
+            return self._send(304, None, headers)
+        self._send(200, resource.content, headers)
+
+    def _send(self, status, content, headers=None):
+        body = b"" if content is None else json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if content is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class GetMaxAgeTest(unittest.TestCase):
+
+    def test_max_age(self):
+        self.assertEqual(http_cache.get_max_age(
+            {"Cache-Control": "public, max-age=300"}), 300)
+
+    def test_default(self):
+        self.assertEqual(http_cache.get_max_age({}),
+                         http_cache.DEFAULT_MAX_AGE)
+
+    def test_always_revalidated(self):
+        for value in ("no-cache", "no-store", "private, max-age=300"):
+            self.assertEqual(http_cache.get_max_age(
+                {"Cache-Control": value}), 0)
+
+
+class HTTPCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache.db")
+        self.cache = http_cache.HTTPCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", {"ETag": '"1"', "Cache-Control": "max-age=10"},
+                       b"body")
+        entry = self.cache.get("a")
+        self.assertEqual(entry.etag, '"1"')
+        self.assertIsNone(entry.last_modified)
+        self.assertEqual(entry.body, b"body")
+        self.assertAlmostEqual(entry.fresh_until, time.time() + 10, delta=1)
+
+    def test_refresh(self):
+        self.cache.put("a", {"Cache-Control": "no-cache"}, b"body")
+        self.assertLessEqual(self.cache.get("a").fresh_until, time.time())
+        self.cache.refresh("a", {"Cache-Control": "max-age=10"})
+        self.assertGreater(self.cache.get("a").fresh_until, time.time() + 5)
+
+    def test_unused_expired(self):
+        self.cache.put("a", {}, b"old")
+        self.cache.put("b", {}, b"new")
+        self.cache._conn.execute(
+            "UPDATE responses SET used = 0 WHERE url = 'a'")
+        self.cache._conn.commit()
+        cache = http_cache.HTTPCache(self.path)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b").body, b"new")
+
+
+class ConditionalRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = FakeBlogServer()
+        self.addCleanup(self.server.close)
+        for target, name, value in [
+                (rest_client, "_CACHE", http_cache.HTTPCache(
+                    os.path.join(self.dir, "cache.db"))),
+                (rest_client, "_SESSIONS", {}),
+                (scheduler, "scheduler", scheduler.RequestScheduler(
+                    rate=1000, burst=100))]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.blog = rest_client.Blog("blog.example.com")
+        self.blog.address = self.server.address
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def serve(self, ide, **kwargs):
+        resource = Resource({"ID": ide, "title": "Wpis"}, **kwargs)
+        self.server.resources["/site/posts/{}".format(ide)] = resource
+        return resource
+
+    def expire(self):
+        cache = rest_client._CACHE
+        cache._conn.execute("UPDATE responses SET fresh_until = 0")
+        cache._conn.commit()
+
+    def test_fresh_served_without_request(self):
+        self.serve(1, etag='"v1"', cache_control="max-age=300")
+        self.assertEqual(self.blog.get_post(1)["ID"], 1)
+        self.assertEqual(self.blog.get_post(1)["ID"], 1)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_not_modified(self):
+        self.serve(1, etag='"v1"', cache_control="max-age=300")
+        self.blog.get_post(1)
+        self.expire()
+        self.assertEqual(self.blog.get_post(1)["ID"], 1)
+        path, headers = self.server.requests[-1]
+        self.assertEqual(headers.get("If-None-Match"), '"v1"')
+        self.assertEqual(len(self.server.requests), 2)
+        # confirmed response is fresh again
+        self.blog.get_post(1)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_last_modified(self):
+        date = "Mon, 19 Oct 2026 10:00:00 GMT"
+        self.serve(1, last_modified=date, cache_control="no-cache")
+        self.blog.get_post(1)
+        self.assertEqual(self.blog.get_post(1)["ID"], 1)
+        path, headers = self.server.requests[-1]
+        self.assertEqual(headers.get("If-Modified-Since"), date)
+        self.assertNotIn("If-None-Match", headers)
+
+    def test_modified(self):
+        resource = self.serve(1, etag='"v1"', cache_control="no-cache")
+        self.blog.get_post(1)
+        resource.etag = '"v2"'
+        resource.content = {"ID": 1, "title": "Poprawiony wpis"}
+        self.assertEqual(self.blog.get_post(1)["title"], "Poprawiony wpis")
+        self.assertEqual(self.blog.get_post(1)["title"], "Poprawiony wpis")
+        self.assertEqual(
+            [headers.get("If-None-Match")
+             for _, headers in self.server.requests],
+            [None, '"v1"', '"v2"'])
+
+    def test_errors_not_cached(self):
+        self.assertEqual(self.blog.get_post(1), {"error": "unknown_post"})
+        self.serve(1)
+        self.assertEqual(self.blog.get_post(1)["ID"], 1)
+
+    def test_stale_served_when_offline(self):
+        self.serve(1, etag='"v1"', cache_control="no-cache")
+        self.blog.get_post(1)
+        self.server.close()
+        self.blog._session.close()
+        self.assertEqual(self.blog.get_post(1)["ID"], 1)
+        with self.assertRaises(exceptions.BlogInternetError):
+            self.blog.get_post(2)
+
+    def test_connection_reused(self):
+        for ide in range(5):
+            self.serve(ide, cache_control="no-cache")
+            self.blog.get_post(ide)
+        self.assertEqual(len(self.server.clients), 1)
+        other = rest_client.Blog("blog.example.com")
+        self.assertIs(other._session, self.blog._session)
+
+
+if __name__ == "__main__":
+    unittest.main()
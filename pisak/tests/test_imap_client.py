@@ -0,0 +1,515 @@
+"""
+Tests of the IMAP client, against a fake server on the local host.
+"""
+import imaplib
+import os
+import select
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from pisak.email import imap_client, message_cache
+
+
+def make_headers(uid):
+    return "Subject: Message {}\r\nFrom: Jan <jan@example.com>\r\n" \
+           "Date: Mon, 1 Jan 2018 10:00:00 +0100\r\n\r\n".format(
+               uid).encode()
+
+
+def _parse_uids(uid_set, last):
+    uids = set()
+    for part in uid_set.split(","):
+        first, _colon, end = part.partition(":")
+        end = end or first
+        end = last if end == "*" else int(end)
+        first = last if first == "*" else int(first)
+        uids.update(range(min(first, end), max(first, end) + 1))
+    return uids
+
+
+class FakeServer:
+    """
+    IMAP server with a single mailbox, serving any number of connections.
+    Every command is answered with the handler of its name given by
+    the test, if there is one, with the built-in handler or with a plain OK.
+    Handlers are called with the connection file, the tag and
+    the arguments of the command.
+
+    :param uids: UIDs of the messages in the mailbox.
+    :param handlers: dictionary with names of the commands as keys
+    and handlers as values.
+    """
+
+    def __init__(self, uids=(), handlers=None):
+        self.messages = {uid: make_headers(uid) for uid in uids}
+        self.uidvalidity = 1
+        self.handlers = handlers or {}
+        self.commands = []
+        self.connections = 0
+        self._sessions = []
+        self._listener = socket.socket()
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(5)
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _address = self._listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            session = threading.Thread(target=self._serve, args=(sock,),
+                                       daemon=True)
+            self._sessions.append(session)
+            session.start()
+
+    def _serve(self, sock):
+        with sock, sock.makefile("rwb", buffering=0) as file:
+            file.write(b"* PREAUTH fake server ready\r\n")
+            while True:
+                line = file.readline()
+                if not line:
+                    return
+                tag, name, *args = line.rstrip(b"\r\n").split(b" ")
+                name = name.decode().upper()
+                self.commands.append((name, args))
+                handler = self.handlers.get(name) or \
+                    getattr(self, "_" + name.lower(), None)
+                if name == "CAPABILITY":
+                    file.write(b"* CAPABILITY IMAP4rev1 IDLE\r\n")
+                if handler is not None:
+                    handler(file, tag, args)
+                else:
+                    file.write(tag + b" OK done\r\n")
+                if name == "LOGOUT":
+                    return
+
+    def _select(self, file, tag, _args):
+        file.write("* {} EXISTS\r\n* OK [UIDVALIDITY {}] UIDs valid\r\n"
+                   "{} OK selected\r\n".format(
+                       len(self.messages), self.uidvalidity,
+                       tag.decode()).encode())
+
+    _examine = _select
+
+    def _status(self, file, tag, args):
+        file.write("* STATUS {} (MESSAGES {} UNSEEN 0)\r\n{} OK done\r\n".format(
+            args[0].decode(), len(self.messages), tag.decode()).encode())
+
+    def _uid(self, file, tag, args):
+        command = args[0].decode().upper()
+        uids = sorted(self.messages)
+        if command == "SEARCH":
+            if args[1].upper() == b"UID":
+                found = _parse_uids(args[2].decode(), uids[-1] if uids else 0)
+                uids = [uid for uid in uids if uid in found]
+            file.write(b" ".join([b"* SEARCH"] + [
+                str(uid).encode() for uid in uids]) + b"\r\n")
+        elif command == "FETCH":
+            found = _parse_uids(args[1].decode(), uids[-1] if uids else 0)
+            for seq, uid in enumerate(uids, 1):
+                if uid in found:
+                    raw = self.messages[uid]
+                    file.write("* {} FETCH (UID {} BODY[HEADER.FIELDS "
+                               "(SUBJECT FROM DATE)] {{{}}}\r\n".format(
+                                   seq, uid, len(raw)).encode() +
+                               raw + b")\r\n")
+        file.write(tag + b" OK done\r\n")
+
+    def count(self, name, *args):
+        """
+        Count the commands received.
+
+        :param name: name of the command.
+        :param args: leading arguments of the command, as strings.
+
+        :return: number of the commands.
+        """
+        args = [arg.encode() for arg in args]
+        return sum(1 for command, command_args in self.commands
+                   if command == name and command_args[:len(args)] == args)
+
+    def connect(self):
+        """
+        Get a connection to the server.
+
+        :return: `imap_client.IMAPConnection` instance.
+        """
+        connection = imap_client.IMAPConnection({})
+        connection._conn = imaplib.IMAP4("127.0.0.1", self.port)
+        return connection
+
+    def join(self):
+        """
+        Wait until all the connections have been closed.
+        """
+        for session in self._sessions:
+            session.join(5)
+
+    def close(self):
+        self._listener.close()
+
+
+def idle_handler(*responses, confirm_delay=0):
+    """
+    Get handler of the IDLE command, sending the responses in a single
+    packet right after the confirmation, then waiting for DONE.
+    """
+    def handle(file, tag, _args):
+        time.sleep(confirm_delay)
+        file.write(b"+ idling\r\n" + b"".join(responses))
+        done = file.readline()
+        assert done == b"DONE\r\n", done
+        file.write(tag + b" OK IDLE terminated\r\n")
+
+    return handle
+
+
+class IdleTest(unittest.TestCase):
+
+    def idle(self, server, timeout=10):
+        connection = server.connect()
+        start = time.monotonic()
+        changed = connection.idle(timeout)
+        elapsed = time.monotonic() - start
+        connection.close()
+        server.join()
+        server.close()
+        return changed, elapsed
+
+    def test_change_ends_idle(self):
+        server = FakeServer(handlers={"IDLE": idle_handler(b"* 4 EXISTS\r\n")})
+        changed, elapsed = self.idle(server)
+        self.assertTrue(changed)
+        self.assertLess(elapsed, 1)
+
+    def test_change_sent_with_confirmation(self):
+        # change read ahead with the confirmation is never waited for
+        server = FakeServer(handlers={"IDLE": idle_handler(
+            b"* 1 FETCH (FLAGS (\\Seen))\r\n")})
+        changed, elapsed = self.idle(server)
+        self.assertTrue(changed)
+        self.assertLess(elapsed, imap_client.IDLE_POLL_INTERVAL)
+
+    def test_unrelated_response_ignored(self):
+        server = FakeServer(handlers={"IDLE": idle_handler(
+            b"* OK still here\r\n")})
+        changed, elapsed = self.idle(server, timeout=0.2)
+        self.assertFalse(changed)
+        self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_stop_from_another_thread(self):
+        server = FakeServer(handlers={"IDLE": idle_handler()})
+        connection = server.connect()
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(connection.idle()), daemon=True)
+        thread.start()
+        time.sleep(0.1)
+        connection.stop_idle()
+        thread.join(imap_client.IDLE_POLL_INTERVAL * 2)
+        self.assertEqual(result, [False])
+        connection.close()
+        server.join()
+        server.close()
+
+    def test_stop_before_confirmation(self):
+        server = FakeServer(handlers={"IDLE": idle_handler(confirm_delay=0.2)})
+        connection = server.connect()
+        connection.stop_idle()
+        self.assertFalse(connection.idle())
+        connection.close()
+        server.join()
+        server.close()
+        self.assertEqual(server.count("LOGOUT"), 1)
+
+
+class ClientTest(unittest.TestCase):
+    """
+    Base of the tests of `imap_client.IMAPClient`, logged in to a fake
+    server with messages 1, 2 and 3 in the inbox.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = FakeServer([1, 2, 3])
+        self.client = self.login()
+
+    def tearDown(self):
+        self.client.logout()
+        self.server.close()
+        self.client.cache.close()
+        shutil.rmtree(self.dir)
+
+    def login(self):
+        client = imap_client.IMAPClient(
+            {"address": "jan@example.com", "IMAP_server": "fake",
+             "sent_folder": "Sent"},
+            cache_path=os.path.join(self.dir, "cache.db"))
+        client._connect = self.server.connect
+        client.login()
+        return client
+
+
+class SyncTest(ClientTest):
+
+    def test_first_sync(self):
+        self.assertEqual(self.client.get_inbox_ids(), ["3", "2", "1"])
+        self.assertEqual(self.server.count("UID", "SEARCH", "ALL"), 1)
+
+    def test_only_new_messages_searched(self):
+        self.client.get_inbox_ids()
+        self.server.messages[4] = make_headers(4)
+        self.assertEqual(self.client.get_inbox_ids(), ["4", "3", "2", "1"])
+        self.assertEqual(self.server.count("UID", "SEARCH", "ALL"), 1)
+        self.assertEqual(self.server.count("UID", "SEARCH", "UID", "4:*"), 1)
+
+    def test_removed_messages(self):
+        self.client.get_inbox_ids()
+        del self.server.messages[2]
+        self.server.messages[4] = make_headers(4)
+        self.assertEqual(self.client.get_inbox_ids(), ["4", "3", "1"])
+        self.assertEqual(self.client.get_cached_inbox_ids(), ["4", "3", "1"])
+
+    def test_previews_cached(self):
+        self.client.get_inbox_ids()
+        previews = self.client.get_many_previews_from_inbox(["3", "1"])
+        self.assertEqual([preview["Subject"] for preview in previews],
+                         ["Message 3", "Message 1"])
+        self.client.get_many_previews_from_inbox(["1", "3"])
+        self.assertEqual(self.server.count("UID", "FETCH"), 1)
+
+    def test_cache_kept_between_sessions(self):
+        self.client.get_inbox_ids()
+        self.client.get_many_previews_from_inbox(["2"])
+        self.client.logout()
+        self.client.cache.close()
+        self.client = self.login()
+        self.assertEqual(self.client.get_cached_inbox_ids(), ["3", "2", "1"])
+        self.assertEqual(self.client.get_many_previews_from_inbox(
+            ["2"])[0]["Subject"], "Message 2")
+        self.assertEqual(self.server.count("UID", "FETCH"), 1)
+
+    def test_uidvalidity_change_drops_cache(self):
+        self.client.get_inbox_ids()
+        self.client.get_many_previews_from_inbox(["2"])
+        self.server.uidvalidity = 2
+        self.server.messages = {7: make_headers(7)}
+        self.assertEqual(self.client.get_inbox_ids(), ["7"])
+        self.client.get_many_previews_from_inbox(["7"])
+        self.assertEqual(self.server.count("UID", "FETCH"), 2)
+
+
+class ConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeServer(range(1, 121))
+        self.connection = self.server.connect()
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.close()
+
+    def test_mailbox_selected_once(self):
+        self.assertEqual(self.connection.select("INBOX", readonly=True),
+                         (120, 1, None))
+        self.connection.select("INBOX", readonly=True)
+        self.assertEqual(self.server.count("EXAMINE"), 1)
+        self.assertEqual(self.server.count("SELECT"), 0)
+
+    def test_selected_for_writing_serves_reading(self):
+        self.connection.select("INBOX", readonly=True)
+        self.connection.select("INBOX")
+        self.connection.select("INBOX", readonly=True)
+        self.connection.select("INBOX")
+        self.assertEqual(self.server.count("EXAMINE"), 1)
+        self.assertEqual(self.server.count("SELECT"), 1)
+
+    def test_select_refreshed(self):
+        self.connection.select("INBOX")
+        del self.server.messages[1]
+        self.assertEqual(self.connection.select("INBOX", refresh=True)[0], 119)
+        self.connection.select("Sent")
+        self.assertEqual(self.server.count("SELECT"), 3)
+
+    def test_fetch_pipelined(self):
+        pipelined = []
+
+        def handle(file, tag, args):
+            if args[0] == b"FETCH" and not pipelined:
+                # all the batches are sent before the first response
+                time.sleep(0.1)
+                pipelined.append(bool(select.select([file], [], [], 0)[0]))
+            self.server._uid(file, tag, args)
+
+        self.server.handlers["UID"] = handle
+        self.connection.select("INBOX", readonly=True)
+        uids = list(range(1, 121))
+        data = self.connection.fetch(uids, "(BODY.PEEK[HEADER.FIELDS "
+                                           "(SUBJECT FROM DATE)])")
+        self.assertEqual(pipelined, [True])
+        self.assertEqual(self.server.count("UID", "FETCH"), 3)
+        self.assertEqual(len(data), 240)
+        self.assertEqual(
+            [int(imap_client._FETCH_UID.search(item[0]).group(1))
+             for item in data[::2]], uids)
+
+
+class DummyConnection:
+
+    def __init__(self):
+        self.last_used = time.monotonic()
+        self.closed = False
+
+    def keep_alive(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class PoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+        self.pool = imap_client.ConnectionPool(self.open, size=2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def open(self):
+        connection = DummyConnection()
+        self.opened.append(connection)
+        return connection
+
+    def acquire_in_thread(self, priority, order):
+        thread = threading.Thread(
+            target=lambda: order.append((priority, self.pool.acquire(
+                priority))), daemon=True)
+        thread.start()
+        time.sleep(0.05)
+        return thread
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            with self.pool.connection() as connection:
+                self.assertIs(connection, self.opened[0])
+        self.assertEqual(len(self.opened), 1)
+
+    def test_broken_connection_discarded(self):
+        with self.assertRaises(socket.error):
+            with self.pool.connection():
+                raise socket.error("connection reset")
+        with self.pool.connection() as connection:
+            self.assertIs(connection, self.opened[1])
+
+    def test_last_connection_left_for_user(self):
+        self.pool.release(self.pool.acquire())
+        connection = self.pool.acquire(imap_client.PREFETCH)
+        self.assertIs(connection, self.opened[1])
+        self.assertIs(self.pool.acquire(), self.opened[0])
+
+    def test_prefetch_waits_behind_prefetch(self):
+        first = self.pool.acquire(imap_client.PREFETCH)
+        order = []
+        waiting = self.acquire_in_thread(imap_client.PREFETCH, order)
+        self.assertEqual(order, [])
+        self.assertIsNot(self.pool.acquire(), first)
+        self.pool.release(first, imap_client.PREFETCH)
+        waiting.join(1)
+        self.assertEqual(order, [(imap_client.PREFETCH, first)])
+
+    def test_user_served_first(self):
+        held = [self.pool.acquire(), self.pool.acquire()]
+        order = []
+        threads = [self.acquire_in_thread(imap_client.PREFETCH, order),
+                   self.acquire_in_thread(imap_client.INTERACTIVE, order)]
+        self.pool.release(held[0])
+        threads[1].join(1)
+        self.assertEqual(order, [(imap_client.INTERACTIVE, held[0])])
+        self.pool.release(held[1])
+        threads[0].join(1)
+        self.assertEqual(order[1], (imap_client.PREFETCH, held[1]))
+        self.assertEqual(len(self.opened), 2)
+
+    def test_close(self):
+        busy = self.pool.acquire()
+        self.pool.release(self.pool.acquire())
+        self.pool.close()
+        self.assertTrue(self.opened[1].closed)
+        self.assertFalse(busy.closed)
+        self.pool.release(busy)
+        self.assertTrue(busy.closed)
+
+
+class ClientPoolTest(ClientTest):
+
+    def test_requests_share_connection(self):
+        self.client.get_inbox_ids()
+        self.client.get_many_previews_from_inbox(["1", "2"],
+                                                 imap_client.INTERACTIVE)
+        self.assertEqual(self.client.get_inbox_status(), (3, 0))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_dropped_connection_replaced(self):
+        self.client.get_inbox_ids()
+        self.server.handlers["EXAMINE"] = lambda file, tag, args: \
+            file.write(b"* BYE going away\r\n")
+        self.assertRaises(imap_client.IMAPClientError,
+                          self.client.get_inbox_ids)
+        del self.server.handlers["EXAMINE"]
+        self.assertEqual(self.client.get_inbox_ids(), ["3", "2", "1"])
+        self.assertEqual(self.server.connections, 3)
+
+
+class MessageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, "cache.db")
+        self.cache = message_cache.MessageCache(path, "jan")
+        self.other = message_cache.MessageCache(path, "zofia")
+
+    def tearDown(self):
+        self.cache.close()
+        self.other.close()
+        shutil.rmtree(self.dir)
+
+    def test_accounts_separated(self):
+        self.cache.reset("INBOX", 1)
+        self.cache.add_uids("INBOX", [1, 2])
+        self.assertEqual(self.cache.get_uids("INBOX"), [1, 2])
+        self.assertIsNone(self.other.get_state("INBOX"))
+        self.assertEqual(self.other.get_uids("INBOX"), [])
+
+    def test_reset(self):
+        self.cache.reset("INBOX", 1)
+        self.cache.put_previews("INBOX", {1: {"Subject": "a"}})
+        self.cache.set_highest_modseq("INBOX", 10)
+        self.assertEqual(self.cache.get_state("INBOX"), (1, 10))
+        self.cache.reset("INBOX", 2)
+        self.assertEqual(self.cache.get_state("INBOX"), (2, None))
+        self.assertEqual(self.cache.get_previews("INBOX", [1]), {})
+
+    def test_message_round_trip(self):
+        message = {"Subject": "a", "Date": datetime(2018, 1, 1, 10, 30),
+                   "Body": ["tekst"]}
+        self.cache.put_message("INBOX", 5, message)
+        self.assertEqual(self.cache.get_message("INBOX", 5), message)
+        self.cache.remove("INBOX", [5])
+        self.assertIsNone(self.cache.get_message("INBOX", 5))
+
+    def test_message_not_serializable(self):
+        self.cache.put_message("INBOX", 5, {"Body": object()})
+        self.assertIsNone(self.cache.get_message("INBOX", 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
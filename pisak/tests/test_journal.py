@@ -0,0 +1,125 @@
+"""
+Tests of the crash-safe journal of the speller text.
+"""
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+from pisak.speller import journal
+
+
+def _edits(count, seed=0):
+    """
+    Generate a sequence of changes typed by the user.
+
+    :return: list of tuples with the kind of the change, the position
+    and the inserted text or the number of deleted characters.
+    """
+    rand = random.Random(seed)
+    text = ""
+    edits = []
+    for _ in range(count):
+        pos = rand.randint(0, len(text))
+        if text and rand.random() < 0.3:
+            length = rand.randint(1, min(5, len(text) - pos) or 1)
+            edits.append(("d", pos, length))
+            text = text[:pos] + text[pos + length:]
+        else:
+            value = rand.choice(["a", "ż", " ", "\n", "kot ", "\"x\""])
+            edits.append(("i", pos, value))
+            text = text[:pos] + value + text[pos:]
+    return edits
+
+
+def _replay(edits):
+    text = ""
+    for kind, pos, value in edits:
+        if kind == "i":
+            text = text[:pos] + value + text[pos:]
+        else:
+            text = text[:pos] + text[pos + value:]
+    return text
+
+
+def _edit_session(path, edits, synced):
+    # runs in a child process, killed while it is still editing
+    journal.CHECKPOINT_INTERVAL = 50
+    log = journal.Journal(path)
+    for idx, (kind, pos, value) in enumerate(edits):
+        if kind == "i":
+            log.record_insertion(pos, value)
+        else:
+            log.record_deletion(pos, value)
+        if idx == len(edits) // 2:
+            time.sleep(journal.SYNC_INTERVAL * 3)
+            synced.set()
+        time.sleep(0.001)
+    time.sleep(60)
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_recover_after_kill(self):
+        edits = _edits(1000)
+        context = multiprocessing.get_context("fork")
+        synced = context.Event()
+        process = context.Process(target=_edit_session,
+                                  args=(self.path, edits, synced))
+        process.start()
+        try:
+            self.assertTrue(synced.wait(30))
+            time.sleep(0.05)
+        finally:
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        text, seq = journal.recover(self.path)
+        self.assertGreater(seq, len(edits) // 2)
+        self.assertEqual(text, _replay(edits[:seq]))
+
+    def test_recover_skips_torn_change(self):
+        with open(self.path + ".checkpoint", "w", encoding="utf-8") as file:
+            file.write(json.dumps({"seq": 1}) + "\nab")
+        with open(self.path + ".wal", "w", encoding="utf-8") as file:
+            file.write(json.dumps([1, "i", 0, "a"]) + "\n")
+            file.write(json.dumps([2, "i", 2, "c"]) + "\n")
+            file.write(json.dumps([3, "d", 0, 1]) + "\n")
+            file.write('[4, "i", 0, "unfin')
+        self.assertEqual(journal.recover(self.path), ("bc", 3))
+
+    def test_recover_without_journal(self):
+        self.assertEqual(journal.recover(self.path), ("", 0))
+
+    def test_close(self):
+        log = journal.Journal(self.path, "ala", seq=7)
+        log.record_insertion(3, " ma kota")
+        log.record_deletion(0, 1)
+        log.close()
+        self.assertEqual(journal.recover(self.path), ("la ma kota", 9))
+        log = journal.Journal(self.path, "la ma kota", seq=9)
+        log.close(remove=True)
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_changes_dropped_when_unavailable(self):
+        log = journal.Journal(os.path.join(self.path, "missing", "journal"))
+        log._thread.join(5)
+        log.record_insertion(0, "a")
+        log.record_deletion(0, 1)
+        self.assertTrue(log._queue.empty())
+        log.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
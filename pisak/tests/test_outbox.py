@@ -0,0 +1,197 @@
+"""
+Tests of the outbox, with the SMTP connections replaced by fake ones.
+"""
+import os
+import shutil
+import smtplib
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from email.mime.text import MIMEText
+from unittest import mock
+
+from pisak import exceptions
+from pisak.email import outbox
+
+
+SETUP = {"address": "jan@example.com"}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class FakeSMTP:
+    """
+    SMTP connection failing with the given errors, one per message,
+    and then accepting everything.
+    """
+
+    def __init__(self, server):
+        self._server = server
+
+    def sendmail(self, sender, recipients, msg):
+        with self._server.lock:
+            if self._server.errors:
+                error = self._server.errors.pop(0)
+                if error is not None:
+                    raise error
+            self._server.sent.append((sender, recipients, msg))
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSMTPServer:
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def connect(self, setup):
+        self.connections += 1
+        return FakeSMTP(self)
+
+
+class FakeIMAPClient:
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.appended = []
+
+    def append_to_sent_box(self, msg):
+        self.appended.append(msg)
+        return self.results.pop(0) if self.results else True
+
+
+def make_message(subject="Temat"):
+    msg = MIMEText("Treść wiadomości.", _charset="utf-8")
+    msg["Subject"] = subject
+    msg["To"] = "zofia@example.com"
+    return msg
+
+
+class OutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "outbox.db")
+        self.imap = FakeIMAPClient()
+        patcher = mock.patch.object(outbox, "RETRY_DELAY", 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def start(self, server):
+        patcher = mock.patch.object(outbox.email_message, "connect_smtp",
+                                    server.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return outbox.Outbox(self.imap, self.path, SETUP)
+
+    def get_states(self, box):
+        return box._query("SELECT state, attempts FROM outbox")
+
+    def test_delivered(self):
+        server = FakeSMTPServer()
+        box = self.start(server)
+        box.put(make_message(), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: not self.get_states(box)))
+        sender, recipients, msg = server.sent[0]
+        self.assertEqual(sender, "jan@example.com")
+        self.assertEqual(recipients, ["zofia@example.com"])
+        self.assertIn("Message-ID", msg)
+        self.assertEqual(self.imap.appended, [msg])
+
+    def test_connection_kept_open(self):
+        server = FakeSMTPServer()
+        box = self.start(server)
+        for idx in range(3):
+            box.put(make_message(str(idx)), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: len(server.sent) == 3))
+        self.assertEqual(server.connections, 1)
+
+    def test_dropped_connection_reopened(self):
+        server = FakeSMTPServer(smtplib.SMTPServerDisconnected("timed out"))
+        box = self.start(server)
+        box.put(make_message(), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: not self.get_states(box)))
+        self.assertEqual(server.connections, 2)
+        self.assertEqual(len(server.sent), 1)
+
+    def test_retried_with_backoff(self):
+        server = FakeSMTPServer(
+            socket.error("network is unreachable"), socket.error("again"),
+            smtplib.SMTPServerDisconnected("dropped"),
+            smtplib.SMTPServerDisconnected("dropped"))
+        box = self.start(server)
+        box.put(make_message(), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: self.get_states(box) == [
+            ("queued", 1)]))
+        self.assertEqual(box.get_pending_count(), 1)
+        self.assertTrue(wait_for(lambda: not self.get_states(box)))
+        self.assertEqual(len(server.sent), 1)
+        self.assertEqual(server.connections, 5)
+
+    def test_rejected_not_retried(self):
+        server = FakeSMTPServer(smtplib.SMTPRecipientsRefused(
+            {"zofia@example.com": (550, b"no such user")}))
+        box = self.start(server)
+        box.put(make_message(), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: self.get_states(box) == [
+            ("failed", 0)]))
+        time.sleep(outbox.RETRY_DELAY * 3)
+        self.assertEqual(self.get_states(box), [("failed", 0)])
+        self.assertEqual(box.get_pending_count(), 0)
+        self.assertEqual(server.sent, [])
+        self.assertEqual(server.connections, 1)
+
+    def test_unexpected_error_retried(self):
+        server = FakeSMTPServer(ValueError("broken message"))
+        box = self.start(server)
+        box.put(make_message(), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: not self.get_states(box)))
+        self.assertEqual(len(server.sent), 1)
+        self.assertTrue(box._thread.is_alive())
+
+    def test_sent_folder_retried_without_sending_again(self):
+        self.imap.results = [False]
+        server = FakeSMTPServer()
+        box = self.start(server)
+        box.put(make_message(), ["zofia@example.com"])
+        self.assertTrue(wait_for(lambda: not self.get_states(box)))
+        self.assertEqual(len(server.sent), 1)
+        self.assertEqual(len(self.imap.appended), 2)
+
+    def test_queue_kept_between_sessions(self):
+        server = FakeSMTPServer(*[exceptions.NoInternetError("offline")] * 2)
+        with mock.patch.object(outbox, "RETRY_DELAY", 60):
+            box = self.start(server)
+            box.put(make_message(), ["zofia@example.com"])
+            self.assertTrue(wait_for(lambda: self.get_states(box) == [
+                ("queued", 1)]))
+        box = outbox.Outbox(self.imap, self.path, SETUP)
+        self.assertEqual(box.get_pending_count(), 1)
+        # retry of the previous session is not due yet
+        box._modify("UPDATE outbox SET next_attempt = 0")
+        box.start()
+        self.assertTrue(wait_for(lambda: not self.get_states(box)))
+        self.assertEqual(len(server.sent), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests of the scheduler pacing the requests of the blog clients.
+"""
+import threading
+import time
+import unittest
+
+from pisak.blog import scheduler
+
+
+ADDRESS = "https://blog.example.com/wp-json/wp/v2/posts"
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def run_requests(self, sched, count, address=ADDRESS,
+                     priority=scheduler.INTERACTIVE):
+        """
+        Send the requests one after another.
+
+        :return: list of times the requests were sent at, counted
+        from the first call.
+        """
+        start = time.monotonic()
+        times = []
+        for _ in range(count):
+            sched.run(address, lambda: times.append(time.monotonic() - start),
+                      priority)
+        return times
+
+    def test_returns_result(self):
+        sched = scheduler.RequestScheduler()
+        self.assertEqual(sched.run(ADDRESS, lambda: 42), 42)
+        with self.assertRaises(ValueError):
+            sched.run(ADDRESS, lambda: int("x"))
+        self.assertEqual(sched._get_host(ADDRESS).active, 0)
+
+    def test_burst_sent_at_once(self):
+        sched = scheduler.RequestScheduler(rate=2, burst=5)
+        times = self.run_requests(sched, 5)
+        self.assertLess(times[-1], 0.2)
+
+    def test_sustained_rate(self):
+        sched = scheduler.RequestScheduler(rate=20, burst=2)
+        times = self.run_requests(sched, 8)
+        self.assertLess(times[1], 0.02)
+        # 6 requests over the burst, one every 50 ms
+        self.assertGreater(times[-1], 0.25)
+        self.assertLess(times[-1], 0.6)
+
+    def test_bucket_refilled(self):
+        sched = scheduler.RequestScheduler(rate=20, burst=3)
+        self.run_requests(sched, 3)
+        time.sleep(0.2)
+        times = self.run_requests(sched, 3)
+        self.assertLess(times[-1], 0.02)
+
+    def test_hosts_paced_separately(self):
+        sched = scheduler.RequestScheduler(rate=1, burst=2)
+        self.run_requests(sched, 2)
+        times = self.run_requests(sched, 2, "https://other.example.com/feed")
+        self.assertLess(times[-1], 0.2)
+
+    def test_prefetch_leaves_token_for_user(self):
+        sched = scheduler.RequestScheduler(rate=5, burst=3)
+        times = self.run_requests(sched, 2, priority=scheduler.PREFETCH)
+        self.assertLess(times[-1], 0.02)
+        start = time.monotonic()
+        thread = threading.Thread(target=self.run_requests, args=(
+            sched, 1), kwargs={"priority": scheduler.PREFETCH})
+        thread.start()
+        times = self.run_requests(sched, 1)
+        self.assertLess(times[0], 0.02)
+        thread.join()
+        # the background request waited for the bucket to refill
+        self.assertGreater(time.monotonic() - start, 0.1)
+
+    def test_prefetch_without_burst(self):
+        sched = scheduler.RequestScheduler(rate=20, burst=1)
+        times = self.run_requests(sched, 3, priority=scheduler.PREFETCH)
+        self.assertLess(times[-1], 0.5)
+
+    def test_max_concurrent(self):
+        sched = scheduler.RequestScheduler(rate=100, burst=10,
+                                           max_concurrent=2)
+        lock = threading.Lock()
+        release = threading.Event()
+        active = [0]
+        peak = [0]
+
+        def request():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            release.wait(5)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=sched.run, args=(ADDRESS, request))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.assertEqual(active[0], 2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(peak[0], 2)
+
+    def test_interactive_served_first(self):
+        sched = scheduler.RequestScheduler(rate=20, burst=1)
+        order = []
+        self.run_requests(sched, 1)
+        threads = []
+        for name, priority in [("prefetch", scheduler.PREFETCH)] * 3 + [
+                ("interactive", scheduler.INTERACTIVE)]:
+            thread = threading.Thread(target=sched.run, args=(
+                ADDRESS, lambda name=name: order.append(name), priority))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.005)
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(order[0], "interactive")
+        self.assertEqual(order[1:], ["prefetch"] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
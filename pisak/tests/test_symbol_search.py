@@ -0,0 +1,72 @@
+"""
+Tests of the search over the book of symbols.
+"""
+import unittest
+
+from pisak.symboler import symbol_search
+
+
+CATEGORIES = [
+    ("Zwierzęta", ["pies", "kot", "żółw", "koń"]),
+    ("Jedzenie", ["chleb", "kotlet schabowy", "zupa pomidorowa"]),
+    ("Dom", ["łóżko", "kotara", "pies"]),
+]
+
+
+class FoldTest(unittest.TestCase):
+
+    def test_fold(self):
+        self.assertEqual(symbol_search.fold("Zażółć Gęślą JAŹŃ"),
+                         "zazolc gesla jazn")
+
+    def test_split_words(self):
+        self.assertEqual(symbol_search.split_words("Kotlet_schabowy, (duży)"),
+                         ["kotlet", "schabowy", "duzy"])
+
+
+class SymbolIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = symbol_search.SymbolIndex(CATEGORIES)
+
+    def test_symbols_unique(self):
+        self.assertEqual(self.index.symbols.count("pies"), 1)
+        self.assertEqual(self.index.search(""), self.index.symbols)
+        self.assertEqual(self.index.search("", limit=2),
+                         self.index.symbols[:2])
+
+    def test_prefix(self):
+        self.assertEqual(self.index.search("kot"),
+                         ["kot", "kotara", "kotlet schabowy", "koń"])
+        self.assertEqual(self.index.search("KOT", limit=1), ["kot"])
+        self.assertEqual(self.index.search("lozk"), ["łóżko"])
+
+    def test_all_words(self):
+        self.assertEqual(self.index.search("kotlet scha"), ["kotlet schabowy"])
+        self.assertEqual(self.index.search("zupa schabowy"), [])
+
+    def test_category(self):
+        # names match before the categories
+        self.assertEqual(self.index.search("zwierz"),
+                         ["kot", "koń", "pies", "żółw"])
+        self.assertEqual(self.index.search("dom pi"), ["pies"])
+        self.assertEqual(self.index.search("zupa"), ["zupa pomidorowa"])
+
+    def test_typos(self):
+        for query in ["pomdorowa", "pomiidorowa", "pomodorowa", "pomidorwoa"]:
+            self.assertEqual(self.index.search(query), ["zupa pomidorowa"],
+                             query)
+        self.assertEqual(self.index.search("pomdrowa"), [])
+
+    def test_typos_ranked_last(self):
+        self.assertEqual(self.index.search("kotl"),
+                         ["kotlet schabowy", "kot", "kotara"])
+
+    def test_short_words_without_typos(self):
+        self.assertEqual(self.index.search("ps"), [])
+        self.assertEqual(self.index.search("kon"), ["koń", "kot", "kotara",
+                                                    "kotlet schabowy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Tests of the chunked text model of the speller documents.
+"""
+import random
+import unittest
+from unittest import mock
+
+from pisak.speller import text_model
+
+
+class TextModelTest(unittest.TestCase):
+
+    def setUp(self):
+        # small chunks, so that the edits cross their boundaries
+        patcher = mock.patch.object(text_model, "CHUNK_SIZE", 8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertSame(self, model, text):
+        self.assertEqual(len(model), len(text))
+        self.assertEqual(model.get_text(), text)
+        self.assertTrue(all(model._chunks))
+
+    def test_set_text(self):
+        model = text_model.TextModel("ala ma kota " * 10)
+        self.assertSame(model, "ala ma kota " * 10)
+        self.assertGreater(len(model._chunks), 1)
+        model.set_text("")
+        self.assertEqual(len(model), 0)
+        self.assertEqual(model.get_text(), "")
+
+    def test_random_edits(self):
+        rand = random.Random(0)
+        model = text_model.TextModel()
+        text = ""
+        for _ in range(2000):
+            pos = rand.randint(0, len(text))
+            if text and rand.random() < 0.4:
+                end = pos + rand.randint(0, 30)
+                self.assertEqual(model.delete(pos, end), text[pos:end])
+                text = text[:pos] + text[end:]
+            else:
+                value = rand.choice(["a", "ż", " ", "\n", "kot pies ", "x" * 40])
+                model.insert(pos, value)
+                text = text[:pos] + value + text[pos:]
+            start = rand.randint(-5, len(text) + 5)
+            end = start + rand.randint(0, 50)
+            self.assertEqual(model.get_slice(start, end),
+                             text[max(0, start):max(0, end)])
+        self.assertSame(model, text)
+
+    def test_char_at(self):
+        text = "zażółć gęślą jaźń"
+        model = text_model.TextModel(text)
+        self.assertEqual([model.char_at(pos) for pos in range(len(text))],
+                         list(text))
+        with self.assertRaises(IndexError):
+            model.char_at(len(text))
+        with self.assertRaises(IndexError):
+            model.char_at(-1)
+
+    def test_rfind(self):
+        text = "pierwsze zdanie\ndrugie dłuższe zdanie bez końca"
+        model = text_model.TextModel(text)
+        for end in range(len(text) + 2):
+            self.assertEqual(model.rfind(" \n", end), max(
+                text.rfind(" ", 0, end), text.rfind("\n", 0, end)))
+        self.assertEqual(model.rfind(" \n"), text.rfind(" "))
+        self.assertEqual(model.rfind("#"), -1)
+
+    def test_delete_out_of_range(self):
+        model = text_model.TextModel("abc")
+        self.assertEqual(model.delete(2, 10), "c")
+        self.assertEqual(model.delete(5, 10), "")
+        self.assertEqual(model.delete(-3, 1), "a")
+        self.assertSame(model, "b")
+
+
+if __name__ == "__main__":
+    unittest.main()
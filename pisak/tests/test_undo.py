@@ -0,0 +1,90 @@
+"""
+Tests of the bounded undo history of the speller.
+"""
+import unittest
+
+from pisak.speller import undo
+
+
+class Typed:
+    """
+    Operation of typing some text, composed into words or phrases.
+    """
+
+    def __init__(self, pos, text):
+        self.pos = pos
+        self.text = text
+
+    def compose(self, other, unit):
+        if not isinstance(other, Typed) or \
+                other.pos != self.pos + len(self.text):
+            return False
+        separators = " " if unit == "word" else "."
+        if self.text[-1:] in separators:
+            return False
+        self.text += other.text
+        return True
+
+
+class UndoHistoryTest(unittest.TestCase):
+
+    def type_text(self, history, text, pos=0):
+        for idx, char in enumerate(text):
+            history.push(Typed(pos + idx, char))
+
+    def pop_all(self, history):
+        texts = []
+        while True:
+            operation = history.pop()
+            if operation is None:
+                return texts
+            texts.append(operation.text)
+
+    def test_words(self):
+        history = undo.UndoHistory([Typed])
+        self.type_text(history, "ala ma kota")
+        self.assertEqual(len(history), 3)
+        self.assertEqual(self.pop_all(history), ["kota", "ma ", "ala "])
+        self.assertIsNone(history.pop())
+
+    def test_phrases(self):
+        history = undo.UndoHistory([Typed], unit="phrase")
+        self.type_text(history, "Ala ma kota. Kot ma Alę.")
+        self.assertEqual(self.pop_all(history),
+                         [" Kot ma Alę.", "Ala ma kota."])
+
+    def test_spilled(self):
+        history = undo.UndoHistory([Typed], limit=4)
+        words = ["słowo{} ".format(idx) for idx in range(25)]
+        self.type_text(history, "".join(words))
+        self.assertEqual(len(history), 25)
+        self.assertLessEqual(len(history._entries), 4)
+        self.assertEqual(self.pop_all(history), words[::-1])
+        self.assertEqual(len(history), 0)
+
+    def test_spilled_after_restore(self):
+        history = undo.UndoHistory([Typed], limit=2)
+        self.type_text(history, "a b c d e ")
+        for _ in range(3):
+            history.pop()
+        self.type_text(history, "x y z ", pos=4)
+        self.assertEqual(self.pop_all(history),
+                         ["z ", "y ", "x ", "b ", "a "])
+
+    def test_discarded_without_spill(self):
+        history = undo.UndoHistory([Typed], limit=4, spill=False)
+        self.type_text(history, "a b c d e f g ")
+        self.assertLessEqual(len(history), 4)
+        self.assertEqual(self.pop_all(history)[0], "g ")
+        self.assertIsNone(history._spill_file)
+
+    def test_clear(self):
+        history = undo.UndoHistory([Typed], limit=2)
+        self.type_text(history, "a b c d e ")
+        history.clear()
+        self.assertEqual(len(history), 0)
+        self.assertIsNone(history.pop())
+
+
+if __name__ == "__main__":
+    unittest.main()
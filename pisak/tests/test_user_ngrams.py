@@ -0,0 +1,91 @@
+"""
+Tests of the store of the n-grams learnt from the user's texts.
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from pisak.speller.prediction import user_ngrams
+
+
+class UserNgramStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "user.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self, **kwargs):
+        loaded = threading.Event()
+        store = user_ngrams.UserNgramStore(
+            self.path, on_load=loaded.set, **kwargs)
+        self.assertTrue(loaded.wait(5))
+        return store
+
+    def test_tokenize(self):
+        self.assertEqual(
+            user_ngrams.tokenize("Ala ma 2 koty. Żółw?\nKot_pies"),
+            [["ala", "ma", "koty"], ["żółw"], ["kot", "pies"]])
+
+    def test_suggest_prefix(self):
+        store = self.open()
+        store.learn("Kasia kasia Kasprowy kaszel kasia Kasprowy ser")
+        self.assertEqual(store.suggest(["kas"], True, 5),
+                         ["kasia", "kasprowy"])
+        self.assertEqual(store.suggest(["kasi"], True, 5), ["kasia"])
+        self.assertEqual(store.suggest(["kas"], True, 1), ["kasia"])
+        self.assertEqual(store.suggest(["x"], True, 5), [])
+        store.close()
+
+    def test_suggest_next_word(self):
+        store = self.open()
+        store.learn("dzień dobry. dzień dobry. dzień dobra. dzień dobra. "
+                    "dzień dobra. dobrze")
+        self.assertEqual(store.suggest(["dzień"], False, 5),
+                         ["dobra", "dobry"])
+        # words following the previous one are not suggested twice
+        store.learn("dobrze dobrze dobrze")
+        self.assertEqual(store.suggest(["dzień", "dob"], True, 5),
+                         ["dobrze", "dobra", "dobry"])
+        store.close()
+
+    def test_saved(self):
+        store = self.open()
+        store.learn("Zuzanna i Zuzanna")
+        store.close()
+        store = self.open()
+        self.assertEqual(store.unigrams["zuzanna"], 2)
+        self.assertEqual(store.bigrams["i"]["zuzanna"], 1)
+        self.assertEqual(store.suggest(["zu"], True, 5), ["zuzanna"])
+        store.close()
+
+    def test_compacted(self):
+        store = self.open(max_entries=3)
+        store.learn("a a a a b b b c c d e f")
+        store.close()
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(sorted(connection.execute(
+            "SELECT word FROM unigrams")), [("a",), ("b",), ("c",)])
+        self.assertEqual(connection.execute(
+            "SELECT COUNT(*) FROM bigrams").fetchone(), (3,))
+        connection.close()
+        self.assertEqual(sorted(store.unigrams), ["a", "b", "c"])
+        self.assertEqual(store._words, ["a", "b", "c"])
+
+    def test_not_available(self):
+        loaded = threading.Event()
+        store = user_ngrams.UserNgramStore(
+            os.path.join(self.dir, "missing", "user.db"), on_load=loaded.set)
+        store._thread.join(5)
+        self.assertFalse(loaded.is_set())
+        store.learn("kot kot")
+        self.assertEqual(store.suggest(["ko"], True, 5), ["kot"])
+
+
+if __name__ == "__main__":
+    unittest.main()
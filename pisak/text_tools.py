@@ -2,10 +2,112 @@
 Text operations-related tools.
 """
 import threading
+import time
 
 from gi.repository import GObject, Clutter
 
-from pisak import properties, configurator
+from pisak import properties, configurator, logger
+
+
+_LOG = logger.get_logger(__name__)
+
+
+class PredictionWorker:
+    """
+    Single background thread performing predictions for one predictor.
+    Requests are coalesced, only the latest one is ever executed, and only
+    after no newer request has arrived for the debounce interval.
+    Each request gets a generation number so that results
+    of outdated requests can be recognized and dropped. Thread runs
+    until the worker is stopped.
+
+    :param predict: function performing the prediction, called with
+    the text and the position, returning the new content.
+    :param deliver: function called with the generation number and the new
+    content, each time a prediction has been finished, None as the content
+    if the prediction has failed.
+    :param debounce: debounce interval, in seconds.
+    """
+
+    def __init__(self, predict, deliver, debounce):
+        self.debounce = debounce
+        self.generation = 0
+        self._predict = predict
+        self._deliver = deliver
+        self._request = None
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, text, position):
+        """
+        Schedule new prediction request, overriding any pending one.
+
+        :param text: text being the base for prediction.
+        :param position: current position in the text.
+
+        :return: generation number of the request.
+        """
+        with self._cond:
+            self.generation += 1
+            self._request = (self.generation, text, position, time.monotonic())
+            self._cond.notify()
+            return self.generation
+
+    def stop(self):
+        """
+        Stop the thread, any pending request is dropped. Result of
+        a prediction being in progress is not delivered.
+        """
+        with self._cond:
+            self._stopped = True
+            self._request = None
+            self._cond.notify()
+
+    def is_current(self, generation):
+        """
+        Check if the given generation is the most recent one.
+
+        :param generation: generation number of some request.
+
+        :return: boolean.
+        """
+        return not self._stopped and generation == self.generation
+
+    def _next_request(self):
+        """
+        Wait for the next request.
+
+        :return: tuple with the generation, text and position, or None
+        if the worker has been stopped.
+        """
+        with self._cond:
+            while self._request is None and not self._stopped:
+                self._cond.wait()
+            while not self._stopped:
+                remaining = self._request[3] + self.debounce - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._stopped:
+                return None
+            request, self._request = self._request, None
+        return request[:3]
+
+    def _run(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+            generation, text, position = request
+            try:
+                content = self._predict(text, position)
+            except Exception as exc:
+                _LOG.error("Prediction failed: {}".format(exc))
+                content = None
+            if self.is_current(generation):
+                self._deliver(generation, content)
 
 
 class Predictor(Clutter.Actor, properties.PropertyAdapter,
@@ -13,7 +115,8 @@ class Predictor(Clutter.Actor, properties.PropertyAdapter,
     """
     Base class for objects that follow changes in the given target
     text and supply suggestions based on the text context. Searching
-    through a predictor database happens in another thread.
+    through a predictor database happens in a single worker thread, rapid
+    text changes are coalesced and outdated results are dropped.
 
     Properties:
 
@@ -33,10 +136,20 @@ class Predictor(Clutter.Actor, properties.PropertyAdapter,
             GObject.PARAM_READWRITE)
     }
 
+    #: Time in seconds the text has to stay unchanged before predicting
+    DEBOUNCE_INTERVAL = 0.05
+
+    #: Number of characters before the cursor passed to the prediction,
+    #: used only if the target can return a fragment of its text,
+    #: None means the whole text
+    CONTEXT_SIZE = None
+
     def __init__(self):
         super().__init__()
         self.target = None
         self.content = []
+        self._worker = None
+        self.connect("destroy", self._on_destroy)
 
     def get_suggestion(self, accuracy_level):
         """
@@ -50,31 +163,61 @@ class Predictor(Clutter.Actor, properties.PropertyAdapter,
         if accuracy_level < len(self.content):
             return self.content[accuracy_level]
 
-    def notify_content_update(self):
-        """
-        Notify that the predictor content has been updated.
-        """
-        Clutter.threads_add_idle(0, self.emit, "content-update")
-
     def do_prediction(self, text, position):
         """
         Method that performs the proper action of prediction, based on the given
-        text feed. When all the processing is done and content has been updated
-        successfully, then it should call the 'notify_content_update' method.
+        text feed. It is called from the worker thread and should return the new
+        content, which is then set and announced in the main thread, unless
+        some newer text change has arrived in the meantime. If the prediction
+        fails, the content is emptied, so that nothing waits for it.
         Method to be overwritten by child.
 
         :param text: text being the base for prediction.
         :param position: current position in the text.
+
+        :return: list of suggestions.
         """
         raise NotImplementedError
 
     def _update_content(self, *args):
         self.emit("processing-on")
-        text = self.target.get_text()
         position = self.target.get_cursor_position()
-        worker = threading.Thread(
-            target=self.do_prediction, args=(text, position), daemon=True)
-        worker.start()
+        if self.CONTEXT_SIZE is not None and \
+                hasattr(self.target, "get_text_slice"):
+            start = max(0, position - self.CONTEXT_SIZE)
+            text = self.target.get_text_slice(start, position)
+            position -= start
+        else:
+            text = self.target.get_text()
+        if self._worker is None:
+            self._worker = PredictionWorker(
+                self.do_prediction, self._deliver_content,
+                self.DEBOUNCE_INTERVAL)
+        self._worker.submit(text, position)
+
+    def _deliver_content(self, generation, content):
+        Clutter.threads_add_idle(0, self._apply_content, generation, content)
+
+    def _apply_content(self, generation, content):
+        if self._worker is not None and self._worker.is_current(generation):
+            self.content = content if content is not None else []
+            self.emit("content-update")
+        return False
+
+    def _on_destroy(self, *args):
+        """
+        Stop following the target and stop the worker thread, which
+        would otherwise keep the predictor alive.
+        """
+        if self.target is not None:
+            try:
+                self.target.clutter_text.disconnect_by_func(
+                    self._update_content)
+            except (AttributeError, TypeError):
+                pass  # not followed or already destroyed
+        if self._worker is not None:
+            self._worker.stop()
+            self._worker = None
 
     def _follow_target(self):
         if self.target is not None: